@@ -1,14 +1,11 @@
 import os
 import google.generativeai as genai
-import pandas as pd
 import streamlit as st
 from prompt import PROMPT_NETWORK
+from kb_build import load_artifact
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import dotenv
 
-import PyPDF2
-from PyPDF2 import PdfReader
-
 
 dotenv.load_dotenv()
 
@@ -31,12 +28,17 @@ SAFETY_SETTINGS = {
     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
     }
 
-model = genai.GenerativeModel(
-    model_name="gemini-2.5-flash",
-    safety_settings=SAFETY_SETTINGS,
-    generation_config=generation_config,
-    system_instruction=PROMPT_NETWORK
-    ,)
+@st.cache_resource
+def get_model():
+    # สร้างครั้งเดียวต่อ process (ไม่ต้องสร้างใหม่ทุก rerun)
+    return genai.GenerativeModel(
+        model_name="gemini-2.5-flash",
+        safety_settings=SAFETY_SETTINGS,
+        generation_config=generation_config,
+        system_instruction=PROMPT_NETWORK
+        ,)
+
+model = get_model()
 
 
 def clear_history():
@@ -60,10 +62,10 @@ if "messages" not in st.session_state:
         }
     ]
 
-file_path = r"C:\AI\demo\workaw_chatbot\workaw\Content.xlsx"
+# ใช้ artifact ที่ build ไว้แล้ว (python kb_build.py) โหลดครั้งเดียวต่อ process
+file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Content.xlsx")
 try:
-    df = pd.read_excel(file_path)
-    file_content = df.to_string(index=False)
+    file_content = load_artifact(file_path).to_text()
 except Exception as e:
     st.error(f"Error reading file: {e}")
     st.stop()
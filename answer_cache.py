@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# ==========================================
+# ตั้งค่า Answer Cache
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.path.join(BASE_DIR, "answer_cache.db")
+CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))   # วินาที
+CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX", "500"))
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.88"))
+
+ZERO_WIDTH = re.compile("[\u200b-\u200d\ufeff]")
+PUNCT = re.compile(r"[^\w\s\u0e00-\u0e7f]+")
+
+def normalize_prompt(text):
+    text = unicodedata.normalize("NFC", ZERO_WIDTH.sub("", text)).lower()
+    text = PUNCT.sub(" ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def cache_key(prompt, model_name, kb_version):
+    raw = f"{normalize_prompt(prompt)}|{model_name}|{kb_version}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def trigrams(text):
+    text = text.replace(" ", "")
+    return {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+# ==========================================
+# Cache: LRU ในหน่วยความจำ + SQLite บนดิสก์
+# ==========================================
+class AnswerCache:
+    def __init__(self, path=CACHE_DB, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES,
+                 threshold=SIMILARITY_THRESHOLD, embed_fn=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.embed_fn = embed_fn   # ไม่บังคับ: text -> vector (normalize แล้ว)
+        self.lru = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = self.misses = self.near_hits = 0
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+            key TEXT PRIMARY KEY, model TEXT, kb_version TEXT, prompt TEXT,
+            answer TEXT, vector TEXT, created REAL, last_hit REAL)""")
+        self.conn.commit()
+
+    def _expired(self, created): return self.ttl and time.time() - created > self.ttl
+
+    def get(self, prompt, model_name, kb_version):
+        key = cache_key(prompt, model_name, kb_version)
+        with self.lock:
+            entry = self.lru.get(key)
+            if entry is None:
+                row = self.conn.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+                if row: entry = {"answer": row[0], "created": row[1]}
+            if entry and not self._expired(entry["created"]):
+                self._touch(key, entry)
+                self.hits += 1
+                return entry["answer"]
+            answer = self._near_duplicate(prompt, model_name, kb_version)
+            if answer is not None:
+                self.near_hits += 1
+                return answer
+            self.misses += 1
+            return None
+
+    def contains(self, prompt, model_name, kb_version):
+        # เช็กแบบไม่นับสถิติ hit/miss (ใช้กับงาน prefetch)
+        with self.lock:
+            row = self.conn.execute("SELECT created FROM answers WHERE key = ?", (cache_key(prompt, model_name, kb_version),)).fetchone()
+        return bool(row) and not self._expired(row[0])
+
+    def _near_duplicate(self, prompt, model_name, kb_version):
+        # หาคำถามที่ "เกือบเหมือน" (ไทย/อังกฤษ) ด้วย trigram หรือ embedding ถ้ามี
+        norm = normalize_prompt(prompt)
+        rows = self.conn.execute("SELECT key, prompt, answer, vector, created FROM answers WHERE model = ? AND kb_version = ?",
+                                 (model_name, kb_version)).fetchall()
+        if not rows: return None
+        query_vec = None
+        if self.embed_fn:
+            try: query_vec = self.embed_fn(norm)
+            except Exception: query_vec = None
+        grams = trigrams(norm)
+        best, best_score = None, 0.0
+        for key, p, answer, vector, created in rows:
+            if self._expired(created): continue
+            if query_vec is not None and vector:
+                score = sum(x * y for x, y in zip(query_vec, json.loads(vector)))
+            else: score = jaccard(grams, trigrams(p))
+            if score > best_score: best, best_score = (key, answer, created), score
+        if best and best_score >= self.threshold:
+            self._touch(best[0], {"answer": best[1], "created": best[2]})
+            return best[1]
+        return None
+
+    def put(self, prompt, model_name, kb_version, answer):
+        if not answer: return
+        key, now = cache_key(prompt, model_name, kb_version), time.time()
+        vector = None
+        if self.embed_fn:
+            try: vector = json.dumps([float(x) for x in self.embed_fn(normalize_prompt(prompt))])
+            except Exception: vector = None
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, model_name, kb_version, normalize_prompt(prompt), answer, vector, now, now))
+            self.conn.commit()
+            self._touch(key, {"answer": answer, "created": now})
+            self._evict()
+
+    def _touch(self, key, entry):
+        self.conn.execute("UPDATE answers SET last_hit = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        self.lru[key] = entry
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.max_entries: self.lru.popitem(last=False)
+
+    def _evict(self):
+        # TTL ก่อน แล้วค่อยตัดตัวที่ไม่ได้ใช้นานที่สุด (LRU) บนดิสก์
+        if self.ttl: self.conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+        self.conn.execute("""DELETE FROM answers WHERE key NOT IN
+            (SELECT key FROM answers ORDER BY last_hit DESC LIMIT ?)""", (self.max_entries,))
+        self.conn.commit()
+
+    def invalidate(self, kb_version=None):
+        # เรียกเมื่อ PDF/Knowledge Base เปลี่ยน: ลบคำตอบของเวอร์ชันอื่นทั้งหมด
+        with self.lock:
+            if kb_version is None: self.conn.execute("DELETE FROM answers")
+            else: self.conn.execute("DELETE FROM answers WHERE kb_version != ?", (kb_version,))
+            self.conn.commit()
+            self.lru.clear()
+
+    def stats(self):
+        total = self.hits + self.near_hits + self.misses
+        return {"hits": self.hits, "near_hits": self.near_hits, "misses": self.misses,
+                "hit_rate": round((self.hits + self.near_hits) / total, 3) if total else 0.0}
@@ -0,0 +1,196 @@
+import os
+import json
+import uuid
+import asyncio
+import argparse
+import threading
+import contextlib
+from collections import OrderedDict
+
+from chat_core import ChatEngine, configure_genai, KnowledgeBaseUnavailable
+from generation_service import is_quota_error, QueueFullError
+from metrics import get_metrics
+from session_store import get_session_store
+from transcript import Message
+
+# ==========================================
+# Headless HTTP API (Server-Sent Events) ใช้ pipeline เดียวกับหน้าเว็บ
+#   POST /v1/chat  {"prompt": "...", "session_id"?: "...", "model"?: "...", "messages"?: [...]}
+#   GET  /healthz
+#   GET  /metrics  (Prometheus text format)
+# ==========================================
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8600"))
+MAX_BODY = 256 * 1024
+MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "500"))
+
+class SessionStore:
+    # ประวัติต่อ session ฝั่ง server (ใช้เมื่อ client ไม่ได้ส่ง messages มาเอง)
+    # LRU ใน memory เฉพาะ session ที่ active อยู่ ที่เหลืออยู่ใน backend (SQLite) โหลดกลับเมื่อ client กลับมา
+    def __init__(self, max_sessions=MAX_SESSIONS, backend=None):
+        self.sessions = OrderedDict()
+        self.max_sessions = max_sessions
+        self.backend = backend
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock: state = self.sessions.pop(session_id, None)
+        if state is None:
+            saved = self.backend.load(session_id) if self.backend else None
+            state = {"messages": saved["messages"], "context_state": saved["context_state"]} if saved \
+                else {"messages": [], "context_state": {}}
+        with self.lock:
+            self.sessions[session_id] = state
+            while len(self.sessions) > self.max_sessions: self.sessions.popitem(last=False)
+            return state
+
+    def save(self, session_id, state, new_messages):
+        if self.backend is None: return
+        self.backend.append(session_id, *new_messages)
+        self.backend.save_state(session_id, state["context_state"])
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+def error_code(exc):
+    if isinstance(exc, QueueFullError): return "queue_full"
+    if isinstance(exc, KnowledgeBaseUnavailable): return "kb_unavailable"
+    if is_quota_error(exc): return "quota"
+    return "error"
+
+class ApiServer:
+    def __init__(self, engine, sessions=None):
+        self.engine = engine
+        self.sessions = sessions or SessionStore(backend=get_session_store())
+        self.session_locks = {}         # session_id -> [asyncio.Lock, จำนวนที่ใช้อยู่] (turn ของ session เดียวกันต้องทำทีละอัน)
+
+    @contextlib.asynccontextmanager
+    async def session_lock(self, session_id):
+        entry = self.session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]: yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]: del self.session_locks[session_id]
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line: break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            if len(request_line) < 2: return
+            method, path = request_line[0], request_line[1].split("?")[0]
+            try: length = int(headers.get("content-length") or 0)
+            except ValueError: length = -1
+            if length < 0: return await self.reply(writer, 400, {"error": "invalid content-length"})
+            if length > MAX_BODY: return await self.reply(writer, 413, {"error": "body too large"})
+            body = await reader.readexactly(length) if length else b""
+            if method == "GET" and path == "/healthz":
+                await self.reply(writer, 200, {"ok": True, "kb_ready": self.engine.kb_ready, "models": self.engine.models})
+            elif method == "GET" and path == "/metrics":
+                await self.reply_text(writer, 200, get_metrics().render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif method == "POST" and path == "/v1/chat":
+                await self.chat(writer, body)
+            else: await self.reply(writer, 404, {"error": "not found"})
+        except (ConnectionError, asyncio.IncompleteReadError): pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception: pass
+
+    async def reply(self, writer, status, payload):
+        await self.reply_text(writer, status, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+    async def reply_text(self, writer, status, text, content_type):
+        data = text.encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}.get(status, "")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def chat(self, writer, body):
+        try:
+            req = json.loads(body or b"{}")
+            prompt = (req.get("prompt") or "").strip()
+        except (ValueError, AttributeError): prompt, req = "", {}
+        if not prompt: return await self.reply(writer, 400, {"error": "prompt is required"})
+        session_id = req.get("session_id") or uuid.uuid4().hex
+        # client ส่ง messages มาเอง = stateless, ไม่งั้นใช้ประวัติที่ server เก็บไว้ให้ (2 request พร้อมกันของ session เดียว -> ต่อคิว)
+        if isinstance(req.get("messages"), list):
+            return await self.stream_chat(writer, req, prompt, session_id, {"messages": req["messages"], "context_state": {}}, True)
+        async with self.session_lock(session_id):
+            await self.stream_chat(writer, req, prompt, session_id, self.sessions.get(session_id), False)
+
+    async def stream_chat(self, writer, req, prompt, session_id, state, stateless):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        writer.write(sse("session", {"session_id": session_id}))
+        await writer.drain()
+
+        loop, queue, info, stop = asyncio.get_running_loop(), asyncio.Queue(), {}, threading.Event()
+        def produce():
+            # stream ของ engine เป็นแบบ blocking -> รันใน thread แล้วส่ง chunk กลับเข้า event loop
+            # client หลุด (stop) -> ปิด generator ใน thread นี้เอง: งานในคิวถูกยกเลิก ไม่เสีย quota ต่อ
+            stream = self.engine.stream_turn(session_id, prompt, state["messages"], req.get("model"),
+                                             state["context_state"], info=info, tier=req.get("tier"))
+            try:
+                for text in stream:
+                    if stop.is_set(): return
+                    loop.call_soon_threadsafe(queue.put_nowait, ("chunk", text))
+                loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+            except Exception as e: loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+            finally: stream.close()
+        threading.Thread(target=produce, daemon=True, name=f"api-{session_id[:8]}").start()
+        try: await self.relay(writer, queue, prompt, session_id, state, stateless, info)
+        finally: stop.set()
+
+    async def relay(self, writer, queue, prompt, session_id, state, stateless, info):
+        parts = []
+        while True:
+            kind, value = await queue.get()
+            if kind == "chunk":
+                parts.append(value)
+                writer.write(sse("chunk", {"text": value}))
+            elif kind == "done":
+                answer = "".join(parts)
+                turn = [Message("user", prompt), Message("assistant", answer)]
+                state["messages"] += turn
+                if not stateless: await asyncio.to_thread(self.sessions.save, session_id, state, turn)
+                writer.write(sse("done", {"model": info.get("model"), "persona": info.get("persona"),
+                                          "cached": info.get("cached", False), "tier": info.get("tier"),
+                                          "escalated": info.get("escalated")}))
+                await writer.drain()
+                break
+            else:
+                writer.write(sse("error", {"code": error_code(value), "message": str(value)}))
+                await writer.drain()
+                break
+            await writer.drain()
+
+async def serve(host=API_HOST, port=API_PORT, engine=None):
+    if engine is None:
+        engine = ChatEngine()
+        engine.warm_up()
+    server = ApiServer(engine)
+    srv = await asyncio.start_server(server.handle, host, port)
+    print(f"⚡ Network Genius API on http://{host}:{port} (POST /v1/chat, GET /healthz, GET /metrics)")
+    async with srv: await srv.serve_forever()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless HTTP/SSE API for the Network Genius chat pipeline")
+    ap.add_argument("--host", default=API_HOST)
+    ap.add_argument("--port", type=int, default=API_PORT)
+    args = ap.parse_args(argv)
+    if not configure_genai(): print("❌ ไม่พบ API Key กรุณาตรวจสอบไฟล์ .env"); return 1
+    try: asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,37 +1,37 @@
 import os
-import time
-import json
-from datetime import datetime
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import uuid
 import streamlit as st
-import dotenv
+from streaming import StreamRenderer
+from history_store import get_history_store
+from session_store import get_session_store
+from prompt import STARTER_PROMPTS
+from metrics import TurnMetrics
+from transcript import new_message, visible_window, prepare_markdown, TRANSCRIPT_PAGE_SIZE
+from session_memory import get_session_memory, footprint, trace_top
+# SDK (google.generativeai) + ChatEngine ถูก import ใน thread warm-up ของ startup.py -> หน้าเว็บขึ้นได้ทันที
+from startup import ModelCatalog, Warmup, load_api_key, default_model, WARMUP_TIMEOUT
 
 # ==========================================
 # 0. 🛠️ ระบบจัดการ Path อัตโนมัติ
 # ==========================================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PDF_PATH = os.path.join(BASE_DIR, "Data_Content_Network.pdf")
-HISTORY_FILE = os.path.join(BASE_DIR, "chat_history.json")
-ENV_PATH = os.path.join(BASE_DIR, ".env")
 
-dotenv.load_dotenv(ENV_PATH)
-
-# --- ⚡ สร้างไฟล์ประวัติถ้ายังไม่มี ---
-if not os.path.exists(HISTORY_FILE):
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f, ensure_ascii=False, indent=2)
+# --- ⚡ History Store (jsonl/sqlite เลือกได้ผ่าน HISTORY_BACKEND) ---
+history_store = get_history_store(BASE_DIR)
+session_store = get_session_store()     # บทสนทนาต่อ session (?sid=... ใน URL) -> refresh แล้วคุยต่อได้
+session_memory = get_session_memory()   # ข้อความของทุก session ใน process + cap memory
+ADMIN_VIEW = os.getenv("ADMIN_VIEW", "0") == "1"
+HISTORY_PAGE_SIZE = 10
+TURN_LOG_SIZE = 50
 
 # ==========================================
 # 1. ตั้งค่า API
 # ==========================================
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
+if not load_api_key():
     st.error("❌ ไม่พบ API Key กรุณาตรวจสอบไฟล์ .env")
     st.stop()
 
-genai.configure(api_key=GOOGLE_API_KEY)
-
 # ==========================================
 # 2. ตั้งค่าหน้าเว็บ (Page Config)
 # ==========================================
@@ -42,6 +42,18 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- 🔁 Resume: session id อยู่ใน URL, โหลดเฉพาะ session นี้จาก session_store ---
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
+    saved = session_store.load(st.session_state.session_id)
+    if saved:
+        st.session_state.context_state = saved["context_state"]
+        if saved["kb_handle"]: st.session_state.gemini_file = saved["kb_handle"]
+else: saved = None
+# ข้อความ / turn log อยู่ใน session_memory (idle นาน -> ถูกปล่อย แล้วโหลดกลับจาก session_store)
+slot = session_memory.attach(st.session_state.session_id, lambda sid: saved or session_store.load(sid))
+
 # ==========================================
 # 3. 🎨 UI & CSS แบบเก่า (Soft Sky Blue Theme)
 # ==========================================
@@ -214,36 +226,16 @@ st.markdown("""
 # ==========================================
 # 4. Utility Functions
 # ==========================================
-def save_history(user_msg, ai_msg):
-    history = []
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            try: history = json.load(f)
-            except: pass
-    history.append({'timestamp': datetime.now().isoformat(), 'user': user_msg, 'ai': ai_msg})
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history[-20:], f, ensure_ascii=False, indent=2)
-
-@st.cache_resource
-def get_available_models():
-    try:
-        models = []
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods and 'gemini' in m.name:
-                models.append(m.name)
-        return models
-    except: return ["models/gemini-1.5-flash"]
+@st.cache_resource(show_spinner=False)
+def get_model_catalog():
+    # รายชื่อโมเดลจาก .model_cache.json (ไม่ต้องรอ list_models) แล้ว refresh เบื้องหลัง
+    return ModelCatalog()
 
 @st.cache_resource(show_spinner=False)
-def get_gemini_file(path):
-    if not os.path.exists(path): return None
-    try:
-        file = genai.upload_file(path, mime_type="application/pdf")
-        while file.state.name == "PROCESSING":
-            time.sleep(1)
-            file = genai.get_file(file.name)
-        return file
-    except: return None
+def get_warmup(_models):
+    # pipeline เดียวกับ HTTP API (chat_core) สร้างใน thread แยก -> หน้าเว็บเป็นแค่ client ที่ render stream
+    # 1 engine ต่อ process (_models ไม่อยู่ใน key ของ cache) รายชื่อโมเดลที่ refresh มาทีหลังอัปเดตผ่าน set_models
+    return Warmup(_models, history_store)
 
 # ==========================================
 # 5. Sidebar (Control Panel)
@@ -257,59 +249,107 @@ with st.sidebar:
     
     # Model Selector
     st.markdown("### ⚙️ เลือกโมเดล")
-    available_models = get_available_models()
+    available_models = get_model_catalog().models()
     if available_models:
-        default_idx = 0
-        for i, m in enumerate(available_models):
-            if "flash" in m and "1.5" in m: default_idx = i; break
+        default_idx = available_models.index(default_model(available_models))
         selected_model = st.selectbox("Model:", options=available_models, index=default_idx)
     else: selected_model = "models/gemini-pro"
 
     st.divider()
     
-    # PDF Status
-    if "gemini_file" not in st.session_state:
-        with st.spinner("Connecting..."):
-            file_obj = get_gemini_file(PDF_PATH)
-            if file_obj: st.session_state.gemini_file = file_obj; st.success("✅ Knowledge Base Online")
-            else: st.error(f"❌ PDF Not Found"); st.warning(f"วางไฟล์ {PDF_PATH} คู่กับ app.py")
-    else: st.info("✅ Database Active")
+    # Knowledge Base Status: index แยกต่อ persona (network ไม่มี local index ค่อย upload PDF ทั้งไฟล์)
+    warmup = get_warmup(available_models or [selected_model])
+    warmup.set_models(available_models or [selected_model])
+    engine = warmup.engine if warmup.ready else None
+    if engine is None:
+        if warmup.error is not None: st.error(f"❌ เตรียมระบบไม่สำเร็จ: {warmup.error}"); get_warmup.clear()
+        else: st.info("⏳ กำลังเตรียม Knowledge Base เบื้องหลัง...")
+    else:
+        engine.prefetcher.prefetch_starters(selected_model)   # เตรียมคำตอบปุ่ม Hero ไว้ล่วงหน้า (เมื่อ KB/โมเดลเปลี่ยน)
+        kb_counts = engine.kb_counts()
+        for persona, n in kb_counts.items():
+            if n: st.info(f"✅ {persona}: {n} chunks")
+        if kb_counts.get("network"): st.caption("🧭 เลือก persona อัตโนมัติตามคำถาม")
+        elif "gemini_file" in st.session_state: st.info("✅ Database Active")
+        elif file_obj := engine.file_part(): st.session_state.gemini_file = file_obj; st.success("✅ Knowledge Base Online")
+        elif os.path.exists(PDF_PATH): st.info("☁️ กำลังอัปโหลด PDF เบื้องหลัง... ลองใหม่อีกสักครู่")
+        else: st.error(f"❌ PDF Not Found"); st.warning(f"วางไฟล์ {PDF_PATH} คู่กับ app.py")
 
     st.divider()
     
     # Buttons
     c1, c2 = st.columns(2)
     with c1: 
-        if st.button("✨ รีเซ็ต", use_container_width=True, type="primary"): st.session_state.messages = []; st.rerun()
+        if st.button("✨ รีเซ็ต", use_container_width=True, type="primary"): session_store.reset(st.session_state.session_id); slot.reset(); st.session_state.context_state = {}; st.session_state.transcript_shown = TRANSCRIPT_PAGE_SIZE; st.rerun()
     with c2: 
         if st.button("🗑️ ล้างประวัติ", use_container_width=True):
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f: json.dump([], f)
-            st.session_state.messages = []; st.rerun()
+            history_store.clear()
+            session_store.reset(st.session_state.session_id); slot.reset(); st.session_state.context_state = {}; st.session_state.transcript_shown = TRANSCRIPT_PAGE_SIZE; st.rerun()
     
     st.markdown("---")
     
-    # History Log
+    # History Log: เนื้อหาใน expander ถูกรันทุก rerun แม้ปิดอยู่ -> ใช้ toggle แล้วอ่านไฟล์เฉพาะตอนเปิดดู
     st.markdown("### 📜 ประวัติการสนทนา")
-    if os.path.exists(HISTORY_FILE):
-        with st.expander("คลิกเพื่อดูประวัติเก่า"):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                try:
-                    for chat in reversed(json.load(f)):
-                        st.caption(f"🕒 {chat.get('timestamp','').replace('T',' ')[:16]}")
-                        st.markdown(f"**You:** {chat.get('user')}")
-                        st.info(f"**AI:** {chat.get('ai')}")
-                        st.markdown("---")
-                except: pass
+    if st.toggle("คลิกเพื่อดูประวัติเก่า", key="show_history"):
+        total_pages = max(1, -(-history_store.count() // HISTORY_PAGE_SIZE))
+        page = st.number_input("หน้า", min_value=1, max_value=total_pages, value=1, step=1) - 1
+        for chat in history_store.page(page, HISTORY_PAGE_SIZE):
+            st.caption(f"🕒 {chat.get('timestamp','').replace('T',' ')[:16]}")
+            st.markdown(f"**You:** {chat.get('user')}")
+            st.info(f"**AI:** {chat.get('ai')}")
+            st.markdown("---")
+        st.caption(f"หน้า {page + 1}/{total_pages}")
     
     st.caption(f"Using: {selected_model}")
+    if engine is not None:
+        cs, gs = engine.chats.stats(), engine.service.stats()
+        st.caption(f"♻️ Reuse: {cs['model_hits']} model / {cs['chat_reuses']} chat (ประหยัด {cs['saved_setup_ms']} ms)")
+        st.caption(f"📥 Queue: {gs['queue_depth']} รอ / {gs['running']} กำลังตอบ (avg wait {gs['avg_wait_ms']} ms)")
+        st.caption(f"🚀 Warm-up: {warmup.elapsed:.1f} s")
+        ps = engine.prefetcher.stats()
+        st.caption(f"🔮 Prefetch: {ps['generated']} คำตอบ / hit {ps['follow_up_hits']} (ใช้ {ps['budget_used']}/{ps['budget_limit']} tokens)")
+        fs = engine.fast_path.stats()
+        st.caption(f"⚡ Fast path: hit {fs['hits']} / ส่งต่อ {fs['low_confidence'] + fs['misses']} (hit rate {fs['hit_rate']:.0%}, threshold {fs['threshold']})")
+        cc = engine.cascade.stats()
+        st.caption(f"🪶 Cascade: เบา {cc['light']} / เต็ม {cc['full']} / escalate {sum(cc['escalations'].values())} (ประหยัด {cc['saved_ms'] / 1000:.1f} s)")
+        sf = engine.flights.stats()
+        st.caption(f"🤝 Single-flight: เรียก AI {sf['upstream_calls']} ครั้ง / ใช้ร่วม {sf['coalesced']} (กำลังตอบ {sf['in_flight']})")
+        xs = engine.context_caches.stats()
+        st.caption(f"🧊 Context cache: {xs['active']} active / hit {xs['hits']} / สร้าง {xs['creates']} / fallback {xs['fallbacks']}")
+    # Admin: memory ต่อ session ของทั้ง process (เปิดด้วย ADMIN_VIEW=1)
+    if ADMIN_VIEW:
+        with st.expander("🧠 Memory ต่อ session"):
+            ms = session_memory.stats()
+            st.caption(f"{ms['sessions']} session ใน memory: {ms['total_mb']}/{ms['cap_mb']} MB (RSS {ms['rss_mb']} MB)")
+            st.caption(f"ปล่อยแล้ว: idle {ms['evicted']['idle']} / เกิน cap {ms['evicted']['cap']} / โหลดกลับ {ms['reloads']} / trim {ms['trims']}")
+            st.caption(f"Session นี้: {slot.size / 1024:.0f} KB ({len(slot.messages)} ข้อความ) + session_state {footprint(dict(st.session_state)) / 1024:.0f} KB")
+            st.table(ms["largest"])
+            if ms["traced_mb"] is not None:
+                st.caption(f"tracemalloc: {ms['traced_mb']} MB (peak {ms['traced_peak_mb']} MB)")
+                st.table(trace_top())
+    if "last_render_stats" in st.session_state:
+        rs = st.session_state.last_render_stats
+        st.caption(f"🖌️ Render: {rs['renders']} ครั้ง / {rs['chunks']} chunks ({rs['render_ms']} ms)")
+
+    # Per-session Stats (จาก TurnMetrics ของแต่ละคำถามใน session นี้)
+    turn_log = slot.turn_log
+    if turn_log:
+        with st.expander(f"📊 สถิติ session นี้ ({len(turn_log)} คำถาม)"):
+            ttfts = sorted(t["stages_ms"].get("ttft", 0) for t in turn_log)
+            st.caption(f"TTFT เฉลี่ย {sum(ttfts) / len(ttfts):.0f} ms / สูงสุด {ttfts[-1]:.0f} ms")
+            st.caption(f"Tokens: in {sum(t['tokens']['input'] for t in turn_log)} (cached {sum(t['tokens']['cached'] for t in turn_log)}) / out {sum(t['tokens']['output'] for t in turn_log)}")
+            st.caption(f"Cache hit {sum(t['cached'] for t in turn_log)} / Error {sum(t['status'] == 'error' for t in turn_log)}")
+            st.markdown("**คำถามล่าสุด (ms)**")
+            st.json(turn_log[-1]["stages_ms"])
 
 # ==========================================
 # 6. Main Chat Interface
 # ==========================================
-if "messages" not in st.session_state: st.session_state.messages = []
+if "context_state" not in st.session_state: st.session_state.context_state = {}
+if "transcript_shown" not in st.session_state: st.session_state.transcript_shown = TRANSCRIPT_PAGE_SIZE
 
 hero_placeholder = st.empty()
-if len(st.session_state.messages) == 0:
+if len(slot.messages) == 0:
     with hero_placeholder.container():
         st.markdown("""
             <div class="hero-container">
@@ -319,72 +359,90 @@ if len(st.session_state.messages) == 0:
             </div>
         """, unsafe_allow_html=True)
         col1, col2 = st.columns(2)
-        with col1:
-            if st.button("📝 สรุปเนื้อหาสำคัญ\nช่วยสรุป Concept หลักจากไฟล์ PDF นี้ให้หน่อย", use_container_width=True):
-                st.session_state.pending_prompt = "ช่วยสรุป Concept หลักจากไฟล์ PDF นี้ให้หน่อย"; st.rerun()
-            if st.button("🔧 เทคนิคการ Config\nสอนวิธี Config VLAN และ Trunking บน Switch", use_container_width=True):
-                st.session_state.pending_prompt = "สอนวิธี Config VLAN และ Trunking บน Switch"; st.rerun()
-        with col2:
-            if st.button("🌐 อธิบาย OSPF\nอธิบายหลักการทำงานของ OSPF แบบเข้าใจง่าย", use_container_width=True):
-                st.session_state.pending_prompt = "อธิบายหลักการทำงานของ OSPF แบบเข้าใจง่าย"; st.rerun()
-            if st.button("🛡️ การแก้ปัญหา\nแนะนำขั้นตอนการ Troubleshoot เบื้องต้น", use_container_width=True):
-                st.session_state.pending_prompt = "แนะนำขั้นตอนการ Troubleshoot เบื้องต้น"; st.rerun()
-
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"], avatar="🧑‍💻" if msg["role"]=="user" else "⚡"): st.markdown(msg["content"])
+        for i, (label, starter) in enumerate(STARTER_PROMPTS):
+            with (col1 if i < 2 else col2):
+                if st.button(f"{label}\n{starter}", use_container_width=True):
+                    st.session_state.pending_prompt = starter; st.rerun()
+
+# Transcript: วาดแค่ข้อความล่าสุด (session ยาวแล้วทุก rerun ไม่ช้าลง) ข้อความเก่ากดโหลดเพิ่มทีละหน้า
+hidden, visible = visible_window(slot.messages, st.session_state.transcript_shown)
+if hidden and st.button(f"⬆️ โหลดข้อความเก่า ({hidden})", use_container_width=True):
+    st.session_state.transcript_shown += TRANSCRIPT_PAGE_SIZE; st.rerun()
+for msg in visible:
+    with st.chat_message(msg["role"], avatar="🧑‍💻" if msg["role"]=="user" else "⚡"): st.markdown(prepare_markdown(msg["content"]))
+# คำตอบล่าสุดมาจากโมเดลเบา (cascade) -> ให้ผู้ใช้ขอคำตอบละเอียดจากโมเดลที่เลือกได้
+light = st.session_state.get("light_answer")
+if light and visible and visible[-1].get("id") == light["id"] and \
+        st.button("🔼 ยังไม่พอ? ให้โมเดลใหญ่ตอบละเอียดขึ้น", use_container_width=True):
+    if engine is not None: engine.cascade.reject(st.session_state.session_id)
+    st.session_state.pending_prompt, st.session_state.pending_tier = light["prompt"], "full"
+    del st.session_state.light_answer; st.rerun()
 
 if prompt := st.chat_input("พิมพ์คำถามของคุณที่นี่..."): final_prompt = prompt
 elif "pending_prompt" in st.session_state: final_prompt = st.session_state.pending_prompt; del st.session_state.pending_prompt
 else: final_prompt = None
+tier = st.session_state.pop("pending_tier", None) if final_prompt else None
 
 # ==========================================
 # 7. AI Logic
 # ==========================================
 if final_prompt:
     hero_placeholder.empty()
-    st.session_state.messages.append({"role": "user", "content": final_prompt})
+    slot.messages.append(new_message("user", final_prompt))
+    session_store.append(st.session_state.session_id, slot.messages[-1])
     with st.chat_message("user", avatar="🧑‍💻"): st.markdown(final_prompt)
 
-    if "gemini_file" in st.session_state:
+    if engine is None:
+        # คำถามแรกมาก่อน warm-up เสร็จ -> รอเฉพาะส่วนที่เหลือ
+        with st.spinner("⏳ กำลังเตรียมระบบ..."):
+            try: engine = warmup.result(WARMUP_TIMEOUT)
+            except TimeoutError: st.error(f"⏳ เตรียมระบบยังไม่เสร็จภายใน {WARMUP_TIMEOUT:.0f} วินาที ลองใหม่อีกครั้ง"); st.stop()
+            except Exception as e: get_warmup.clear(); st.error(f"Error: {e}"); st.stop()
+    from chat_core import KnowledgeBaseUnavailable
+    from generation_service import is_quota_error, QueueFullError
+
+    if engine.kb_ready or "gemini_file" in st.session_state:
         with st.chat_message("assistant", avatar="⚡"):
-            msg_placeholder = st.empty(); full_res = ""
+            msg_placeholder = st.empty(); renderer = StreamRenderer(msg_placeholder)
+            turn = TurnMetrics(st.session_state.session_id, selected_model)
             try:
-                model = genai.GenerativeModel(
-                    model_name=selected_model,
-                    generation_config={"temperature": 0.1, "top_p": 0.9, "top_k": 40, "max_output_tokens": 4096},
-                    safety_settings={
-                        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                    },
-                    system_instruction="""
-                    You are 'Network Genius', an AI assistant specialized in Network Operations.
-                    1. If asked "Who are you", introduce yourself politely.
-                    2. For technical questions, answer based ONLY on the provided PDF file.
-                    3. If answer is not in file, say 'ขออภัย ข้อมูลส่วนนี้ไม่มีในเอกสาร'.
-                    """
-                )
-                
-                history = [{"role": "user", "parts": [st.session_state.gemini_file, "Answer based on this file."]}]
-                for m in st.session_state.messages[:-1]:
-                    history.append({"role": "model" if m["role"]=="assistant" else "user", "parts": [m["content"]]})
+                route = {}
+                for text in engine.stream_turn(st.session_state.session_id, final_prompt, slot.messages[:-1],
+                                               selected_model, st.session_state.context_state,
+                                               st.session_state.get("gemini_file"), route, turn, tier):
+                    renderer.feed(text)
+                if route.get("model", selected_model) != selected_model: st.caption(f"🔀 ตอบโดย {route['model']}")
+                if route.get("persona"): st.caption(f"🧭 Persona: {route['persona']}")
+                if route.get("prefetched"): st.caption("🔮 ตอบจากคำตอบที่เตรียมไว้ล่วงหน้า")
+                if route.get("fast_path"): st.caption("⚡ ตอบจากชุดคำสั่งในเครื่อง (ไม่ผ่าน AI)")
+                if route.get("coalesced"): st.caption("🤝 ใช้คำตอบร่วมกับผู้ที่ถามคำถามเดียวกันพร้อมกัน")
+                if route.get("escalated"): st.caption("🔼 คำตอบจากโมเดลเบายังไม่ดีพอ จึงให้โมเดลที่เลือกตอบแทน")
+                elif route.get("truncated"): st.caption("✂️ คำตอบยาวเกินขอบเขตของโมเดลเบา กด 🔼 เพื่อให้โมเดลใหญ่ตอบต่อแบบเต็ม")
+                elif route.get("tier") == "light": st.caption("🪶 คำถามสั้น ตอบด้วยโมเดลที่เร็วที่สุด")
 
-                chat = model.start_chat(history=history)
-                response = chat.send_message(final_prompt, stream=True)
-                
-                for chunk in response:
-                    if chunk.text: full_res += chunk.text; msg_placeholder.markdown(full_res + "▌"); time.sleep(0.01)
-                
-                msg_placeholder.markdown(full_res)
-                st.session_state.messages.append({"role": "assistant", "content": full_res})
-                save_history(final_prompt, full_res)
+                full_res = renderer.finish()
+                turn.record("render", renderer.render_time)
+                st.session_state.last_render_stats = renderer.stats()
+                slot.messages.append(new_message("assistant", full_res))
+                session_store.append(st.session_state.session_id, slot.messages[-1])
+                if route.get("tier") == "light" and not route.get("escalated"):
+                    st.session_state.light_answer = {"id": slot.messages[-1]["id"], "prompt": final_prompt}
+                else: st.session_state.pop("light_answer", None)
                 
+            except QueueFullError: st.error("⚠️ ระบบมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้งในอีกสักครู่")
+            except KnowledgeBaseUnavailable: st.error("Connection Lost. Refresh page.")
             except Exception as e:
                 err = str(e)
-                if "429" in err: st.error(f"⚠️ โควตาเต็ม (Model: {selected_model}) -> ลองเปลี่ยนโมเดล")
+                if is_quota_error(e): st.error("⚠️ ทุกโมเดลโควตาเต็มชั่วคราว กรุณาลองใหม่อีกครั้งในอีกสักครู่")
                 elif "finish_reason" in err: st.error("⚠️ AI หยุดทำงาน (Safety/Length) -> กดปุ่ม 'ล้างประวัติ' แล้วลองใหม่")
                 else: st.error(f"Error: {err}")
+            finally:
+                # สรุปสะสม + persona + handle ของ KB ไว้ใช้ตอน resume (ไม่ต้องสรุป/upload ใหม่)
+                session_store.save_state(st.session_state.session_id, st.session_state.context_state, st.session_state.get("gemini_file"))
+                slot.turn_log = (slot.turn_log + [turn.finish()])[-TURN_LOG_SIZE:]
     else: st.error("Connection Lost. Refresh page.")
 
+# วัดขนาด session นี้หลังจบ run (เกิน cap -> ตัด cache ของ session นี้ / ปล่อย session อื่นที่ไม่ได้ใช้)
+session_memory.measure(st.session_state.session_id)
+
 
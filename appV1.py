@@ -1,10 +1,9 @@
 import os
 import time
-import json
-from datetime import datetime
 import google.generativeai as genai
 import streamlit as st
 import dotenv
+from history_store import get_history_store
 
 # Load Environment Variables
 dotenv.load_dotenv()
@@ -141,17 +140,10 @@ st.markdown("""
 
 # ================= Utility Functions =================
 
-HISTORY_FILE = "chat_history.json"
+history_store = get_history_store()
 
 def save_history(user_msg, ai_msg):
-    history = []
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            try: history = json.load(f)
-            except: pass
-    history.append({'timestamp': datetime.now().isoformat(), 'user': user_msg, 'ai': ai_msg})
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history[-20:], f, ensure_ascii=False, indent=2)
+    history_store.append(user_msg, ai_msg)
 
 # --- ฟังก์ชันใหม่: ดึงรายชื่อโมเดลจริงๆ จาก Account ---
 @st.cache_resource
@@ -0,0 +1,205 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from kb_build import read_xlsx_rows
+from metrics import TurnMetrics
+
+# ==========================================
+# Batch: ถามทีละหลายร้อยข้อผ่าน pipeline เดียวกับหน้าเว็บ (ChatEngine) แล้วเขียนผลเป็น JSONL
+#   python batch_runner.py workaw_data.xlsx -o faq.jsonl --template "สรุปเป็นคำถาม-คำตอบ: {question}"
+#   รันซ้ำด้วยไฟล์ output เดิม = ทำต่อจากข้อที่ยังไม่เสร็จ (checkpoint คือไฟล์ output เอง)
+# ==========================================
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "3"))
+RETRY_BACKOFF = 2.0                       # วินาที x 2^ครั้งที่ลอง (ตอนโดน 429 / คิวเต็ม)
+PROGRESS_EVERY = 10
+QUESTION_FIELDS = ("question", "prompt", "คำถาม", "query", "text")
+ID_FIELDS = ("id", "question_id", "qid")
+
+# ==========================================
+# 1. อ่านคำถาม: xlsx / csv / jsonl -> [{"id", "question"}]
+# ==========================================
+def _pick(header, wanted, fields):
+    if wanted is not None:
+        if wanted in header: return header.index(wanted)
+        if str(wanted).isdigit(): return int(wanted)
+        raise ValueError(f"ไม่พบคอลัมน์ '{wanted}' (มี {header})")
+    lowered = [h.strip().lower() for h in header]
+    return next((lowered.index(f) for f in fields if f in lowered), None)
+
+def _from_rows(rows, source, column, id_column):
+    # แถวแรกเป็น header เสมอ (workaw_data.xlsx มีแค่คอลัมน์ "context")
+    if not rows: return []
+    header, rows = [str(h) for h in rows[0]], rows[1:]
+    q_idx = _pick(header, column, QUESTION_FIELDS)
+    q_idx = 0 if q_idx is None else q_idx
+    id_idx = _pick(header, id_column, ID_FIELDS)
+    items = []
+    for n, row in enumerate(rows, start=2):
+        if q_idx >= len(row) or not str(row[q_idx]).strip(): continue
+        item_id = str(row[id_idx]) if id_idx is not None and id_idx < len(row) else f"{source}:{n}"
+        items.append({"id": item_id, "question": str(row[q_idx]).strip()})
+    return items
+
+def read_questions(path, column=None, id_column=None):
+    source = os.path.basename(path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx": return _from_rows(read_xlsx_rows(path), source, column, id_column)
+    if ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f: return _from_rows(list(csv.reader(f)), source, column, id_column)
+    if ext in (".jsonl", ".ndjson"):
+        items = []
+        with open(path, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line: continue
+                obj = json.loads(line)
+                if isinstance(obj, str): obj = {"question": obj}
+                key = column or next((k for k in QUESTION_FIELDS if k in obj), None)
+                if not key or not str(obj.get(key, "")).strip(): continue
+                id_key = id_column or next((k for k in ID_FIELDS if k in obj), None)
+                items.append({"id": str(obj[id_key]) if id_key else f"{source}:{n}", "question": str(obj[key]).strip()})
+        return items
+    raise ValueError(f"ไม่รองรับไฟล์ {ext} (ใช้ .xlsx / .csv / .jsonl)")
+
+# ==========================================
+# 2. Checkpoint: ข้อที่ตอบสำเร็จแล้วใน output เดิมจะถูกข้าม
+# ==========================================
+def load_done(path, retry_errors=True):
+    done = set()
+    if not os.path.exists(path): return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try: rec = json.loads(line)
+            except ValueError: continue          # บรรทัดสุดท้ายที่เขียนไม่จบตอนโดน kill
+            if rec.get("status") == "ok" or not retry_errors: done.add(rec.get("id"))
+    return done
+
+class NullHistoryStore:
+    # คำตอบ batch ไม่ต้องปนกับประวัติแชทของผู้ใช้
+    def append(self, prompt, answer, **extra): pass
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+# ==========================================
+# 3. Runner
+# ==========================================
+class BatchRunner:
+    def __init__(self, engine, out_path, model=None, template="{question}", concurrency=BATCH_CONCURRENCY,
+                 retries=BATCH_RETRIES):
+        self.engine = engine
+        self.out_path = out_path
+        self.model = model
+        self.template = template
+        self.concurrency = concurrency
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.records = []
+
+    def ask(self, item):
+        from generation_service import is_quota_error, QueueFullError
+        prompt = self.template.format(question=item["question"])
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            turn, info = TurnMetrics(f"batch-{item['id']}", self.model), {}
+            try:
+                answer = "".join(self.engine.stream_turn(turn.session_id, prompt, [], self.model, {}, info=info, turn=turn))
+                break
+            except Exception as e:
+                turn.fail(e)
+                retryable = isinstance(e, QueueFullError) or is_quota_error(e)
+                if not retryable or attempt == self.retries:
+                    return self._record(item, None, info, turn.finish(), start, f"{type(e).__name__}: {e}", attempt)
+                turn.finish()
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+        return self._record(item, answer, info, turn.finish(), start, None, attempt)
+
+    def _record(self, item, answer, info, turn, start, error, attempt):
+        rec = {"id": item["id"], "question": item["question"], "answer": answer,
+               "status": "error" if error else "ok", "error": error, "model": info.get("model"),
+               "persona": info.get("persona"), "cached": info.get("cached", False), "retries": attempt,
+               "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+               "ttft_ms": turn["stages_ms"].get("ttft"), "tokens": turn["tokens"]}
+        # เขียนทันทีที่เสร็จ (ลำดับตามที่เสร็จ ไม่ใช่ลำดับ input) -> หยุดกลางทางแล้วรันต่อได้
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.out_path, "a", encoding="utf-8") as f: f.write(line)
+            self.records.append(rec)
+        return rec
+
+    def run(self, items, progress=None):
+        start = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch")
+        try:
+            futures = [pool.submit(self.ask, item) for item in items]
+            for n, fut in enumerate(as_completed(futures), start=1):
+                fut.result()
+                if progress and (n % PROGRESS_EVERY == 0 or n == len(items)): progress(n, len(items), time.perf_counter() - start)
+        finally:
+            # Ctrl-C: ยกเลิกข้อที่ยังไม่เริ่ม ข้อที่เขียนลงไฟล์แล้วเป็น checkpoint
+            pool.shutdown(wait=True, cancel_futures=True)
+        return self.report(time.perf_counter() - start)
+
+    def report(self, wall):
+        ok = [r for r in self.records if r["status"] == "ok"]
+        latency = [r["latency_ms"] for r in ok]
+        ttft = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+        return {"items": len(self.records), "ok": len(ok), "errors": len(self.records) - len(ok),
+                "cached": sum(r["cached"] for r in ok), "wall_s": round(wall, 2),
+                "throughput_items_per_s": round(len(self.records) / wall, 3) if wall else 0.0,
+                "latency_ms": {p: round(percentile(latency, int(p[1:])), 2) for p in ("p50", "p95", "p99")},
+                "ttft_ms": {p: round(percentile(ttft, int(p[1:])), 2) for p in ("p50", "p95", "p99")},
+                "tokens": {k: sum(r["tokens"][k] for r in ok) for k in ("input", "output", "cached")}}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run a file of questions through the chat pipeline and write JSONL results")
+    ap.add_argument("input", help="ไฟล์คำถาม .xlsx / .csv / .jsonl")
+    ap.add_argument("-o", "--output", help="ไฟล์ผล JSONL (default: <input>.answers.jsonl)")
+    ap.add_argument("--column", help="ชื่อหรือลำดับคอลัมน์ของคำถาม (default: question/prompt/คำถาม หรือคอลัมน์แรก)")
+    ap.add_argument("--id-column", help="คอลัมน์ id (default: id หรือ <ไฟล์>:<แถว>)")
+    ap.add_argument("--template", default="{question}", help='ครอบคำถามก่อนส่ง เช่น "สรุปเป็น FAQ: {question}"')
+    ap.add_argument("--model", help="default: โมเดลเดียวกับหน้าเว็บ")
+    ap.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    ap.add_argument("--retries", type=int, default=BATCH_RETRIES, help="ลองใหม่เมื่อโดน 429 / คิวเต็ม")
+    ap.add_argument("--limit", type=int, help="ทำแค่ N ข้อแรกที่ยังไม่เสร็จ")
+    ap.add_argument("--no-resume", action="store_true", help="เริ่มใหม่ทั้งหมด (ลบ output เดิม)")
+    ap.add_argument("--report", help="เขียนสรุป throughput/latency เป็น JSON ไปที่ไฟล์นี้")
+    args = ap.parse_args(argv)
+
+    items = read_questions(args.input, args.column, args.id_column)
+    out = args.output or os.path.splitext(args.input)[0] + ".answers.jsonl"
+    if args.no_resume and os.path.exists(out): os.remove(out)
+    done = load_done(out)
+    todo = [i for i in items if i["id"] not in done][:args.limit]
+    print(f"📋 {len(items)} ข้อ / เสร็จแล้ว {len(items) - len([i for i in items if i['id'] not in done])} / จะถาม {len(todo)} -> {out}",
+          file=sys.stderr)
+    if not todo: return 0
+
+    from chat_core import ChatEngine, configure_genai
+    if not configure_genai(): print("❌ ไม่พบ API Key กรุณาตรวจสอบไฟล์ .env", file=sys.stderr); return 1
+    engine = ChatEngine(history_store=NullHistoryStore())
+    engine.prefetcher.enabled = False        # ไม่ต้องเดาคำถามต่อใน batch
+    runner = BatchRunner(engine, out, args.model, args.template, args.concurrency, args.retries)
+    progress = lambda n, total, wall: print(f"  {n}/{total} ({n / wall:.2f} ข้อ/วินาที)", file=sys.stderr)
+    try: report = runner.run(todo, progress)
+    except KeyboardInterrupt:
+        print(f"⏸️ หยุดแล้ว เสร็จ {len(runner.records)} ข้อ รันคำสั่งเดิมอีกครั้งเพื่อทำต่อ", file=sys.stderr)
+        return 130
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if report["errors"] == 0 else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
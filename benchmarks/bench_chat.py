@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_genai
+genai = fake_genai.install()
+
+import prompt as prompts
+import generation_service
+from persona_router import load_persona_indexes
+from streaming import StreamRenderer
+from history_store import JsonlHistoryStore
+from model_registry import get_chat_registry
+from context_cache import ContextCacheManager
+from chat_core import ChatEngine
+
+# ==========================================
+# 1. ชุดคำถาม (ไทย/อังกฤษ) จาก prompt.py + ปุ่ม Hero
+# ==========================================
+def scenario_questions():
+    questions = [p for _, p in prompts.STARTER_PROMPTS]
+    for text in (prompts.PROMPT_NETWORK, prompts.PROMPT_WORKAW):
+        questions += re.findall(r'User: "(.+?)"', text)
+    questions += ["Who are you", "config VLAN", "How do I enable port security on a switch?",
+                  "OSPF กับ RIP ต่างกันยังไง", "config OSPF ยังไง", "วันลาป่วยได้กี่วัน"]
+    return questions
+
+# ==========================================
+# 2. Placeholder จำลอง (แทน st.empty) ให้มีต้นทุนใกล้เคียงการ parse markdown
+# ==========================================
+class BenchPlaceholder:
+    FENCE = re.compile(r"```")
+
+    def markdown(self, content):
+        self.last = content
+        self.FENCE.findall(content)
+        content.splitlines()
+
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+# ==========================================
+# 3. Pipeline: ChatEngine ตัวเดียวกับ app.py / api_server.py (ไม่มี Streamlit)
+# ==========================================
+class Pipeline:
+    def __init__(self, indexes, history_store, models):
+        self.engine = ChatEngine(models, history_store, indexes)
+        self.service = self.engine.service
+
+    def run_turn(self, session, question, model_name):
+        # ข้าม answer cache เพื่อวัดเวลาการตอบจริงทุก turn
+        m, engine = {}, self.engine
+        t0 = time.perf_counter()
+        persona = engine.route(question, session["context_state"])
+        history, message = engine.build_request(session["id"], question, session["messages"], session["context_state"], persona)
+        t1 = time.perf_counter()
+        m["prompt_build_ms"] = (t1 - t0) * 1000
+
+        renderer = StreamRenderer(BenchPlaceholder())
+        first = None
+        make_stream = lambda name: engine.stream_model(session["id"], name, persona, history, message, question)
+        for text in engine.router.stream(model_name, make_stream):
+            if first is None: first = time.perf_counter()
+            renderer.feed(text)
+        answer = renderer.finish()
+        t3 = time.perf_counter()
+        m["ttft_ms"] = ((first or t3) - t0) * 1000
+        m["total_ms"] = (t3 - t0) * 1000
+        stream_s = t3 - (first or t3)
+        m["tokens"] = len(answer.split())
+        m["tokens_per_s"] = m["tokens"] / stream_s if stream_s > 0 else 0.0
+        m["render_ms"], m["renders"] = renderer.render_time * 1000, renderer.renders
+
+        t4 = time.perf_counter()
+        engine.history_store.append(question, answer)
+        m["history_io_ms"] = (time.perf_counter() - t4) * 1000
+        session["messages"] += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+        return m
+
+# ==========================================
+# 4. Runner
+# ==========================================
+def run(args):
+    s = fake_genai.SETTINGS
+    s.first_token_latency, s.token_rate, s.jitter = args.first_token_latency, args.token_rate, args.jitter
+    s.answer_tokens, s.error_rate = args.answer_tokens, args.error_rate
+    s.prefill_rate, s.cache_min_tokens = args.prefill_rate, args.cache_min_tokens
+    generation_service.MODEL_LIMITS[:] = [["", args.model_concurrency, args.rpm]]
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="bench_chat_")
+    indexes = load_persona_indexes(index_dir=os.path.join(workdir, "index"), use_embeddings=False)
+    pipeline = Pipeline(indexes, JsonlHistoryStore(os.path.join(workdir, "history.jsonl")), s.models)
+    pipeline.engine.context_caches = ContextCacheManager(os.path.join(workdir, "context_cache.json"),
+                                                         enabled=not args.no_context_cache)
+    # คำถามของ persona ที่ไม่มี Knowledge Base ในเครื่อง (เช่นไม่มี PDF) จะถูกข้าม ไม่งั้นนับเป็น error ทั้งหมด
+    missing = [p for p in indexes if pipeline.engine.personas.index_for(p) is None]
+    questions = [q for q in scenario_questions() if pipeline.engine.personas.route(q, count=False) not in missing]
+    results, errors, lock = [], [], threading.Lock()
+
+    def user(uid):
+        rng = random.Random(args.seed + uid)
+        session = {"id": f"user-{uid}", "messages": [], "context_state": {}}
+        for _ in range(args.turns):
+            try: m = pipeline.run_turn(session, rng.choice(questions), args.model)
+            except Exception as e:
+                with lock: errors.append(repr(e))
+                continue
+            with lock: results.append(m)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - start
+
+    report = {"users": args.users, "turns": len(results), "errors": len(errors), "wall_s": round(wall, 2),
+              "throughput_turns_per_s": round(len(results) / wall, 2) if wall else 0.0,
+              "fake_counters": dict(fake_genai.COUNTERS), "queue": pipeline.service.stats(),
+              "registry": get_chat_registry().stats(), "context_cache": pipeline.engine.context_caches.stats(),
+              "personas": pipeline.engine.personas.stats(), "personas_without_kb": missing}
+    for key in ("ttft_ms", "total_ms", "tokens_per_s", "render_ms", "renders", "history_io_ms",
+                "prompt_build_ms"):
+        vals = [r[key] for r in results]
+        report[key] = {p: round(percentile(vals, int(p[1:])), 2) for p in ("p50", "p95", "p99")}
+    return report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline end-to-end benchmark of the chat pipeline (fake Gemini)")
+    ap.add_argument("--users", type=int, default=8)
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--model", default="models/gemini-1.5-flash")
+    ap.add_argument("--first-token-latency", type=float, default=0.35)
+    ap.add_argument("--token-rate", type=float, default=80.0)
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--answer-tokens", type=int, default=400)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="โอกาสโดน 429 ต่อ request")
+    ap.add_argument("--model-concurrency", type=int, default=8)
+    ap.add_argument("--rpm", type=int, default=100000)
+    ap.add_argument("--prefill-rate", type=float, default=0.0, help="token/วินาที ของ prompt ที่ไม่ได้ cache (0 = ไม่คิด)")
+    ap.add_argument("--cache-min-tokens", type=int, default=1024, help="ขั้นต่ำของ CachedContent")
+    ap.add_argument("--no-context-cache", action="store_true", help="ส่ง system instruction + preamble ทุก turn แบบเดิม")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", help="เขียนผลเป็น JSON ไปที่ไฟล์นี้")
+    ap.add_argument("--max-p95-ttft-ms", type=float, help="ล้มเหลว (exit 1) ถ้า p95 TTFT เกินค่านี้")
+    args = ap.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.max_p95_ttft_ms and report["ttft_ms"]["p95"] > args.max_p95_ttft_ms:
+        print(f"❌ p95 TTFT {report['ttft_ms']['p95']} ms > {args.max_p95_ttft_ms} ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# Fake ของ google.generativeai เฉพาะส่วนที่แอปนี้ใช้ (ไม่ต่อเน็ต)
+# เรียก install() ก่อน import โมดูลของแอป -> import google.generativeai จะได้โมดูลนี้แทน
+import sys
+import time
+import enum
+import random
+import hashlib
+import threading
+import types as _types
+from datetime import datetime, timedelta, timezone
+
+# ==========================================
+# ปรับพฤติกรรมของ fake ได้จากตรงนี้
+# ==========================================
+class FakeSettings:
+    first_token_latency = 0.35    # วินาทีก่อน chunk แรก
+    token_rate = 80.0             # token/วินาที ต่อ stream
+    jitter = 0.2                  # สัดส่วนความแกว่งของเวลา (0.2 = ±20%)
+    tokens_per_chunk = 8
+    answer_tokens = 400
+    error_rate = 0.0              # โอกาสโดน 429 ต่อ request
+    error_models = None           # None = ทุกโมเดล, หรือ set ของชื่อโมเดลที่จะโดน 429
+    processing_polls = 2          # จำนวนครั้งที่ get_file ยังเป็น PROCESSING
+    prefill_rate = 0.0            # token/วินาที ของ prompt ที่ไม่ได้ cache (เพิ่มเข้า first token latency), 0 = ไม่คิด
+    cache_min_tokens = 1024       # CachedContent ต้องมี token อย่างน้อยเท่านี้ (เหมือน API จริง)
+    models = ["models/gemini-1.5-flash", "models/gemini-1.5-flash-8b", "models/gemini-1.5-pro"]
+    model_speed = {"8b": 1.6, "pro": 0.5}   # ตัวคูณความเร็ว (token_rate ×, first token latency ÷) ตามชื่อโมเดล
+
+SETTINGS = FakeSettings()
+COUNTERS = {"send_message": 0, "generate_content": 0, "upload_file": 0, "get_file": 0, "errors_injected": 0,
+            "cache_create": 0, "cache_update": 0, "cache_hit": 0, "cache_miss": 0, "cache_expired": 0,
+            "cached_tokens": 0, "uncached_tokens": 0}
+_lock = threading.Lock()
+
+def _count(name, n=1):
+    with _lock: COUNTERS[name] += n
+
+def reset_counters():
+    with _lock:
+        for k in COUNTERS: COUNTERS[k] = 0
+
+def _sleep(seconds):
+    if seconds > 0: time.sleep(seconds * (1 + random.uniform(-SETTINGS.jitter, SETTINGS.jitter)))
+
+class ResourceExhausted(Exception):
+    code = 429
+
+class InvalidArgument(Exception):
+    code = 400
+
+class NotFound(Exception):
+    code = 404
+
+# ==========================================
+# types: HarmCategory / HarmBlockThreshold
+# ==========================================
+class HarmCategory(enum.Enum):
+    HARM_CATEGORY_HARASSMENT = 7
+    HARM_CATEGORY_HATE_SPEECH = 8
+    HARM_CATEGORY_SEXUALLY_EXPLICIT = 9
+    HARM_CATEGORY_DANGEROUS_CONTENT = 10
+
+class HarmBlockThreshold(enum.Enum):
+    BLOCK_NONE = 4
+
+types = _types.ModuleType(__name__ + ".types")
+types.HarmCategory = HarmCategory
+types.HarmBlockThreshold = HarmBlockThreshold
+
+# ==========================================
+# Models / Files
+# ==========================================
+class _ModelInfo:
+    def __init__(self, name):
+        self.name = name
+        self.supported_generation_methods = ["generateContent", "countTokens"]
+
+def configure(api_key=None, **kwargs): pass
+
+def list_models():
+    return [_ModelInfo(m) for m in SETTINGS.models]
+
+class _State:
+    def __init__(self, name): self.name = name
+
+class File:
+    def __init__(self, name, uri, polls_left):
+        self.name = name
+        self.uri = uri
+        self.polls_left = polls_left
+        self.expiration_time = datetime.now(timezone.utc) + timedelta(hours=48)
+
+    @property
+    def state(self): return _State("PROCESSING" if self.polls_left > 0 else "ACTIVE")
+
+_files = {}
+
+def upload_file(path, mime_type=None, **kwargs):
+    _count("upload_file")
+    digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+    f = _files[f"files/{digest}"] = File(f"files/{digest}", f"https://fake.local/files/{digest}", SETTINGS.processing_polls)
+    return f
+
+def get_file(name):
+    _count("get_file")
+    f = _files[name]
+    f.polls_left = max(0, f.polls_left - 1)
+    return f
+
+def embed_content(model=None, content=None, task_type=None, **kwargs):
+    def vec(text):
+        h = hashlib.sha256(text.encode("utf-8")).digest()
+        return [(b - 128) / 128 for b in h[:32]]
+    if isinstance(content, (list, tuple)): return {"embedding": [vec(c) for c in content]}
+    return {"embedding": vec(content)}
+
+# ==========================================
+# Generation
+# ==========================================
+ANSWER_WORDS = ("การตั้งค่า Interface ของ Router ทำได้ดังนี้ครับ enable configure terminal "
+                "interface GigabitEthernet0/0 ip address 192.168.1.1 255.255.255.0 no shutdown "
+                "VLAN Trunk OSPF area 0 network สวิตช์ เราเตอร์ เครือข่าย ตรวจสอบ show running-config").split()
+
+class _UsageMetadata:
+    def __init__(self, prompt_tokens, output_tokens, cached_tokens=0):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.cached_content_token_count = cached_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+class FinishReason(enum.IntEnum):
+    FINISH_REASON_UNSPECIFIED = 0
+    STOP = 1
+    MAX_TOKENS = 2
+
+class _Chunk:
+    def __init__(self, text, usage=None, finish_reason=FinishReason.FINISH_REASON_UNSPECIFIED):
+        self.text = text
+        self.usage_metadata = usage
+        self.candidates = [_types.SimpleNamespace(finish_reason=finish_reason)]
+
+def _speed(model_name):
+    return next((v for k, v in SETTINGS.model_speed.items() if k in (model_name or "")), 1.0)
+
+def _estimate_tokens(obj):
+    if isinstance(obj, str): return max(1, len(obj) // 3)
+    if isinstance(obj, dict): return sum(_estimate_tokens(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)): return sum(_estimate_tokens(v) for v in obj)
+    if isinstance(obj, File): return 20000
+    return 1
+
+def _estimate_part(obj):
+    # file_data ที่อ้าง uri ของไฟล์ที่ upload แล้วนับเท่ากับตัวไฟล์
+    if isinstance(obj, dict) and "file_data" in obj: return 20000
+    if isinstance(obj, dict) and "parts" in obj: return sum(_estimate_part(p) for p in obj["parts"])
+    if isinstance(obj, (list, tuple)): return sum(_estimate_part(v) for v in obj)
+    return _estimate_tokens(obj)
+
+class GenerateContentResponse:
+    def __init__(self, model_name, prompt_tokens, max_tokens, stream, cached_tokens=0):
+        self.model_name = model_name
+        self.n_tokens = min(SETTINGS.answer_tokens, max_tokens or SETTINGS.answer_tokens)
+        self.truncated = self.n_tokens < SETTINGS.answer_tokens
+        self.prompt_tokens = prompt_tokens
+        self.cached_tokens = cached_tokens
+        self.stream = stream
+        self._chunks = None
+        self.on_done = None           # ChatSession ใช้เก็บคำตอบลง history เมื่อ stream จบ
+        self.usage_metadata = _UsageMetadata(prompt_tokens, self.n_tokens, cached_tokens)
+
+    def __iter__(self):
+        prefill = (self.prompt_tokens - self.cached_tokens) / SETTINGS.prefill_rate if SETTINGS.prefill_rate else 0.0
+        speed = _speed(self.model_name)
+        _sleep(SETTINGS.first_token_latency / speed + prefill)
+        produced, parts = 0, []
+        while produced < self.n_tokens:
+            n = min(SETTINGS.tokens_per_chunk, self.n_tokens - produced)
+            text = " ".join(random.choice(ANSWER_WORDS) for _ in range(n)) + " "
+            produced += n
+            parts.append(text)
+            _sleep(n / (SETTINGS.token_rate * speed))
+            last = produced >= self.n_tokens
+            reason = (FinishReason.MAX_TOKENS if self.truncated else FinishReason.STOP) if last else \
+                FinishReason.FINISH_REASON_UNSPECIFIED
+            yield _Chunk(text, self.usage_metadata if last else None, reason)
+        if self.on_done: self.on_done("".join(parts))
+
+    @property
+    def text(self):
+        if self._chunks is None: self._chunks = [c.text for c in self]
+        return "".join(self._chunks)
+
+def _maybe_fail(model_name):
+    if SETTINGS.error_models is not None and model_name not in SETTINGS.error_models: return
+    if random.random() < SETTINGS.error_rate:
+        _count("errors_injected")
+        raise ResourceExhausted(f"429 Resource has been exhausted (model {model_name})")
+
+class GenerativeModel:
+    def __init__(self, model_name="models/gemini-1.5-flash", generation_config=None, safety_settings=None,
+                 system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.safety_settings = safety_settings
+        self.system_instruction = system_instruction
+        self.cached_content = None
+
+    @classmethod
+    def from_cached_content(cls, cached_content, generation_config=None, safety_settings=None, **kwargs):
+        model = cls(cached_content.model, generation_config, safety_settings)
+        model.cached_content = cached_content
+        return model
+
+    def _max_tokens(self, override=None):
+        cfg = override or self.generation_config
+        return cfg.get("max_output_tokens") if isinstance(cfg, dict) else getattr(cfg, "max_output_tokens", None)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        _count("generate_content")
+        return self._generate(contents, stream, kwargs.get("generation_config"))
+
+    def _generate(self, contents, stream, generation_config=None):
+        _maybe_fail(self.model_name)
+        cached = 0
+        if self.cached_content is not None:
+            cache = _caches.get(self.cached_content.name)
+            if cache is None or cache.expired:
+                _count("cache_expired")
+                raise NotFound(f"404 CachedContent not found (or expired): {self.cached_content.name}")
+            cached = cache.token_count
+            _count("cache_hit")
+        else: _count("cache_miss")
+        uncached = _estimate_part(contents) + _estimate_tokens(self.system_instruction or "")
+        _count("cached_tokens", cached)
+        _count("uncached_tokens", uncached)
+        return GenerateContentResponse(self.model_name, uncached + cached, self._max_tokens(generation_config), stream, cached)
+
+    def count_tokens(self, contents):
+        return _types.SimpleNamespace(total_tokens=_estimate_part(contents))
+
+    def start_chat(self, history=None, **kwargs):
+        return ChatSession(self, list(history or []))
+
+class ChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = history
+
+    def send_message(self, content, stream=False, **kwargs):
+        _count("send_message")
+        response = self.model._generate(self.history + [{"role": "user", "parts": [content]}], stream=stream,
+                                        generation_config=kwargs.get("generation_config"))
+        self.history.append({"role": "user", "parts": [content]})
+        response.on_done = lambda text: self.history.append({"role": "model", "parts": [text]})
+        return response
+
+# ==========================================
+# caching: CachedContent (system instruction + contents ที่เก็บไว้ฝั่ง server ตาม TTL)
+# ==========================================
+_caches = {}
+
+class CachedContent:
+    def __init__(self, name, model, display_name, token_count, ttl):
+        self.name = name
+        self.model = model
+        self.display_name = display_name
+        self.token_count = token_count
+        self.expire_time = datetime.now(timezone.utc) + ttl
+
+    @property
+    def expired(self): return datetime.now(timezone.utc) >= self.expire_time
+
+    @classmethod
+    def create(cls, model, display_name=None, system_instruction=None, contents=None, ttl=None, **kwargs):
+        tokens = _estimate_part(contents or []) + _estimate_tokens(system_instruction or "")
+        if tokens < SETTINGS.cache_min_tokens:
+            raise InvalidArgument(f"400 Cached content is too small. total_token_count={tokens}, "
+                                  f"min_total_token_count={SETTINGS.cache_min_tokens}")
+        _count("cache_create")
+        digest = hashlib.sha1(f"{model}{display_name}{time.time()}{random.random()}".encode()).hexdigest()[:12]
+        cache = _caches[f"cachedContents/{digest}"] = cls(f"cachedContents/{digest}", model, display_name, tokens,
+                                                          ttl or timedelta(hours=1))
+        return cache
+
+    @classmethod
+    def get(cls, name):
+        cache = _caches.get(name)
+        if cache is None or cache.expired: raise NotFound(f"404 CachedContent not found: {name}")
+        return cache
+
+    def update(self, ttl=None, expire_time=None, **kwargs):
+        if self.name not in _caches or self.expired: raise NotFound(f"404 CachedContent not found: {self.name}")
+        _count("cache_update")
+        self.expire_time = expire_time or datetime.now(timezone.utc) + (ttl or timedelta(hours=1))
+
+    def delete(self):
+        _caches.pop(self.name, None)
+
+caching = _types.ModuleType(__name__ + ".caching")
+caching.CachedContent = CachedContent
+
+# ==========================================
+# install: แทนที่ google.generativeai ใน sys.modules
+# ==========================================
+def install():
+    this = sys.modules[__name__]
+    google = sys.modules.get("google")
+    if google is None:
+        try: import google
+        except ImportError:
+            google = _types.ModuleType("google")
+            google.__path__ = []
+            sys.modules["google"] = google
+    google.generativeai = this
+    sys.modules["google.generativeai"] = this
+    sys.modules["google.generativeai.types"] = types
+    sys.modules["google.generativeai.caching"] = caching
+    return this
@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==========================================
+# ชุด import ที่วัด (python -X importtime)
+#   shell  = สิ่งที่ app.py import ก่อนวาดหน้าเว็บ (ต้องเบา)
+#   engine = สิ่งที่ warm-up thread import เบื้องหลัง (SDK + pipeline)
+#   legacy = import ทั้งหมดก่อนวาด UI แบบเดิม (shell + engine)
+# ==========================================
+PROFILES = {
+    "shell": ["streamlit", "streaming", "history_store", "prompt", "metrics", "startup"],
+    "engine": ["google.generativeai", "dotenv", "chat_core", "generation_service", "http.server"],
+}
+PROFILES["legacy"] = PROFILES["shell"] + PROFILES["engine"]
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+def run_importtime(modules, fake=False):
+    code = [f"import sys; sys.path[:0] = [{ROOT!r}, {BENCH_DIR!r}]"]
+    if fake: code.append("import fake_genai; fake_genai.install()")
+    code.append("import importlib")
+    code.append(f"for m in {modules!r}:\n"
+                "    try: importlib.import_module(m)\n"
+                "    except ImportError as e: print('MISSING', m, e)")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "\n".join(code)], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    entries = []
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m: entries.append({"module": m.group(4), "self_us": int(m.group(1)), "cumulative_us": int(m.group(2)),
+                              "depth": len(m.group(3)) // 2})
+    missing = [line.split(" ", 2)[1] for line in proc.stdout.splitlines() if line.startswith("MISSING")]
+    return entries, missing, wall
+
+def profile(name, modules, baseline, fake=False, top=15):
+    entries, missing, wall = run_importtime(modules, fake)
+    # ตัด import ของตัว interpreter เอง (site, encodings, ...) ออกด้วย baseline ที่ไม่ได้ import อะไรเลย
+    roots = [e for e in entries if e["depth"] == 0 and e["module"] not in baseline]
+    total_ms = sum(e["cumulative_us"] for e in roots) / 1000
+    heaviest = sorted((e for e in entries if e["module"] not in baseline), key=lambda e: e["cumulative_us"], reverse=True)
+    return {"profile": name, "modules": modules, "missing": missing, "import_ms": round(total_ms, 1),
+            "process_wall_ms": round(wall * 1000, 1),
+            "top": [{"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 1),
+                     "self_ms": round(e["self_us"] / 1000, 1)} for e in heaviest[:top]]}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cold-start import profile of the Streamlit entry point (-X importtime)")
+    ap.add_argument("--profile", choices=sorted(PROFILES) + ["all"], default="all")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--fake", action="store_true", help="ใช้ fake_genai แทน SDK จริง (ไม่ได้วัดต้นทุนของ SDK)")
+    ap.add_argument("--json", help="เขียนผลเป็น JSON ไปที่ไฟล์นี้")
+    args = ap.parse_args(argv)
+
+    baseline = {e["module"] for e in run_importtime([], args.fake)[0] if e["depth"] == 0}
+    names = sorted(PROFILES) if args.profile == "all" else [args.profile]
+    reports = [profile(n, PROFILES[n], baseline, args.fake, args.top) for n in names]
+    for r in reports:
+        print(f"\n== {r['profile']}: {r['import_ms']} ms import / {r['process_wall_ms']} ms process"
+              + (f" (missing: {', '.join(r['missing'])})" if r["missing"] else ""))
+        for e in r["top"]: print(f"  {e['cumulative_ms']:>9.1f} ms  {e['module']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(reports, f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import deque
+
+from metrics import get_metrics, log_event
+from model_router import is_chat_model
+
+# ==========================================
+# Model Cascade: ประเมินความซับซ้อนของคำถามในเครื่อง -> คำถามง่ายส่งโมเดลที่เบา/เร็วที่สุดพร้อม output budget แคบ
+#   คำถามซับซ้อน หรือคำตอบจากโมเดลเบาใช้ไม่ได้ -> ใช้โมเดลที่เลือกไว้ (config เต็ม)
+# ==========================================
+CASCADE_ENABLED = os.getenv("CASCADE", "1") == "1"
+LIGHT_THRESHOLD = float(os.getenv("CASCADE_LIGHT_THRESHOLD", "0.35"))   # complexity ต่ำกว่านี้ = คำถามง่าย
+LIGHT_MIN_TOKENS, LIGHT_MAX_TOKENS = 256, 1024                          # output budget ของโมเดลเบา
+HOLD_CHARS = 160          # ถือข้อความช่วงแรกของโมเดลเบาไว้ตรวจก่อนส่งออก (ยังเปลี่ยนไปโมเดลใหญ่ได้โดยผู้ใช้ไม่เห็นคำตอบซ้ำ)
+EWMA_ALPHA = 0.3
+LIGHT, FULL = "light", "full"
+
+# ==========================================
+# 1. Classifier: คะแนนความซับซ้อน 0–1 + ความยาวคำตอบที่คาด (token)
+# ==========================================
+SIMPLE_CUES = re.compile(r"(คุณ(คือ|เป็น)ใคร|who are you|สวัสดี|^\s*(hi|hello)\b|ขอบคุณ|thank|กี่วัน|กี่ชั่วโมง|กี่ครั้ง|กี่บาท"
+                         r"|เท่าไร|เท่าไหร่|ได้ไหม|ได้มั้ย|ใช่ไหม|หรือไม่|ย่อมาจาก|stands for|คืออะไร|what is)", re.I)
+MEDIUM_CUES = re.compile(r"(config|ตั้งค่า|คำสั่ง|command|อธิบาย|explain|อย่างไร|ยังไง|how|ทำไม|why|ตัวอย่าง|example|ขั้นตอน)", re.I)
+HEAVY_CUES = re.compile(r"(ออกแบบ|design|วางแผน|plan|เปรียบเทียบ|compare|ต่างกัน|difference|วิเคราะห์|analy[sz]e|แก้ปัญหา"
+                        r"|troubleshoot|debug|ทีละขั้น|step.?by.?step|ละเอียด|detail|ทั้งหมด|ครบ|topology|คำนวณ|calculat)", re.I)
+FOLLOW_UP_CUES = re.compile(r"(ขยายความ|เพิ่มเติม|อีก|ต่อ(จาก)?|more|elaborate)", re.I)
+CLAUSE_SPLIT = re.compile(r"[?？,\n]|\bและ\b|\band\b| และ | กับ ")
+PERSONA_WEIGHT = {"network": 0.1}     # คำตอบ network มี code block + คำอธิบายทีละบรรทัด -> ยาวกว่าปกติ
+
+def classify(prompt, messages=(), persona=None):
+    text = prompt.strip()
+    score = 0.3 + PERSONA_WEIGHT.get(persona, 0.0)
+    if SIMPLE_CUES.search(text): score -= 0.3
+    if MEDIUM_CUES.search(text): score += 0.2
+    score += 0.35 * min(2, len(HEAVY_CUES.findall(text)))
+    score += min(0.3, len(text) / 400)
+    score += min(0.2, 0.1 * (len([c for c in CLAUSE_SPLIT.split(text) if c.strip()]) - 1))
+    if messages and FOLLOW_UP_CUES.search(text): score += 0.2
+    score = max(0.0, min(1.0, score))
+    return round(score, 3), int(150 + 1800 * score)
+
+def model_weight(name):
+    # ยิ่งน้อยยิ่งเบา/เร็ว (เดาจากชื่อ: flash-8b < flash < อื่นๆ < pro, รุ่น thinking/exp ช้ากว่า)
+    n = name.lower()
+    weight = 3.0 if "pro" in n or "ultra" in n else 1.0 if "flash" in n else 2.0
+    if "8b" in n or "lite" in n: weight -= 0.5
+    if "thinking" in n or "exp" in n: weight += 1.0
+    return weight
+
+# ==========================================
+# 2. ตรวจคำตอบของโมเดลเบา (ใช้ไม่ได้ -> escalate)
+# ==========================================
+REFUSAL = re.compile(r"ขออภัย\s*ข้อมูลส่วนนี้ไม่มีในเอกสาร|I (?:can't|cannot|am unable to) answer", re.I)
+BLOCKED = {"SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII", "OTHER"}
+
+def rejection(text, finish_reason=None):
+    if not text.strip(): return "empty"
+    if finish_reason in BLOCKED: return "blocked"
+    if finish_reason == "MAX_TOKENS": return "truncated"
+    if REFUSAL.search(text[:HOLD_CHARS * 2]): return "refusal"
+    return None
+
+# ==========================================
+# 3. Cascade: เลือกโมเดล/budget ต่อคำถาม + escalate + log การตัดสินใจและเวลาที่ประหยัดได้
+# ==========================================
+class ModelCascade:
+    def __init__(self, router, models, enabled=CASCADE_ENABLED, threshold=LIGHT_THRESHOLD):
+        self.router = router
+        self.models = list(models)
+        self.enabled = enabled
+        self.threshold = threshold
+        self.baseline = {}                 # EWMA เวลาทั้ง turn (วินาที) ของคำถามที่ตอบด้วยโมเดลเต็ม ต่อโมเดล
+        self.recent = deque(maxlen=50)     # การตัดสินใจล่าสุด (ดูใน sidebar / debug)
+        self.lock = threading.Lock()
+        self.counts = {LIGHT: 0, FULL: 0}
+        self.escalations, self.user_rejections, self.truncated = {}, 0, 0
+        self.saved = 0.0
+
+    def lightest(self, model_name):
+        # โมเดลที่เบาที่สุดที่คุยได้ (เสมอกัน -> latency จาก router ต่ำกว่า) แต่ไม่หนักกว่าโมเดลที่ผู้ใช้เลือก
+        #   ชื่อมี flash/lite แต่เป็น TTS / สร้างภาพ / embedding -> ไม่นับ (เหมือน candidates ของ router)
+        health = self.router.stats()
+        def key(name):
+            latency = (health.get(name) or {}).get("latency_ms")
+            return model_weight(name), latency if latency is not None else float("inf")
+        pool = [m for m in self.models if is_chat_model(m) and model_weight(m) <= model_weight(model_name)
+                and not (health.get(m) or {}).get("cooling")] or [model_name]
+        return min(pool, key=key)
+
+    def plan(self, prompt, messages, persona, model_name, tier=None):
+        # tier บังคับได้ ("full" = ผู้ใช้ขอคำตอบจากโมเดลใหญ่)
+        from model_registry import GENERATION_CONFIG
+        score, expected = classify(prompt, messages, persona)
+        if tier not in (LIGHT, FULL): tier = LIGHT if self.enabled and score < self.threshold else FULL
+        if tier == FULL:
+            return {"tier": FULL, "model": model_name, "config": None, "score": score, "expected_tokens": expected,
+                    "fallback": model_name}
+        budget = max(LIGHT_MIN_TOKENS, min(LIGHT_MAX_TOKENS, 2 * expected))
+        return {"tier": LIGHT, "model": self.lightest(model_name), "score": score, "expected_tokens": expected,
+                "config": dict(GENERATION_CONFIG, max_output_tokens=budget), "fallback": model_name}
+
+    def stream(self, plan, make_stream, info, turn):
+        # make_stream(model_name, config) -> iterable ของข้อความ, turn.finish_reason = เหตุที่ stream จบ
+        start = time.perf_counter()
+        info.update(tier=plan["tier"], complexity=plan["score"])
+        reason = None
+        try:
+            if plan["tier"] == LIGHT:
+                held, emitted = [], False
+                try:
+                    for text in self.router.stream(plan["model"], lambda name: make_stream(name, plan["config"]), info):
+                        if emitted: yield text; continue
+                        held.append(text)
+                        if sum(map(len, held)) < HOLD_CHARS: continue
+                        reason = rejection("".join(held))
+                        if reason: break
+                        emitted = True
+                        yield from held
+                    if not emitted:
+                        reason = reason or rejection("".join(held), turn.finish_reason)
+                        if not reason: emitted = True; yield from held
+                    elif turn.finish_reason == "MAX_TOKENS": info["truncated"] = True    # ส่งออกไปแล้ว -> ให้ผู้ใช้กดขอโมเดลใหญ่
+                except Exception as e:
+                    if emitted: raise
+                    reason = "error:" + type(e).__name__
+                if not reason: return
+                # คำตอบของโมเดลเบายังไม่ถูกส่งออก -> ตอบใหม่ด้วยโมเดลเต็มแบบไม่มีรอยต่อ
+                info["escalated"], turn.finish_reason = reason, None
+            yield from self.router.stream(plan["fallback"], lambda name: make_stream(name, None), info)
+        finally:
+            self._record(plan, info, reason, time.perf_counter() - start)
+
+    def _record(self, plan, info, reason, elapsed):
+        model = info.get("model", plan["model"])
+        with self.lock:
+            self.counts[plan["tier"]] += 1
+            if reason: self.escalations[reason.split(":")[0]] = self.escalations.get(reason.split(":")[0], 0) + 1
+            if info.get("truncated"): self.truncated += 1
+            baseline = self.baseline.get(plan["fallback"])
+            saved = baseline - elapsed if plan["tier"] == LIGHT and not reason and baseline is not None else None
+            if plan["tier"] == FULL:
+                self.baseline[model] = elapsed if model not in self.baseline else \
+                    EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.baseline[model]
+            if saved is not None: self.saved += max(0.0, saved)
+            decision = {"tier": plan["tier"], "score": plan["score"], "expected_tokens": plan["expected_tokens"],
+                        "model": model, "budget": (plan["config"] or {}).get("max_output_tokens"), "escalated": reason,
+                        "truncated": bool(info.get("truncated")),
+                        "latency_ms": round(elapsed * 1000), "saved_ms": round(saved * 1000) if saved is not None else None}
+            self.recent.append(decision)
+        r = get_metrics()
+        r.inc("cascade_turns_total", 1, {"tier": plan["tier"], "outcome": "escalated" if reason else "ok"},
+              help="Model cascade decisions by tier and outcome")
+        if saved: r.inc("cascade_saved_seconds_total", max(0.0, saved), help="Estimated latency saved by the light tier")
+        log_event("cascade", **decision)
+
+    def reject(self, session_id):
+        # ผู้ใช้กดขอคำตอบละเอียดจากโมเดลใหญ่หลังได้คำตอบจากโมเดลเบา
+        with self.lock: self.user_rejections += 1
+        get_metrics().inc("cascade_user_rejections_total", 1, help="Light answers the user asked to redo with the full model")
+        log_event("cascade_rejected", session_id=session_id)
+
+    def stats(self):
+        with self.lock:
+            total = sum(self.counts.values())
+            return {"light": self.counts[LIGHT], "full": self.counts[FULL], "escalations": dict(self.escalations),
+                    "user_rejections": self.user_rejections, "truncated": self.truncated, "light_rate": self.counts[LIGHT] / total if total else 0.0,
+                    "saved_ms": round(self.saved * 1000), "threshold": self.threshold}
+
+if __name__ == "__main__":
+    # ลองคะแนนกับคำถามจริง: python cascade.py "คุณคือใคร" "ออกแบบ LAN ให้ออฟฟิศ 3 ชั้น"
+    for q in sys.argv[1:]:
+        score, expected = classify(q)
+        print(f"{score:.2f} ({LIGHT if score < LIGHT_THRESHOLD else FULL}, ~{expected} tokens)  {q}")
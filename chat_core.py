@@ -0,0 +1,237 @@
+import os
+import time
+import threading
+
+import google.generativeai as genai
+
+from retrieval import retrieve, format_context, embed_query, USE_EMBEDDINGS
+from streaming import iter_text_chunks
+from history_store import get_history_store
+from answer_cache import AnswerCache
+from file_registry import FileRegistry
+from generation_service import get_generation_service
+from model_router import ModelRouter
+from context_budget import ContextBudget, make_summary_prompt
+from model_registry import get_model_registry, get_chat_registry
+from context_cache import get_context_caches, prefix_key, is_cache_error
+from persona_router import PersonaRouter
+from metrics import TurnMetrics
+from prefetch import Prefetcher
+from fast_path import FastPath
+from cascade import ModelCascade
+from singleflight import get_single_flight, flight_key, SINGLE_FLIGHT_ENABLED
+from startup import load_api_key, default_model, FALLBACK_MODELS
+
+# ==========================================
+# Chat Core: pipeline การตอบ 1 turn (ใช้ร่วมกันทั้ง Streamlit และ HTTP API)
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_PATH = os.path.join(BASE_DIR, "Data_Content_Network.pdf")
+SUMMARY_CONFIG = {"temperature": 0.0, "max_output_tokens": 512}
+FILE_FALLBACK = {"network": PDF_PATH}   # persona ที่ upload ไฟล์ต้นฉบับทั้งไฟล์แทนได้ถ้าไม่มี local index
+
+class KnowledgeBaseUnavailable(RuntimeError):
+    pass
+
+def configure_genai():
+    api_key = load_api_key()
+    if api_key: genai.configure(api_key=api_key)
+    return bool(api_key)
+
+def list_chat_models(fallback=FALLBACK_MODELS):
+    try:
+        return [m.name for m in genai.list_models()
+                if 'generateContent' in m.supported_generation_methods and 'gemini' in m.name]
+    except Exception: return list(fallback or [])
+
+def to_history(messages):
+    return [{"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]} for m in messages]
+
+class ChatEngine:
+    def __init__(self, models=None, history_store=None, indexes=None):
+        self.models = models or list_chat_models()
+        self.history_store = history_store or get_history_store(BASE_DIR)
+        self.personas = PersonaRouter(indexes)
+        self.router = ModelRouter(self.models)
+        self.cascade = ModelCascade(self.router, self.models)
+        self.service = get_generation_service()
+        self.chats = get_chat_registry()
+        self.context_caches = get_context_caches()
+        self.flights = get_single_flight()
+        self.file_registry = FileRegistry()
+        self._cache, self._cache_version = None, None
+        self._lock = threading.Lock()
+        self.prefetcher = Prefetcher(self)
+        self.fast_path = FastPath()
+
+    # ---------- Knowledge Base ----------
+    @property
+    def kb_ready(self): return any(self.personas.index_for(p) for p in self.personas.indexes)
+
+    def warm_up(self):
+        # สร้างโมเดล + เปิด connection ของโมเดลตระกูล flash ไว้ก่อนคำถามแรก
+        get_model_registry().warm_up([m for m in self.models if "flash" in m][:2], self.personas.default)
+
+    def set_models(self, models):
+        # รายชื่อโมเดลใหม่จาก catalog: ใช้ engine/index เดิม แค่ให้ router กับ cascade รู้จักโมเดลใหม่
+        models = list(models)
+        self.router.add(models)
+        self.cascade.models = models
+        self.models = models
+
+    def kb_counts(self):
+        return {p: len(index) if index is not None else 0 for p, index in self.personas.indexes.items()}
+
+    def route(self, prompt, context_state):
+        # เลือก persona ต่อคำถาม (คำถามกำกวมจะอยู่กับ persona เดิมของบทสนทนา)
+        persona = self.personas.route(prompt, context_state.get("persona"))
+        context_state["persona"] = persona
+        return persona
+
+    def file_part(self, persona="network"):
+        # fallback: แนบไฟล์ต้นฉบับทั้งไฟล์ (upload เบื้องหลังถ้ายังไม่มี handle)
+        path = FILE_FALLBACK.get(persona)
+        if path is None: return None
+        try:
+            self.file_registry.start_refresher([path])
+            entry = self.file_registry.ensure_background(path)
+            return FileRegistry.as_part(entry) if entry else None
+        except Exception: return None
+
+    def answer_cache(self, kb_version):
+        with self._lock:
+            if self._cache is None: self._cache = AnswerCache(embed_fn=embed_query if USE_EMBEDDINGS else None)
+            if self._cache_version != kb_version:
+                # Knowledge Base เปลี่ยน -> ล้างคำตอบของเวอร์ชันเก่า
+                self._cache.invalidate(kb_version)
+                self._cache_version = kb_version
+            return self._cache
+
+    # ---------- Generation ----------
+    def summarize(self, session_id, persona, previous, messages):
+        model_name = next((m for m in self.models if "flash" in m), self.models[0])
+        # system instruction แยกของงานสรุป (instruction ของ persona มี KB_RULES -> อาจตอบ "ไม่มีในเอกสาร" แทนสรุป)
+        model = get_model_registry().get(model_name, "summary", SUMMARY_CONFIG)
+        prompt = make_summary_prompt(previous, messages)
+        return "".join(self.service.submit(session_id, model_name, lambda: [model.generate_content(prompt).text]))
+
+    def stream_model(self, session_id, model_name, persona, history, message, prompt, turn=None, config=None, background=False):
+        # config = generation_config ของ turn นี้ (เช่น output budget แคบของ cascade) ไม่ส่ง = config กลางของโมเดล
+        # background = งานเดาล่วงหน้า: คิวลำดับต่ำของ service และไม่เก็บ chat ไว้ใช้ต่อ
+        turn = turn or TurnMetrics(session_id, model_name)
+        options = {"generation_config": config} if config else {}
+        # history[0] = preamble คงที่ (ไฟล์/คำสั่ง) -> อยู่ใน CachedContent ร่วมกับ system instruction ถ้าสร้างได้
+        with turn.stage("context_cache"): cache = self.context_caches.get(model_name, persona, history[0]["parts"])
+        def start(cache):
+            rest = history[1:] if cache is not None else history
+            with turn.stage("model_setup"): chat, _ = self.chats.acquire(session_id, model_name, persona, rest, cache)
+            return chat, rest
+        def run():
+            nonlocal cache
+            chat, rest = start(cache)
+            turn.finish_reason = None
+            try: response = chat.send_message(message, stream=True, **options)
+            except Exception as e:
+                # cache หมดอายุ/ถูกลบไปก่อนกำหนด -> ทิ้ง แล้วส่ง prefix แบบเต็มใน turn นี้แทน
+                if cache is None or not is_cache_error(e): raise
+                self.context_caches.invalidate(prefix_key(model_name, persona, history[0]["parts"]))
+                get_model_registry().forget_cache(cache.name)
+                cache = None
+                chat, rest = start(cache)
+                response = chat.send_message(message, stream=True, **options)
+            parts = []
+            for chunk in response:
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage is not None: turn.add_usage(usage)
+                reason = getattr((getattr(chunk, "candidates", None) or [None])[0], "finish_reason", None)
+                if reason: turn.finish_reason = getattr(reason, "name", str(reason))
+                if chunk.text: parts.append(chunk.text); yield chunk.text
+            if not background: self.chats.release(session_id, model_name, persona, chat, prompt, "".join(parts), rest, cache)
+        # ส่งงานเข้าคิวกลาง (จำกัด concurrency / rate ต่อโมเดล และสลับคิวระหว่าง session)
+        return self.service.submit(session_id, model_name, run, background)
+
+    def build_request(self, session_id, prompt, messages, context_state, persona, file_part=None, turn=None):
+        turn = turn or TurnMetrics(session_id)
+        # excerpts (จาก index ของ persona นี้เท่านั้น) แนบไปกับคำถามของ turn นี้ history ต้นเรื่องจึงคงที่และใช้ chat session เดิมต่อได้
+        with turn.stage("kb_attach"):
+            index = self.personas.index_for(persona)
+            if index is not None:
+                context = format_context(retrieve(index, prompt)) or "(ไม่พบเนื้อหาที่เกี่ยวข้องในเอกสาร)"
+                history = [{"role": "user", "parts": ["Answer based on the document excerpts attached to each question."]}]
+                message = f"Document excerpts:\n\n{context}\n\nQuestion: {prompt}"
+            else:
+                file_part = (file_part if persona in FILE_FALLBACK else None) or self.file_part(persona)
+                if file_part is None: raise KnowledgeBaseUnavailable(f"knowledge base for '{persona}' is not ready")
+                history = [{"role": "user", "parts": [file_part, "Answer based on this file."]}]
+                message = prompt
+        # ส่งเฉพาะ window ล่าสุดตาม token budget + สรุปของเก่า -> prompt ไม่โตตามความยาว session
+        with turn.stage("history_build"):
+            budget = ContextBudget(summarize_fn=lambda prev, msgs: self.summarize(session_id, persona, prev, msgs))
+            summary, recent = budget.build(messages, context_state)
+            # สรุปแนบไปกับคำถาม (ไม่ใส่ใน preamble) preamble จึงคงที่ตลอดและ cache ได้
+            if summary: message = f"Summary of the earlier conversation:\n{summary}\n\n{message}"
+            return history + to_history(recent), message
+
+    def stream_turn(self, session_id, prompt, messages, model_name=None, context_state=None,
+                    file_part=None, info=None, turn=None, tier=None):
+        # messages = ประวัติก่อนหน้า (ไม่รวม prompt นี้), info (dict) จะได้ model/persona/cached/tier ที่ใช้จริง
+        # tier = "full" บังคับใช้โมเดลที่เลือกแบบ config เต็ม (เช่นผู้ใช้ไม่พอใจคำตอบจากโมเดลเบา)
+        # turn (TurnMetrics) ส่งมาเองได้ถ้าจะจับเวลา render ต่อ แล้วเรียก turn.finish() เอง
+        model_name = model_name or default_model(self.models)
+        context_state = {} if context_state is None else context_state
+        info = {} if info is None else info
+        owns_turn = turn is None
+        turn = turn or TurnMetrics(session_id, model_name)
+        try:
+            persona = self.route(prompt, context_state)
+            kb_version = self.personas.version
+            cache = self.answer_cache(kb_version)
+            # cache เฉพาะคำถามแรกของบทสนทนา (คำตอบไม่ขึ้นกับประวัติ) เช่นปุ่ม Hero
+            cacheable = not messages
+            reuse = tier != "full"       # ขอคำตอบจากโมเดลเต็ม = ไม่ใช้คำตอบสำเร็จรูปใดๆ
+            cached = cache.get(prompt, model_name, kb_version) if cacheable and reuse else None
+            # คำถามต่อที่เดาไว้และตอบล่วงหน้าแล้ว (prefetch.py) -> stream ได้ทันที
+            prefetched = None if cacheable or not reuse else self.prefetcher.take(session_id, prompt, messages, model_name, kb_version)
+            # คำถาม config ที่ชัดเจน -> ตอบจาก recipe คำสั่ง IOS ในเครื่อง ไม่ต้องเรียก Gemini
+            fast = None if cached or prefetched or not reuse or persona != "network" else \
+                self.fast_path.answer(prompt, self.personas.index_for(persona))
+            cached = cached or prefetched or fast
+            info.update(model=model_name, persona=persona, cached=bool(cached), prefetched=bool(prefetched),
+                        fast_path=bool(fast))
+            turn.model, turn.persona, turn.cached = model_name, persona, bool(cached)
+            parts = []
+            if cached:
+                for piece in iter_text_chunks(cached):
+                    turn.mark_first_chunk(); parts.append(piece); yield piece
+            else:
+                def produce(route_info):
+                    history, message = self.build_request(session_id, prompt, messages, context_state, persona, file_part, turn)
+                    make_stream = lambda name, config: self.stream_model(session_id, name, persona, history, message,
+                                                                         prompt, turn, config)
+                    # คำถามง่าย -> โมเดลเบา + output budget แคบ, ซับซ้อน/คำตอบใช้ไม่ได้ -> โมเดลที่เลือก
+                    plan = self.cascade.plan(prompt, messages, persona, model_name, tier)
+                    yield from self.cascade.stream(plan, make_stream, route_info, turn)
+                # คำถามแรกที่เหมือนกันและกำลังตอบอยู่ (เช่นทั้งห้องกดปุ่ม Hero พร้อมกัน) -> ใช้ upstream เดียวกัน
+                stream = self.flights.stream(flight_key(prompt, model_name, kb_version, persona), produce, info) \
+                    if cacheable and reuse and SINGLE_FLIGHT_ENABLED else produce(info)
+                for text in stream:
+                    turn.mark_first_chunk(); parts.append(text); yield text
+            turn.model = info.get("model", model_name)
+            turn.record("stream", time.perf_counter() - turn.started - turn.stages.get("ttft", 0.0))
+            answer = "".join(parts)
+            # cache ใต้ชื่อโมเดลที่ผู้ใช้เลือก -> เก็บเฉพาะคำตอบจากโมเดลนั้นจริง (ไม่ใช่โมเดลเบาของ cascade / โมเดลที่ failover ไป)
+            answered_by_requested = info.get("model", model_name) == model_name and info.get("tier") != "light"
+            if cacheable and not cached and answered_by_requested and not info.get("coalesced") and not info.get("truncated"):
+                cache.put(prompt, model_name, kb_version, answer)
+            with turn.stage("save_history"): self.history_store.append(prompt, answer, session_id=session_id)
+            history_after = list(messages) + [{"role": "user", "content": prompt}, {"role": "assistant", "content": answer}]
+            self.prefetcher.after_turn(session_id, prompt, answer, history_after, model_name, persona, context_state)
+        except GeneratorExit:
+            # ผู้ใช้ปิดหน้าเว็บ/หยุดกลางทาง -> ไม่นับเป็นคำตอบที่สำเร็จ
+            turn.abort()
+            raise
+        except Exception as e:
+            turn.fail(e)
+            raise
+        finally:
+            if owns_turn: turn.finish()
@@ -0,0 +1,85 @@
+import os
+import re
+
+# ==========================================
+# ตั้งค่า Context Budget
+# ==========================================
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))   # token สำหรับประวัติล่าสุด
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "600"))    # token สำหรับสรุปของเก่า
+MIN_RECENT_MESSAGES = 2                                                 # อย่างน้อย 1 คู่ถาม-ตอบล่าสุด
+
+THAI_CHARS = re.compile(r"[\u0e00-\u0e7f]")
+
+def estimate_tokens(text):
+    # ประมาณแบบถูกๆ: ภาษาไทย ~2 ตัวอักษร/token, อื่นๆ ~4 ตัวอักษร/token
+    thai = len(THAI_CHARS.findall(text))
+    return max(1, thai // 2 + (len(text) - thai) // 4)
+
+def message_tokens(msg):
+    # เก็บจำนวน token ไว้ใน message เลย จะได้ไม่ต้องนับใหม่ทุก turn
+    if "tokens" not in msg: msg["tokens"] = estimate_tokens(msg["content"])
+    return msg["tokens"]
+
+def truncate_to_tokens(text, budget):
+    if estimate_tokens(text) <= budget: return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[-mid:]) <= budget: lo = mid
+        else: hi = mid - 1
+    return "…" + text[-lo:]
+
+def split_window(messages, budget=HISTORY_TOKEN_BUDGET, min_recent=MIN_RECENT_MESSAGES):
+    # ไล่จากข้อความล่าสุดย้อนขึ้นไปจนเต็ม budget -> (ของเก่า, หน้าต่างล่าสุด)
+    used, start = 0, len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = message_tokens(messages[i])
+        if used + cost > budget and len(messages) - 1 - i >= min_recent: break
+        used += cost
+        start = i
+    return messages[:start], messages[start:]
+
+def extractive_summary(previous, messages, budget=SUMMARY_TOKEN_BUDGET):
+    # fallback เมื่อเรียกโมเดลสรุปไม่ได้: เก็บคำถาม + ต้นคำตอบแบบย่อ
+    lines = [previous] if previous else []
+    for m in messages:
+        who = "User" if m["role"] == "user" else "AI"
+        lines.append(f"- {who}: {m['content'][:200].strip()}")
+    return truncate_to_tokens("\n".join(lines), budget)
+
+class ContextBudget:
+    def __init__(self, budget=HISTORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET, summarize_fn=None):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.summarize_fn = summarize_fn   # (สรุปเดิม, ข้อความใหม่ที่หลุด window) -> สรุปใหม่
+
+    def build(self, messages, state):
+        # state = {"summary": str, "folded": จำนวนข้อความที่ถูกสรุปไปแล้ว} (เก็บไว้ใน session)
+        older, recent = split_window(messages, self.budget)
+        folded = state.get("folded", 0)
+        if len(older) > folded:
+            fresh = older[folded:]
+            summary = None
+            if self.summarize_fn:
+                try: summary = self.summarize_fn(state.get("summary", ""), fresh)
+                except Exception: summary = None
+            if not summary: summary = extractive_summary(state.get("summary", ""), fresh, self.summary_budget)
+            state["summary"] = truncate_to_tokens(summary.strip(), self.summary_budget)
+            state["folded"] = len(older)
+        elif len(older) < folded:
+            # ประวัติถูกรีเซ็ต -> ล้างเฉพาะสรุป (state เดียวกันมี key ของส่วนอื่น เช่น persona ของ turn นี้)
+            state.pop("summary", None); state.pop("folded", None)
+        return state.get("summary", ""), recent
+
+SUMMARY_PROMPT = """Update the running summary of a network-support conversation.
+Keep device names, commands, IP addresses, VLAN IDs and unresolved issues. Reply in the conversation's language, at most {words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}"""
+
+def make_summary_prompt(previous, messages, budget=SUMMARY_TOKEN_BUDGET):
+    turns = "\n".join(f"{'User' if m['role'] == 'user' else 'AI'}: {m['content']}" for m in messages)
+    return SUMMARY_PROMPT.format(words=budget // 2, summary=previous or "(none)", turns=turns)
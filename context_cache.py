@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import timedelta, timezone
+
+from history_store import FileLock
+from context_budget import estimate_tokens
+from metrics import log_event
+
+# ==========================================
+# Context Cache: system instruction + preamble (ไฟล์ PDF) เก็บเป็น CachedContent ฝั่ง Gemini
+#   ทุก turn อ้าง cache แทนการส่ง prefix เดิมซ้ำ (token ส่วนนี้คิดราคา cached + ไม่ต้อง prefill ใหม่)
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_PATH = os.path.join(BASE_DIR, ".context_cache.json")
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "1") == "1"
+CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))        # วินาที ต่อการสร้าง/ต่ออายุ 1 ครั้ง
+REFRESH_MARGIN = 5 * 60                                         # ต่ออายุล่วงหน้าก่อนหมดอายุ
+REFRESH_INTERVAL = 2 * 60
+FAILURE_COOLDOWN = int(os.getenv("CONTEXT_CACHE_COOLDOWN", "3600"))   # สร้างไม่ได้ (โมเดลไม่รองรับ ฯลฯ) -> ไม่ลองซ้ำช่วงนี้
+MIN_PREFIX_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024"))  # ขั้นต่ำของ CachedContent ฝั่ง API (ต่ำกว่านี้สร้างไม่ได้อยู่แล้ว)
+
+def prefix_key(model_name, persona, parts):
+    from model_registry import _part_text, SYSTEM_INSTRUCTIONS
+    h = hashlib.sha1(f"{model_name}\x00{persona}\x00{SYSTEM_INSTRUCTIONS[persona]}".encode("utf-8"))
+    for part in parts: h.update(b"\x00" + _part_text(part).encode("utf-8"))
+    return h.hexdigest()
+
+def worth_caching(persona, parts, min_tokens=MIN_PREFIX_TOKENS):
+    # prefix ที่มีไฟล์แนบ = ใหญ่พอเสมอ, เป็นข้อความล้วน (เช่น preamble ของ local index) -> ประมาณ token ก่อนเรียก API
+    from model_registry import SYSTEM_INSTRUCTIONS
+    if any(not isinstance(part, str) for part in parts): return True
+    return estimate_tokens(SYSTEM_INSTRUCTIONS[persona] + "".join(parts)) >= min_tokens
+
+def _expiry_of(cache, ttl):
+    exp = getattr(cache, "expire_time", None)
+    if exp is not None and hasattr(exp, "timestamp"):
+        if exp.tzinfo is None: exp = exp.replace(tzinfo=timezone.utc)
+        return exp.timestamp()
+    return time.time() + ttl
+
+def is_cache_error(exc):
+    # cache ถูกลบ/หมดอายุไปแล้วฝั่ง server
+    text = str(exc).lower()
+    return "cachedcontent" in text or "cached content" in text or "cachedcontents/" in text
+
+class ContextCacheManager:
+    def __init__(self, path=REGISTRY_PATH, ttl=CACHE_TTL, margin=REFRESH_MARGIN, enabled=CONTEXT_CACHE):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.ttl = ttl
+        self.margin = margin
+        self.enabled = enabled
+        self.entries = {}        # key -> {"cache", "name", "model", "expires_at", "used_at"}
+        self.failed = {}         # key -> เวลาที่ลองสร้างใหม่ได้
+        self.lock = threading.Lock()
+        self._creating = {}      # key -> Lock (สร้างครั้งเดียวแม้มีหลาย session ถามพร้อมกัน)
+        self._refresher = None
+        self.hits = self.misses = self.creates = self.refreshes = self.fallbacks = self.skipped = 0
+
+    # ---------- registry บนดิสก์ (ใช้ cache เดิมข้าม process/restart) ----------
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return {}
+
+    def _write_entry(self, key, entry):
+        with FileLock(self.lock_path):
+            data = {k: v for k, v in self._read().items() if v.get("expires_at", 0) > time.time()}
+            if entry is None: data.pop(key, None)
+            else: data[key] = entry
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(data, f)
+            os.replace(tmp, self.path)
+
+    def _load(self, key):
+        saved = self._read().get(key)
+        if not saved or saved["expires_at"] - self.margin <= time.time(): return None
+        try:
+            import google.generativeai as genai
+            cache = genai.caching.CachedContent.get(saved["name"])
+        except Exception: return None
+        return {"cache": cache, "name": saved["name"], "model": saved["model"],
+                "expires_at": _expiry_of(cache, self.ttl), "used_at": time.time()}
+
+    # ---------- API ----------
+    def get(self, model_name, persona, parts):
+        # คืน CachedContent ของ prefix นี้ หรือ None = ส่ง prefix แบบเดิม
+        if not self.enabled: return None
+        if not worth_caching(persona, parts):
+            with self.lock: self.skipped += 1
+            return None
+        key = prefix_key(model_name, persona, parts)
+        with self.lock:
+            if self.failed.get(key, 0) > time.time():
+                self.fallbacks += 1
+                return None
+            entry = self.entries.get(key)
+            if entry and entry["expires_at"] - self.margin > time.time():
+                entry["used_at"] = time.time()
+                self.hits += 1
+                return entry["cache"]
+            guard = self._creating.setdefault(key, threading.Lock())
+        with guard:
+            with self.lock: entry = self.entries.get(key)
+            if entry and entry["expires_at"] - self.margin > time.time():
+                with self.lock: self.hits += 1
+                return entry["cache"]
+            if entry and self._extend(key, entry): return entry["cache"]
+            entry = self._load(key) or self._create(key, model_name, persona, parts)
+            with self.lock:
+                if entry is None:
+                    self.fallbacks += 1
+                    return None
+                self.misses += 1
+                self.entries[key] = entry
+            self.start_refresher()
+            return entry["cache"]
+
+    def _create(self, key, model_name, persona, parts):
+        from model_registry import SYSTEM_INSTRUCTIONS
+        try:
+            import google.generativeai as genai
+            cache = genai.caching.CachedContent.create(
+                model=model_name, display_name=f"chatbot-{persona}-{key[:8]}",
+                system_instruction=SYSTEM_INSTRUCTIONS[persona], contents=[{"role": "user", "parts": list(parts)}],
+                ttl=timedelta(seconds=self.ttl))
+        except Exception as e:
+            # SDK เก่าไม่มี caching, โมเดลไม่รองรับ, หรือ prefix ต่ำกว่าขั้นต่ำของ API (ค่าประมาณต่ำไป)
+            log_event("context_cache_create_failed", model=model_name, persona=persona, error=f"{type(e).__name__}: {e}")
+            with self.lock: self.failed[key] = time.time() + FAILURE_COOLDOWN
+            return None
+        entry = {"cache": cache, "name": cache.name, "model": model_name,
+                 "expires_at": _expiry_of(cache, self.ttl), "used_at": time.time()}
+        with self.lock: self.creates += 1
+        self._write_entry(key, {"name": entry["name"], "model": model_name, "expires_at": entry["expires_at"]})
+        return entry
+
+    def _extend(self, key, entry):
+        # ต่อ TTL ของ cache เดิม (ถูกกว่าสร้างใหม่) ถ้าไม่ได้ค่อยสร้างใหม่
+        try: entry["cache"].update(ttl=timedelta(seconds=self.ttl))
+        except Exception:
+            self.invalidate(key)
+            return False
+        entry["expires_at"] = _expiry_of(entry["cache"], self.ttl)
+        with self.lock: self.refreshes += 1
+        self._write_entry(key, {"name": entry["name"], "model": entry["model"], "expires_at": entry["expires_at"]})
+        return True
+
+    def invalidate(self, key):
+        with self.lock: self.entries.pop(key, None)
+        self._write_entry(key, None)
+
+    def start_refresher(self):
+        # ต่ออายุเฉพาะ cache ที่ยังมีคนใช้ภายใน TTL ล่าสุด ที่เหลือปล่อยหมดอายุเอง (ไม่เสียค่าเก็บ)
+        if self._refresher and self._refresher.is_alive(): return
+        def loop():
+            while True:
+                time.sleep(REFRESH_INTERVAL)
+                now = time.time()
+                with self.lock: due = [(k, e) for k, e in self.entries.items()
+                                       if e["expires_at"] - 2 * self.margin <= now and now - e["used_at"] < self.ttl]
+                for key, entry in due: self._extend(key, entry)
+                with self.lock:
+                    for key in [k for k, e in self.entries.items() if e["expires_at"] <= now]: del self.entries[key]
+        self._refresher = threading.Thread(target=loop, daemon=True, name="context-cache-refresh")
+        self._refresher.start()
+
+    def stats(self):
+        with self.lock:
+            return {"active": len(self.entries), "hits": self.hits, "misses": self.misses, "creates": self.creates,
+                    "refreshes": self.refreshes, "fallbacks": self.fallbacks, "skipped": self.skipped}
+
+_manager = ContextCacheManager()
+
+def get_context_caches(): return _manager
@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import threading
+from collections import deque
+
+# ==========================================
+# Fast Path: คำถาม "config X ยังไง" ที่ชัดเจน ตอบจาก recipe คำสั่ง Cisco IOS ในเครื่อง (ไม่เรียก Gemini)
+#   recipe = คำสั่งที่ดึงจาก Knowledge Base (PDF) ก่อน ถ้าไม่มีใช้ชุดมาตรฐานด้านล่าง
+#   คำถามกำกวม (หลายหัวข้อ, มีค่าเฉพาะเช่น IP/เลข VLAN, ถามหลักการ) -> ส่งต่อให้ Gemini ตามปกติ
+# ==========================================
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "1") == "1"
+FAST_PATH_THRESHOLD = float(os.getenv("FAST_PATH_THRESHOLD", "0.8"))   # confidence ขั้นต่ำที่จะตอบเอง
+FAST_PATH_BUILTIN = os.getenv("FAST_PATH_BUILTIN", "1") == "1"          # 0 = ใช้เฉพาะ recipe ที่อยู่ใน KB
+MAX_QUESTION_CHARS = 120
+NEAR_MISS_LOG = 50
+
+CONFIG_INTENT = re.compile(r"config|คอนฟิก|ตั้งค่า|ตั้ง|กำหนด|คำสั่ง|command|ทำไง|ทำยังไง|ยังไง|อย่างไร|วิธี|สอน"
+                           r"|\bhow\b|\bsetup\b|\bset up\b|\bconfigure\b|\benable\b", re.I)
+CONCEPT_INTENT = re.compile(r"อธิบาย|คืออะไร|ต่างกัน|ต่างจาก|หลักการ|ทำไม|ข้อดี|ข้อเสีย|เปรียบเทียบ|แก้ปัญหา|ไม่ทำงาน|ไม่ได้"
+                            r"|\bwhat is\b|\bwhy\b|\bexplain\b|\bdifference\b|\bvs\b|troubleshoot|error", re.I)
+SPECIFIC_VALUE = re.compile(r"\d")          # มี IP / เลข VLAN / เลข interface เฉพาะ -> ต้องปรับคำสั่งตามค่าจริง
+DEVICE_CUE = re.compile(r"router|switch|เราเตอร์|เร้าเตอร์|สวิตช์|interface|อินเตอร์เฟส|อินเทอร์เฟซ|\bios\b|cisco|ซิสโก้"
+                        r"|packet\s*tracer|\bgns3\b|\bport\b|พอร์ต", re.I)
+OTHER_PLATFORM = re.compile(r"wi-?fi|wireless|ไวไฟ|windows|วินโดว์|linux|ลินุกซ์|ubuntu|debian|centos|red\s*hat|macos|macbook"
+                            r"|iphone|ipad|android|มือถือ|โทรศัพท์|mikrotik|ไมโครติก|huawei|juniper|fortigate|pfsense"
+                            r"|tp-?link|d-?link|asus|ubiquiti|unifi|อีเมล|email|gmail|facebook|บัญชี|account", re.I)
+GENERIC_COMMANDS = {"enable", "configure", "conf", "end", "exit", "interface", "show", "copy", "do"}
+IOS_LINE = re.compile(r"^\s*((?:Router|Switch|R\d+|S\d+|SW\d*)(?:\([\w-]*config[\w-]*\))?[>#])\s*(\S.*)$")
+
+# ==========================================
+# 1. Recipe มาตรฐาน (หัวข้อ, pattern ของคำถาม, ขั้นตอน [(หัวข้อขั้นตอน, [คำสั่ง])])
+# ==========================================
+BUILTIN_RECIPES = [
+    # generic = หัวข้อที่ใช้กับอุปกรณ์/ระบบอื่นได้ด้วย (รหัสผ่าน, DHCP, IP) -> ต้องมีคำที่บอกว่าเป็น Router/Switch
+    {"id": "ip_address", "title": "การตั้งค่า IP Address ให้กับขา (Interface) ของ Router", "generic": True,
+     "pattern": r"ip\s*address|ตั้ง\s*ip|\bip\b.*(router|interface|ขา)|ไอพี",
+     "steps": [("เข้าสู่ Global Configuration Mode", ["Router> enable", "Router# configure terminal"]),
+               ("เลือก Interface แล้วกำหนด IP Address", ["Router(config)# interface GigabitEthernet0/0",
+                                                      "Router(config-if)# ip address 192.168.1.1 255.255.255.0",
+                                                      "Router(config-if)# no shutdown"]),
+               ("ตรวจสอบและบันทึกค่า", ["Router(config-if)# end", "Router# show ip interface brief",
+                                        "Router# copy running-config startup-config"])]},
+    {"id": "vlan", "title": "การสร้าง VLAN และกำหนด Port ให้อยู่ใน VLAN",
+     "pattern": r"vlan",
+     "steps": [("สร้าง VLAN", ["Switch> enable", "Switch# configure terminal", "Switch(config)# vlan 10",
+                              "Switch(config-vlan)# name SALES", "Switch(config-vlan)# exit"]),
+               ("กำหนด Port ให้อยู่ใน VLAN", ["Switch(config)# interface FastEthernet0/1",
+                                             "Switch(config-if)# switchport mode access",
+                                             "Switch(config-if)# switchport access vlan 10"]),
+               ("ตรวจสอบ", ["Switch(config-if)# end", "Switch# show vlan brief"])]},
+    {"id": "trunk", "title": "การตั้งค่า Trunk ระหว่าง Switch",
+     "pattern": r"trunk",
+     "steps": [("เข้าสู่ Interface ที่เชื่อมต่อกับ Switch อีกตัว", ["Switch> enable", "Switch# configure terminal",
+                                                               "Switch(config)# interface GigabitEthernet0/1"]),
+               ("เปิดโหมด Trunk และกำหนด VLAN ที่อนุญาต", ["Switch(config-if)# switchport mode trunk",
+                                                          "Switch(config-if)# switchport trunk allowed vlan 10,20"]),
+               ("ตรวจสอบ", ["Switch(config-if)# end", "Switch# show interfaces trunk"])]},
+    {"id": "port_security", "title": "การตั้งค่า Port Security บน Switch",
+     "pattern": r"port[\s-]*security",
+     "steps": [("เข้าสู่ Interface และตั้งเป็น Access Port", ["Switch> enable", "Switch# configure terminal",
+                                                          "Switch(config)# interface FastEthernet0/1",
+                                                          "Switch(config-if)# switchport mode access"]),
+               ("เปิด Port Security", ["Switch(config-if)# switchport port-security",
+                                      "Switch(config-if)# switchport port-security maximum 2",
+                                      "Switch(config-if)# switchport port-security mac-address sticky",
+                                      "Switch(config-if)# switchport port-security violation shutdown"]),
+               ("ตรวจสอบ", ["Switch(config-if)# end", "Switch# show port-security interface FastEthernet0/1"])]},
+    {"id": "static_route", "title": "การตั้งค่า Static Route",
+     "pattern": r"static\s*rout|สแตติก|\bip route\b",
+     "steps": [("เข้าสู่ Global Configuration Mode", ["Router> enable", "Router# configure terminal"]),
+               ("เพิ่มเส้นทาง (เครือข่ายปลายทาง, Subnet Mask, Next Hop)",
+                ["Router(config)# ip route 192.168.2.0 255.255.255.0 10.0.0.2"]),
+               ("ตรวจสอบ", ["Router(config)# end", "Router# show ip route static"])]},
+    {"id": "ospf", "title": "การตั้งค่า OSPF (Single Area)",
+     "pattern": r"ospf",
+     "steps": [("เปิด OSPF Process", ["Router> enable", "Router# configure terminal", "Router(config)# router ospf 1"]),
+               ("ประกาศเครือข่ายเข้า Area 0", ["Router(config-router)# network 192.168.1.0 0.0.0.255 area 0",
+                                              "Router(config-router)# network 10.0.0.0 0.0.0.3 area 0"]),
+               ("ตรวจสอบ", ["Router(config-router)# end", "Router# show ip ospf neighbor", "Router# show ip route ospf"])]},
+    {"id": "basic_security", "title": "การตั้งชื่อ (Hostname) และรหัสผ่านพื้นฐานของ Router", "generic": True,
+     "pattern": r"hostname|password|รหัสผ่าน|ตั้งชื่อ|enable secret",
+     "steps": [("ตั้งชื่อและรหัสผ่านเข้า Privileged Mode", ["Router> enable", "Router# configure terminal",
+                                                          "Router(config)# hostname R1", "R1(config)# enable secret class"]),
+               ("รหัสผ่าน Console และ Telnet/SSH (VTY)", ["R1(config)# line console 0", "R1(config-line)# password cisco",
+                                                          "R1(config-line)# login", "R1(config-line)# line vty 0 4",
+                                                          "R1(config-line)# password cisco", "R1(config-line)# login",
+                                                          "R1(config-line)# exit"]),
+               ("เข้ารหัสรหัสผ่านและบันทึก", ["R1(config)# service password-encryption", "R1(config)# end",
+                                             "R1# copy running-config startup-config"])]},
+    {"id": "dhcp", "title": "การตั้งค่า Router เป็น DHCP Server", "generic": True,
+     "pattern": r"dhcp",
+     "steps": [("กันช่วง IP ที่ไม่แจก", ["Router> enable", "Router# configure terminal",
+                                      "Router(config)# ip dhcp excluded-address 192.168.1.1 192.168.1.10"]),
+               ("สร้าง DHCP Pool", ["Router(config)# ip dhcp pool LAN", "Router(dhcp-config)# network 192.168.1.0 255.255.255.0",
+                                   "Router(dhcp-config)# default-router 192.168.1.1", "Router(dhcp-config)# dns-server 8.8.8.8"]),
+               ("ตรวจสอบ", ["Router(dhcp-config)# end", "Router# show ip dhcp binding"])]},
+]
+
+# คำอธิบายต่อบรรทัดคำสั่ง (ตรวจจากบนลงล่าง ใช้อันแรกที่ตรง)
+EXPLAIN = [
+    (r"^enable$", "เข้าสู่ Privileged EXEC Mode"),
+    (r"^conf(igure)?( t(erminal)?)?$", "เข้าสู่ Global Configuration Mode"),
+    (r"^interface ", "เลือก Interface ที่จะตั้งค่า"),
+    (r"^ip address ", "กำหนด IP Address และ Subnet Mask"),
+    (r"^no shutdown$", "เปิดใช้งาน Interface (ค่าเริ่มต้นของ Router ปิดอยู่)"),
+    (r"^vlan \d+$", "สร้าง VLAN ตามหมายเลข"),
+    (r"^name ", "ตั้งชื่อ VLAN"),
+    (r"^switchport mode access$", "ตั้ง Port เป็น Access (ใช้กับอุปกรณ์ปลายทาง 1 VLAN)"),
+    (r"^switchport access vlan ", "กำหนด Port ให้อยู่ใน VLAN นี้"),
+    (r"^switchport mode trunk$", "ตั้ง Port เป็น Trunk (ส่งได้หลาย VLAN)"),
+    (r"^switchport trunk allowed vlan ", "จำกัด VLAN ที่ผ่าน Trunk ได้"),
+    (r"^switchport port-security$", "เปิด Port Security"),
+    (r"^switchport port-security maximum ", "จำนวน MAC Address สูงสุดที่ยอมให้ใช้ Port นี้"),
+    (r"^switchport port-security mac-address sticky$", "จำ MAC Address ที่เรียนรู้ได้ลงใน config อัตโนมัติ"),
+    (r"^switchport port-security violation ", "สิ่งที่ทำเมื่อมี MAC แปลกปลอม (shutdown = ปิด Port)"),
+    (r"^ip route ", "เพิ่มเส้นทางไปเครือข่ายปลายทางผ่าน Next Hop"),
+    (r"^router ospf ", "เปิด OSPF Process (เลข Process ใช้ภายในเครื่อง)"),
+    (r"^network .* area ", "ประกาศเครือข่ายเข้า OSPF (ใช้ Wildcard Mask)"),
+    (r"^hostname ", "ตั้งชื่ออุปกรณ์"),
+    (r"^enable secret ", "รหัสผ่านเข้า Privileged Mode (เข้ารหัสแบบ hash)"),
+    (r"^line console", "ตั้งค่าการเข้าผ่านสาย Console"),
+    (r"^line vty", "ตั้งค่าการเข้าระยะไกล (Telnet/SSH)"),
+    (r"^password ", "กำหนดรหัสผ่านของ line นี้"),
+    (r"^login$", "บังคับให้ถามรหัสผ่านตอนเข้า"),
+    (r"^service password-encryption$", "เข้ารหัสรหัสผ่านที่เก็บใน config"),
+    (r"^ip dhcp excluded-address ", "ช่วง IP ที่ไม่แจกให้ client (เช่น Gateway, Server)"),
+    (r"^ip dhcp pool ", "สร้าง DHCP Pool"),
+    (r"^network ", "เครือข่ายที่แจก IP"),
+    (r"^default-router ", "Default Gateway ที่แจกให้ client"),
+    (r"^dns-server ", "DNS Server ที่แจกให้ client"),
+    (r"^show ", "ตรวจสอบผลการตั้งค่า"),
+    (r"^copy running-config startup-config$", "บันทึกค่าให้คงอยู่หลังรีบูต"),
+]
+EXPLAIN = [(re.compile(p, re.I), text) for p, text in EXPLAIN]
+
+def explain(command):
+    # "Router(config-if)# no shutdown" -> คำอธิบายของ "no shutdown"
+    m = IOS_LINE.match(command)
+    cmd = (m.group(2) if m else command).strip()
+    return next((text for p, text in EXPLAIN if p.search(cmd)), None)
+
+# ==========================================
+# 2. Recipe จาก Knowledge Base: ชุดบรรทัด CLI ติดกันใน chunk ของ PDF
+# ==========================================
+def find_cli_blocks(text, min_lines=2):
+    blocks, current = [], []
+    for line in text.splitlines():
+        if IOS_LINE.match(line): current.append(line.strip())
+        else:
+            if len(current) >= min_lines: blocks.append(current)
+            current = []
+    if len(current) >= min_lines: blocks.append(current)
+    return blocks
+
+def command_keys(commands):
+    # "Router(config-if)# switchport access vlan 10" -> "switchport access" (ไม่นับคำสั่งทั่วไปที่ทุก recipe มี)
+    keys = set()
+    for c in commands:
+        m = IOS_LINE.match(c)
+        words = re.sub(r"\d+", "N", (m.group(2) if m else c).strip().lower()).split()
+        if words and words[0] not in GENERIC_COMMANDS: keys.add(" ".join(words[:2]))
+    return keys
+
+def heading_before(text, pos):
+    # บรรทัดข้อความ (ที่ไม่ใช่ CLI) ที่อยู่ใกล้ block ที่สุด
+    for line in reversed(text[:pos].splitlines()):
+        if line.strip() and not IOS_LINE.match(line): return line
+    return ""
+
+def mine_recipes(index, recipes):
+    # หัวข้อของ block = recipe ที่ pattern ตรงกับหัวข้อที่ใกล้ block ที่สุด และมีคำสั่งเฉพาะของ recipe นั้นอยู่ใน block
+    #   หัวข้อไม่ตรง recipe ไหน -> ใช้ recipe ที่คำสั่งตรงกับ block มากที่สุด (อย่างน้อย 2 คำสั่ง)
+    mined = {}
+    if index is None: return mined
+    for chunk in index.chunks:
+        text = chunk["text"]
+        for block in find_cli_blocks(text):
+            heading, keys = heading_before(text, text.find(block[0])), command_keys(block)
+            overlap = {r["id"]: len(r["keys"] & keys) for r in recipes if r["id"] not in mined}
+            recipe = next((r for r in recipes if overlap.get(r["id"]) and r["regex"].search(heading)), None)
+            if recipe is None:
+                best = max(overlap, key=overlap.get, default=None)
+                recipe = next((r for r in recipes if r["id"] == best), None) if best and overlap[best] >= 2 else None
+            if recipe is not None:
+                mined[recipe["id"]] = {"commands": block, "page": chunk.get("page"), "source": chunk.get("source")}
+    return mined
+
+# ==========================================
+# 3. Matcher + Recipe Index
+# ==========================================
+class FastPath:
+    def __init__(self, threshold=FAST_PATH_THRESHOLD, enabled=FAST_PATH_ENABLED, builtin=FAST_PATH_BUILTIN):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.recipes = [dict(r, regex=re.compile(r["pattern"], re.I), keys=command_keys(c for _, cs in r["steps"] for c in cs))
+                        for r in BUILTIN_RECIPES]
+        self.builtin = builtin
+        self.mined, self.kb_version = {}, None
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.low_confidence = 0
+        self.near_misses = deque(maxlen=NEAR_MISS_LOG)     # (confidence, recipe, prompt) ไว้ปรับ threshold
+
+    def refresh(self, index):
+        # สร้าง recipe จาก KB ใหม่เมื่อ index เปลี่ยนเท่านั้น
+        version = getattr(index, "version", None)
+        if version == self.kb_version: return
+        mined = mine_recipes(index, self.recipes)
+        with self.lock: self.mined, self.kb_version = mined, version
+
+    def match(self, prompt):
+        # คืน (recipe, confidence) ; confidence 0 = ไม่ใช่คำถาม config แน่ๆ
+        text = prompt.strip()
+        if not text or len(text) > MAX_QUESTION_CHARS or CONCEPT_INTENT.search(text): return None, 0.0
+        found = [r for r in self.recipes if r["regex"].search(text) and (self.builtin or r["id"] in self.mined)]
+        if not found: return None, 0.0
+        confidence = 0.55 if len(found) == 1 else 0.3          # หลายหัวข้อในคำถามเดียว -> ให้ Gemini ตอบรวม
+        if CONFIG_INTENT.search(text): confidence += 0.25
+        if len(text) <= 60: confidence += 0.1
+        if SPECIFIC_VALUE.search(text): confidence -= 0.25     # ต้องแทนค่าจริงลงในคำสั่ง
+        if found[0]["id"] in self.mined: confidence += 0.05
+        # ถามถึงระบบอื่น (wifi, Windows, Linux, MikroTik ...) หรือหัวข้อกลางๆ ที่ไม่ได้บอกว่าเป็น Router/Switch -> ไม่ใช่ recipe IOS
+        if OTHER_PLATFORM.search(text): confidence -= 0.4
+        elif found[0].get("generic") and not DEVICE_CUE.search(text): confidence -= 0.2
+        return found[0], round(max(0.0, min(1.0, confidence)), 2)
+
+    def render(self, recipe):
+        kb = self.mined.get(recipe["id"])
+        lines = [f"{recipe['title']} มีขั้นตอนดังนี้ครับ:", ""]
+        if kb:
+            steps = [("คำสั่งตามเอกสาร" + (f" (หน้า {kb['page']})" if kb.get("page") else ""), kb["commands"])]
+        else: steps = recipe["steps"]
+        for n, (heading, commands) in enumerate(steps, start=1):
+            lines += [f"{n}. {heading}:", "```text", *commands, "```"]
+            notes = [(c, explain(c)) for c in commands]
+            lines += [f"- `{(IOS_LINE.match(c).group(2) if IOS_LINE.match(c) else c)}` : {e}" for c, e in notes if e]
+            lines.append("")
+        lines.append("ถ้าต้องการปรับตามค่า IP / หมายเลข Interface ของเครือข่ายจริง บอกรายละเอียดมาได้เลยครับ")
+        return "\n".join(lines)
+
+    def answer(self, prompt, index=None):
+        # คืนคำตอบ (str) ถ้ามั่นใจพอ ไม่งั้น None = ส่งต่อให้ Gemini
+        if not self.enabled: return None
+        from metrics import get_metrics, log_event
+        self.refresh(index)
+        recipe, confidence = self.match(prompt)
+        outcome = "hit" if recipe and confidence >= self.threshold else ("low_confidence" if recipe else "miss")
+        with self.lock:
+            if outcome == "hit": self.hits += 1
+            elif outcome == "low_confidence":
+                self.low_confidence += 1
+                self.near_misses.append((confidence, recipe["id"], prompt[:MAX_QUESTION_CHARS]))
+            else: self.misses += 1
+        get_metrics().inc("fast_path_total", 1, {"outcome": outcome}, help="CLI fast path lookups by outcome")
+        if recipe: log_event("fast_path", outcome=outcome, recipe=recipe["id"], confidence=confidence, threshold=self.threshold)
+        return self.render(recipe) if outcome == "hit" else None
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses + self.low_confidence
+            return {"hits": self.hits, "low_confidence": self.low_confidence, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else 0.0, "threshold": self.threshold,
+                    "kb_recipes": sorted(self.mined), "near_misses": list(self.near_misses)[-5:]}
+
+if __name__ == "__main__":
+    # ใช้ปรับ threshold: python fast_path.py "config VLAN" "สอนวิธี Config VLAN และ Trunking"
+    fp = FastPath()
+    for q in sys.argv[1:]:
+        recipe, confidence = fp.match(q)
+        verdict = "✅ ตอบเอง" if recipe and confidence >= fp.threshold else "➡️ Gemini"
+        print(f"{confidence:.2f} {verdict:10} {recipe['id'] if recipe else '-':14} {q}")
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from history_store import FileLock
+from metrics import log_event
+
+# ==========================================
+# File Registry: SHA-256 ของไฟล์ -> handle ไฟล์บน Gemini (ใช้ข้าม process/restart)
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_PATH = os.path.join(BASE_DIR, ".file_registry.json")
+FILE_TTL = 47 * 3600            # Gemini เก็บไฟล์ 48 ชม. เผื่อไว้ 1 ชม.
+REFRESH_MARGIN = 6 * 3600       # อัปโหลดใหม่ล่วงหน้าก่อนหมดอายุ
+REFRESH_INTERVAL = 15 * 60
+POLL_INITIAL, POLL_MAX, POLL_TIMEOUT = 0.5, 8.0, 600
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    return h.hexdigest()
+
+def _expiry_of(file):
+    exp = getattr(file, "expiration_time", None)
+    if exp is not None and hasattr(exp, "timestamp"):
+        if exp.tzinfo is None: exp = exp.replace(tzinfo=timezone.utc)
+        return exp.timestamp()
+    return time.time() + FILE_TTL
+
+def wait_until_active(genai, file):
+    # poll แบบ exponential backoff แทน sleep(1) ทุกรอบ
+    delay, deadline = POLL_INITIAL, time.time() + POLL_TIMEOUT
+    while file.state.name == "PROCESSING":
+        if time.time() > deadline: raise TimeoutError(f"{file.name} ยังประมวลผลไม่เสร็จ")
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX)
+        file = genai.get_file(file.name)
+    if file.state.name != "ACTIVE": raise RuntimeError(f"{file.name} state = {file.state.name}")
+    return file
+
+class FileRegistry:
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._inflight = {}
+        self._guard = threading.Lock()
+        self._refresher = None
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return {}
+
+    def _write_entry(self, sha, entry):
+        with FileLock(self.lock_path):
+            data = self._read()
+            data[sha] = entry
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+
+    def lookup(self, path, margin=0):
+        if not os.path.exists(path): return None
+        entry = self._read().get(file_sha256(path))
+        if entry and entry["expires_at"] - margin > time.time(): return entry
+        return None
+
+    def upload(self, path, mime_type="application/pdf"):
+        import google.generativeai as genai
+        sha = file_sha256(path)
+        file = wait_until_active(genai, genai.upload_file(path, mime_type=mime_type))
+        entry = {"name": file.name, "uri": file.uri, "mime_type": mime_type, "source": os.path.basename(path),
+                 "expires_at": _expiry_of(file), "uploaded_at": datetime.now().isoformat()}
+        self._write_entry(sha, entry)
+        return entry
+
+    def get_or_upload(self, path, mime_type="application/pdf"):
+        return self.lookup(path) or self.upload(path, mime_type)
+
+    def ensure_background(self, path, mime_type="application/pdf"):
+        # คืน handle ทันทีถ้ามี ไม่งั้นเริ่ม upload ใน thread แยก (UI ไม่ต้องรอ)
+        entry = self.lookup(path)
+        if entry: return entry
+        if os.path.exists(path): self._spawn(path, mime_type)
+        return None
+
+    def _spawn(self, path, mime_type):
+        with self._guard:
+            t = self._inflight.get(path)
+            if t and t.is_alive(): return
+            t = threading.Thread(target=self._safe_upload, args=(path, mime_type), daemon=True, name="file-upload")
+            self._inflight[path] = t
+            t.start()
+
+    def _safe_upload(self, path, mime_type):
+        try: self.upload(path, mime_type)
+        except Exception as e: log_event("file_upload_failed", path=os.path.basename(path), error=f"{type(e).__name__}: {e}")
+
+    def start_refresher(self, paths, mime_type="application/pdf"):
+        # ตรวจเป็นระยะ แล้วอัปโหลดใหม่ก่อน handle จะหมดอายุ
+        if self._refresher and self._refresher.is_alive(): return
+        def loop():
+            while True:
+                for p in paths:
+                    if os.path.exists(p) and self.lookup(p, margin=REFRESH_MARGIN) is None: self._spawn(p, mime_type)
+                time.sleep(REFRESH_INTERVAL)
+        self._refresher = threading.Thread(target=loop, daemon=True, name="file-refresh")
+        self._refresher.start()
+
+    @staticmethod
+    def as_part(entry):
+        # ใช้แทน File object ใน history ได้เลย ไม่ต้องเรียก get_file ซ้ำ
+        return {"file_data": {"mime_type": entry["mime_type"], "file_uri": entry["uri"]}}
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import queue
+import atexit
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ==========================================
+# ตั้งค่า Generation Service
+# ==========================================
+MAX_QUEUE = int(os.getenv("GEN_MAX_QUEUE", "64"))          # งานที่รอได้สูงสุดทั้งระบบ
+MAX_WORKERS = int(os.getenv("GEN_MAX_WORKERS", "16"))      # งานที่วิ่งพร้อมกันทั้งระบบ
+# pattern ในชื่อโมเดล -> (concurrency, requests/min) ตรวจจากบนลงล่าง
+MODEL_LIMITS = json.loads(os.getenv("GEN_MODEL_LIMITS", "null")) or [
+    ["flash-8b", 8, 15],
+    ["flash-lite", 8, 15],
+    ["flash", 6, 15],
+    ["pro", 2, 2],
+    ["", 4, 10],
+]
+BACKGROUND_RESERVE = int(os.getenv("GEN_BACKGROUND_RESERVE", "1"))   # token ของ bucket ที่เว้นไว้ให้คำถามจริงเสมอ (งานเบื้องหลังแตะไม่ได้)
+_DONE = object()
+
+class QueueFullError(RuntimeError):
+    pass
+
+def is_quota_error(exc):
+    try:
+        from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+        if isinstance(exc, (ResourceExhausted, TooManyRequests)): return True
+    except ImportError: pass
+    return getattr(exc, "code", None) == 429 or "429" in str(exc)
+
+def is_transient_error(exc):
+    # 5xx / deadline / unavailable / connection หลุด -> ลองโมเดลอื่นได้ (ต่างจาก 4xx ที่ request ผิดเอง)
+    try:
+        from google.api_core.exceptions import ServerError, DeadlineExceeded, ServiceUnavailable
+        if isinstance(exc, (ServerError, DeadlineExceeded, ServiceUnavailable)): return True
+    except ImportError: pass
+    if isinstance(exc, (TimeoutError, ConnectionError)): return True
+    code = getattr(exc, "code", None)
+    return isinstance(code, int) and 500 <= code < 600
+
+def limits_for(model_name):
+    for pattern, concurrency, rpm in MODEL_LIMITS:
+        if pattern in model_name: return concurrency, rpm
+    return 4, 10
+
+# ==========================================
+# Token Bucket (จำกัด requests/min ตาม quota ของโมเดล)
+# ==========================================
+class TokenBucket:
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity or max(1, rate_per_min // 4)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, reserve=0):
+        # reserve = token ที่ต้องเหลือไว้หลังหยิบ (งานเบื้องหลังหยิบได้เฉพาะส่วนที่เกิน)
+        self._refill()
+        if self.tokens < 1 + reserve: return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self, reserve=0):
+        self._refill()
+        return max(0.0, (1 + reserve - self.tokens) / self.rate)
+
+# ==========================================
+# Job: ฝั่ง UI วน for รับ chunk ได้เลย (thread-safe)
+# ==========================================
+class GenerationJob:
+    def __init__(self, session_id, model_name, fn):
+        self.session_id = session_id
+        self.model_name = model_name
+        self.fn = fn                  # callable ที่คืน iterable ของข้อความ (blocking)
+        self.chunks = queue.Queue()
+        self.error = None
+        self.cancelled = False        # ผู้ใช้เลิกรอ (ปิดหน้าเว็บ / client หลุด) -> หยุดดึง chunk จาก upstream
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+    @property
+    def wait_time(self): return (self.started or time.perf_counter()) - self.submitted
+
+    def __iter__(self):
+        finished = False
+        try:
+            while True:
+                item = self.chunks.get()
+                if item is _DONE: break
+                yield item
+            finished = True
+        finally:
+            if not finished: self.cancel()
+        if self.error is not None: raise self.error
+
+    def cancel(self):
+        self.cancelled = True
+
+class GenerationService:
+    def __init__(self, max_queue=MAX_QUEUE, max_workers=MAX_WORKERS):
+        self.max_queue = max_queue
+        self.pending = OrderedDict()    # session_id -> deque ของงาน (round-robin ระหว่าง session)
+        self.background = deque()       # งานเบื้องหลัง (prefetch) รันเฉพาะตอนไม่มีคำถามจริงรออยู่
+        self.depth = 0
+        self.running = 0
+        self.completed = 0
+        self.waits = deque(maxlen=500)
+        self.lock = threading.Lock()
+        self.limits, self.buckets = {}, {}
+        self.model_running = {}         # model -> งานที่กำลังวิ่ง (เทียบกับ concurrency ของโมเดล)
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="generation")
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name="generation-loop")
+        self.thread.start()
+        self.slots = None
+        self.wakeup = None
+        asyncio.run_coroutine_threadsafe(self._init(max_workers), self.loop).result()
+        asyncio.run_coroutine_threadsafe(self._dispatch(), self.loop)
+
+    async def _init(self, max_workers):
+        self.slots = asyncio.Semaphore(max_workers)
+        self.wakeup = asyncio.Event()
+
+    def submit(self, session_id, model_name, fn, background=False):
+        # background=True -> ลำดับความสำคัญต่ำ: ไม่แย่งคิว/โควตาของคำถามจริง (ดู _next_job)
+        job = GenerationJob(session_id, model_name, fn)
+        with self.lock:
+            if background:
+                if len(self.background) >= self.max_queue: raise QueueFullError(f"background queue full ({len(self.background)} jobs)")
+                self.background.append(job)
+            else:
+                if self.depth >= self.max_queue: raise QueueFullError(f"queue full ({self.depth} jobs waiting)")
+                self.pending.setdefault(session_id, deque()).append(job)
+                self.depth += 1
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+        return job
+
+    def _next_job(self):
+        # งานแรกของ session ถัดไป (round-robin) ที่โมเดลของงานนั้นว่าง (concurrency + rate) -> จองโควตาโมเดลให้เลย
+        # งานของโมเดลที่เต็ม (เช่น pro 2 rpm) รอในคิวโดยไม่กิน slot กลาง งานของโมเดลอื่นแซงไปได้
+        with self.lock:
+            for session_id, jobs in self.pending.items():
+                model_name = jobs[0].model_name
+                concurrency, bucket = self._model_limits(model_name)
+                if self.model_running.get(model_name, 0) >= concurrency or not bucket.try_take(): continue
+                self.model_running[model_name] = self.model_running.get(model_name, 0) + 1
+                job = jobs.popleft()
+                # ย้าย session นี้ไปท้ายคิว -> session อื่นได้คิวถัดไป
+                del self.pending[session_id]
+                if jobs: self.pending[session_id] = jobs
+                self.depth -= 1
+                return job
+            # ไม่มีคำถามจริงรอ -> งานเบื้องหลังใช้ได้เฉพาะ concurrency ว่าง + token ที่เกิน BACKGROUND_RESERVE
+            if self.depth == 0 and self.background:
+                model_name = self.background[0].model_name
+                concurrency, bucket = self._model_limits(model_name)
+                if self.model_running.get(model_name, 0) < concurrency and bucket.try_take(BACKGROUND_RESERVE):
+                    self.model_running[model_name] = self.model_running.get(model_name, 0) + 1
+                    return self.background.popleft()
+            return None
+
+    def accepts_background(self, model_name):
+        # bucket เล็กเกินกว่าจะเว้นสำรองได้ (เช่น pro 2 rpm) -> งานเบื้องหลังไม่มีวันได้รัน ไม่ต้องส่งมา
+        with self.lock: return self._model_limits(model_name)[1].capacity >= 1 + BACKGROUND_RESERVE
+
+    def _retry_after(self):
+        # งานที่ค้างเพราะ rate limit -> ตื่นมาดูใหม่เมื่อ bucket ที่เร็วที่สุดมี token (concurrency ว่าง = wakeup จาก _run)
+        with self.lock:
+            waits = [self._model_limits(jobs[0].model_name)[1].retry_after() for jobs in self.pending.values()]
+            if self.depth == 0 and self.background:
+                waits.append(self._model_limits(self.background[0].model_name)[1].retry_after(BACKGROUND_RESERVE))
+        waits = [w for w in waits if w > 0]
+        return min(waits) if waits else None
+
+    async def _dispatch(self):
+        while True:
+            await self.slots.acquire()
+            job = self._next_job()
+            while job is None:
+                self.wakeup.clear()
+                try: await asyncio.wait_for(self.wakeup.wait(), self._retry_after())
+                except asyncio.TimeoutError: pass
+                job = self._next_job()
+            asyncio.create_task(self._run(job))
+
+    def _model_limits(self, model_name):
+        if model_name not in self.limits:
+            concurrency, rpm = limits_for(model_name)
+            self.limits[model_name] = concurrency
+            self.buckets[model_name] = TokenBucket(rpm)
+        return self.limits[model_name], self.buckets[model_name]
+
+    async def _run(self, job):
+        # slot กลาง + โควตาโมเดลถูกจองไว้แล้วใน _dispatch
+        try:
+            job.started = time.perf_counter()
+            self.waits.append(job.wait_time)
+            self.running += 1
+            try: await self.loop.run_in_executor(self.executor, self._drain, job)
+            finally: self.running -= 1
+        except Exception as e:
+            job.error = e
+        finally:
+            job.finished = time.perf_counter()
+            self.completed += 1
+            job.chunks.put(_DONE)
+            with self.lock: self.model_running[job.model_name] -= 1
+            self.slots.release()
+            self.wakeup.set()           # โมเดลนี้ว่างแล้ว -> งานที่รอโมเดลนี้ได้ไปต่อ
+
+    @staticmethod
+    def _drain(job):
+        if job.cancelled: return
+        stream = None
+        try:
+            stream = iter(job.fn())
+            for text in stream:
+                if job.cancelled: break       # ไม่มีใครรออ่านแล้ว -> คืน slot ทันที ไม่ต้องรอ stream จนจบ
+                job.chunks.put(text)
+        except Exception as e:
+            job.error = e
+        finally:
+            if job.cancelled and hasattr(stream, "close"): stream.close()
+
+    async def _stop(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks: t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    def shutdown(self):
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop)
+        self.thread.join(timeout=2)
+        if not self.thread.is_alive(): self.loop.close()
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        waits = sorted(self.waits)
+        return {"queue_depth": self.depth, "background": len(self.background), "running": self.running, "completed": self.completed,
+                "avg_wait_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+                "p95_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0}
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_generation_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = GenerationService()
+            atexit.register(_service.shutdown)
+        return _service
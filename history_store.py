@@ -0,0 +1,175 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+try: import fcntl
+except ImportError: fcntl = None  # Windows: ใช้ threading lock อย่างเดียว
+
+# ==========================================
+# ตั้งค่า History Backend
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "jsonl")        # jsonl | sqlite
+HISTORY_RETENTION = int(os.getenv("HISTORY_RETENTION", "200"))  # 0 = เก็บทั้งหมด
+LEGACY_JSON = os.path.join(BASE_DIR, "chat_history.json")
+
+def make_entry(user_msg, ai_msg, **extra):
+    return dict({"timestamp": datetime.now().isoformat(), "user": user_msg, "ai": ai_msg}, **extra)
+
+class FileLock:
+    # lock ข้าม process ด้วย flock + lock ภายใน process (แยกตาม path)
+    _locks = {}
+    _guard = threading.Lock()
+
+    def __init__(self, path, exclusive=True):
+        self.path = path
+        self.exclusive = exclusive
+        with FileLock._guard: self._local = FileLock._locks.setdefault(path, threading.Lock())
+
+    def __enter__(self):
+        self._local.acquire()
+        self.fd = open(self.path, "a+")
+        if fcntl: fcntl.flock(self.fd, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl: fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.fd.close()
+        self._local.release()
+
+# ==========================================
+# 1. JSON-lines: append-only + compaction เป็นระยะ
+# ==========================================
+class JsonlHistoryStore:
+    def __init__(self, path, retention=HISTORY_RETENTION):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.retention = retention
+        self._appends = 0
+        if not os.path.exists(path):
+            with FileLock(self.lock_path):
+                if not os.path.exists(path): self._import_legacy()
+
+    def _import_legacy(self):
+        entries = []
+        if os.path.exists(LEGACY_JSON):
+            try:
+                with open(LEGACY_JSON, "r", encoding="utf-8") as f: entries = json.load(f)
+            except (OSError, ValueError): entries = []
+        with open(self.path, "w", encoding="utf-8") as f:
+            for e in entries: f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+    def append(self, user_msg, ai_msg, **extra):
+        line = (json.dumps(make_entry(user_msg, ai_msg, **extra), ensure_ascii=False) + "\n").encode("utf-8")
+        with FileLock(self.lock_path, exclusive=False):
+            # O_APPEND + write() ครั้งเดียว -> ไม่ต้องอ่าน/เขียนทั้งไฟล์
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try: os.write(fd, line)
+            finally: os.close(fd)
+        self._appends += 1
+        if self.retention and self._appends % max(1, self.retention // 4) == 0: self.compact()
+
+    def compact(self):
+        if not self.retention: return
+        with FileLock(self.lock_path):
+            with open(self.path, "rb") as f: lines = f.readlines()
+            if len(lines) <= self.retention * 2: return
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f: f.writelines(lines[-self.retention:])
+            os.replace(tmp, self.path)
+
+    def _tail_lines(self, n):
+        # อ่านจากท้ายไฟล์ทีละบล็อก จนได้ครบ n บรรทัด
+        if not os.path.exists(self.path): return []
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos, data = f.tell(), b""
+            while pos > 0 and data.count(b"\n") <= n:
+                step = min(65536, pos); pos -= step
+                f.seek(pos); data = f.read(step) + data
+        return [l for l in data.splitlines() if l.strip()][-n:] if n else []
+
+    def page(self, page=0, per_page=10):
+        n = (page + 1) * per_page
+        lines = self._tail_lines(min(n, self.retention) if self.retention else n)
+        lines = lines[:max(0, len(lines) - page * per_page)][-per_page:]
+        entries = []
+        for l in reversed(lines):
+            try: entries.append(json.loads(l))
+            except ValueError: pass
+        return entries
+
+    def count(self):
+        if not os.path.exists(self.path): return 0
+        with open(self.path, "rb") as f: total = sum(1 for l in f if l.strip())
+        return min(total, self.retention) if self.retention else total
+
+    def clear(self):
+        with FileLock(self.lock_path):
+            open(self.path, "w").close()
+
+# ==========================================
+# 2. SQLite (WAL mode) สำหรับหลาย process เขียนพร้อมกัน
+# ==========================================
+class SqliteHistoryStore:
+    def __init__(self, path, retention=HISTORY_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self._appends = 0
+        with self._conn() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, user TEXT, ai TEXT, extra TEXT)""")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, user_msg, ai_msg, **extra):
+        e = make_entry(user_msg, ai_msg)
+        with self._conn() as conn:
+            conn.execute("INSERT INTO history (timestamp, user, ai, extra) VALUES (?, ?, ?, ?)",
+                         (e["timestamp"], user_msg, ai_msg, json.dumps(extra, ensure_ascii=False) if extra else None))
+        self._appends += 1
+        if self.retention and self._appends % max(1, self.retention // 4) == 0: self.compact()
+
+    def compact(self):
+        if not self.retention: return
+        with self._conn() as conn:
+            conn.execute("DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?", (self.retention,))
+
+    def page(self, page=0, per_page=10):
+        rows = self._conn().execute(
+            "SELECT timestamp, user, ai, extra FROM history ORDER BY id DESC LIMIT ? OFFSET ?",
+            (per_page, page * per_page)).fetchall()
+        return [dict({"timestamp": t, "user": u, "ai": a}, **(json.loads(x) if x else {})) for t, u, a, x in rows]
+
+    def count(self):
+        total = self._conn().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        return min(total, self.retention) if self.retention else total
+
+    def clear(self):
+        with self._conn() as conn: conn.execute("DELETE FROM history")
+
+# ==========================================
+# 3. Factory
+# ==========================================
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_history_store(base_dir=BASE_DIR, backend=None, retention=None):
+    backend = backend or HISTORY_BACKEND
+    retention = HISTORY_RETENTION if retention is None else retention
+    key = (base_dir, backend, retention)
+    with _stores_lock:
+        if key not in _stores:
+            if backend == "sqlite": _stores[key] = SqliteHistoryStore(os.path.join(base_dir, "chat_history.db"), retention)
+            else: _stores[key] = JsonlHistoryStore(os.path.join(base_dir, "chat_history.jsonl"), retention)
+        return _stores[key]
@@ -0,0 +1,174 @@
+import os
+import re
+import sys
+import json
+import mmap
+import hashlib
+import tempfile
+import threading
+import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+
+# ==========================================
+# 0. Path ของ Artifact ที่ build แล้ว
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KB_DIR = os.path.join(BASE_DIR, ".kb")
+XLSX_SOURCES = [os.path.join(BASE_DIR, "Content.xlsx"), os.path.join(BASE_DIR, "workaw_data.xlsx")]
+ARTIFACT_VERSION = 1
+
+# ==========================================
+# 1. อ่าน xlsx ด้วย zipfile + XML (ไม่ต้อง import pandas/openpyxl)
+# ==========================================
+XLSX_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+def read_xlsx_rows(path):
+    rows = []
+    with zipfile.ZipFile(path) as z:
+        shared = []
+        if "xl/sharedStrings.xml" in z.namelist():
+            root = ET.fromstring(z.read("xl/sharedStrings.xml"))
+            for si in root.findall("m:si", XLSX_NS):
+                shared.append("".join(t.text or "" for t in si.iter("{%s}t" % XLSX_NS["m"])))
+        sheets = sorted(n for n in z.namelist() if n.startswith("xl/worksheets/sheet") and n.endswith(".xml"))
+        for sheet in sheets:
+            root = ET.fromstring(z.read(sheet))
+            for row in root.iter("{%s}row" % XLSX_NS["m"]):
+                cells = []
+                for c in row.findall("m:c", XLSX_NS):
+                    v = c.find("m:v", XLSX_NS)
+                    if c.get("t") == "s" and v is not None: cells.append(shared[int(v.text)])
+                    elif c.get("t") == "inlineStr":
+                        cells.append("".join(t.text or "" for t in c.iter("{%s}t" % XLSX_NS["m"])))
+                    elif v is not None: cells.append(v.text or "")
+                cells = [x.strip() for x in cells if x and x.strip()]
+                if cells: rows.append(cells)
+    return rows
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    return h.hexdigest()
+
+def artifact_paths(source, out_dir=KB_DIR):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(out_dir, f"{stem}.records.jsonl"), os.path.join(out_dir, f"{stem}.meta.json")
+
+# ==========================================
+# 2. Build: xlsx -> records.jsonl + meta.json (offset ของแต่ละแถว)
+# ==========================================
+def build_artifact(source, out_dir=KB_DIR, sha=None):
+    os.makedirs(out_dir, exist_ok=True)
+    records_path, meta_path = artifact_paths(source, out_dir)
+    st_ = os.stat(source)
+    offsets, pos = [], 0
+    # ชื่อ tmp ไม่ซ้ำกัน: builder หลายตัว (หลาย process) เขียนพร้อมกันได้โดยไม่ทับไฟล์ของกันก่อน os.replace
+    with tempfile.NamedTemporaryFile("wb", dir=out_dir, suffix=".tmp", delete=False) as f:
+        tmp = f.name
+        try:
+            for i, cells in enumerate(read_xlsx_rows(source), start=1):
+                text = "\n".join(cells)
+                line = (json.dumps({"row": i, "cells": cells, "text": text, "norm": normalize_text(text)},
+                                   ensure_ascii=False) + "\n").encode("utf-8")
+                offsets.append(pos)
+                f.write(line)
+                pos += len(line)
+        except BaseException:
+            f.close(); os.unlink(tmp)
+            raise
+    os.replace(tmp, records_path)
+    meta = {"version": ARTIFACT_VERSION, "source": os.path.basename(source), "size": st_.st_size,
+            "mtime_ns": st_.st_mtime_ns, "sha256": sha or file_hash(source), "count": len(offsets), "offsets": offsets}
+    _write_meta(meta_path, meta)
+    return meta
+
+def _write_meta(meta_path, meta):
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(meta_path), suffix=".tmp", delete=False) as f:
+        json.dump(meta, f)
+    os.replace(f.name, meta_path)
+
+# ==========================================
+# 3. Load: memory-map records แล้ว decode ทีละแถวเมื่อใช้
+# ==========================================
+class KnowledgeArtifact:
+    def __init__(self, records_path, meta):
+        self.meta = meta
+        self.offsets = meta["offsets"]
+        self._file = open(records_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets else b""
+        self._text = None
+
+    @property
+    def content_hash(self): return self.meta["sha256"]
+
+    def __len__(self): return len(self.offsets)
+
+    def __getitem__(self, i):
+        start = self.offsets[i]
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else len(self._mm)
+        return json.loads(self._mm[start:end])
+
+    def __iter__(self):
+        for i in range(len(self)): yield self[i]
+
+    def to_text(self):
+        # ใช้แทน df.to_string(index=False): สร้างครั้งเดียวแล้วเก็บไว้
+        if self._text is None: self._text = "\n\n".join(r["text"] for r in self)
+        return self._text
+
+    def search(self, query, limit=5):
+        needle = normalize_text(query)
+        return [r for r in self if needle in r["norm"]][:limit]
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap): self._mm.close()
+        self._file.close()
+
+    def __del__(self):
+        # ปิดเมื่อไม่มีใครอ้างถึงแล้ว (รวม session อื่นที่ยังวนอ่านของเก่าอยู่ตอน workbook เปลี่ยน)
+        try: self.close()
+        except Exception: pass
+
+def _is_fresh(meta, source):
+    st_ = os.stat(source)
+    return (meta.get("version") == ARTIFACT_VERSION and meta["size"] == st_.st_size
+            and meta["mtime_ns"] == st_.st_mtime_ns)
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def load_artifact(source, out_dir=KB_DIR):
+    # โหลดครั้งเดียวต่อ process, rebuild เฉพาะเมื่อ mtime/hash ของ workbook เปลี่ยน
+    records_path, meta_path = artifact_paths(source, out_dir)
+    with _loaded_lock:
+        art = _loaded.get(records_path)
+        if art is not None and _is_fresh(art.meta, source): return art
+        # ของเก่าไม่ fresh แล้ว -> แค่ปล่อย reference (ห้าม close ตรงนี้: thread อื่นอาจยังอ่านอยู่)
+        #   mmap ถูกปิดใน __del__ เมื่อผู้อ่านคนสุดท้ายปล่อย, ไฟล์ใหม่ถูก os.replace ทับชื่อเดิมได้เพราะ inode เดิมยังอยู่
+        if art is not None: del _loaded[records_path]
+        meta = None
+        if os.path.exists(meta_path) and os.path.exists(records_path):
+            with open(meta_path, "r", encoding="utf-8") as f: meta = json.load(f)
+            if not _is_fresh(meta, source):
+                sha = file_hash(source)
+                if meta.get("version") == ARTIFACT_VERSION and meta.get("sha256") == sha:
+                    # แค่ถูก touch: เนื้อหาเดิม อัปเดต mtime พอ ไม่ต้อง build ใหม่
+                    st_ = os.stat(source)
+                    meta.update(size=st_.st_size, mtime_ns=st_.st_mtime_ns)
+                    _write_meta(meta_path, meta)
+                else: meta = build_artifact(source, out_dir, sha)
+        else: meta = build_artifact(source, out_dir)
+        art = _loaded[records_path] = KnowledgeArtifact(records_path, meta)
+        return art
+
+if __name__ == "__main__":
+    for src in sys.argv[1:] or XLSX_SOURCES:
+        if not os.path.exists(src): print(f"❌ ไม่พบไฟล์: {src}"); continue
+        meta = build_artifact(src)
+        print(f"✅ {meta['source']}: {meta['count']} rows, sha256 {meta['sha256'][:12]} -> {KB_DIR}")
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+
+# ==========================================
+# ตั้งค่า Metrics
+# ==========================================
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))          # 0 = ไม่เปิด endpoint
+METRICS_LOG = os.getenv("METRICS_LOG", "1") == "1"             # JSON log 1 บรรทัดต่อ turn
+METRICS_LOG_FILE = os.getenv("METRICS_LOG_FILE")               # ไม่ตั้ง = stderr
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+# ==========================================
+# 1. Registry (Counter / Histogram) -> Prometheus text format
+# ==========================================
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: defaultdict(float))     # name -> labels -> value
+        self.histograms = defaultdict(dict)                         # name -> labels -> [bucket counts, sum, count]
+        self.help = {}
+
+    def inc(self, name, value=1, labels=None, help=""):
+        with self.lock:
+            self.counters[name][_label_key(labels)] += value
+            if help: self.help.setdefault(name, help)
+
+    def observe(self, name, value, labels=None, help=""):
+        key = _label_key(labels)
+        with self.lock:
+            h = self.histograms[name].get(key)
+            if h is None: h = self.histograms[name][key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+            if help: self.help.setdefault(name, help)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                if name in self.help: lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items(): lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                if name in self.help: lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, (counts, total, count) in series.items():
+                    for bound, c in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': f'{bound:g}'})} {c}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+_registry = MetricsRegistry()
+
+def get_metrics(): return _registry
+
+# ==========================================
+# 2. JSON log (structured, 1 บรรทัดต่อ turn)
+# ==========================================
+logger = logging.getLogger("chatbot.metrics")
+if not logger.handlers:
+    handler = logging.FileHandler(METRICS_LOG_FILE, encoding="utf-8") if METRICS_LOG_FILE else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+def log_event(event, **fields):
+    if METRICS_LOG: logger.info(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False, default=str))
+
+# ==========================================
+# 3. TurnMetrics: เวลาแต่ละ stage + token ของ 1 turn
+# ==========================================
+class TurnMetrics:
+    def __init__(self, session_id, model=None, registry=None):
+        self.session_id = session_id
+        self.model = model
+        self.persona = None
+        self.cached = False
+        self.registry = registry or _registry
+        self.stages = {}
+        self.tokens = {"input": 0, "output": 0, "cached": 0}
+        self.error = None
+        self.finish_reason = None    # finish_reason ของ stream ล่าสุด (STOP / MAX_TOKENS / SAFETY ...)
+        self.aborted = False         # ผู้ใช้ปิด/หยุด stream ก่อนจบ (GeneratorExit)
+        self.started = time.perf_counter()
+        self.finished = False
+
+    def record(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def mark_first_chunk(self):
+        if "ttft" not in self.stages: self.stages["ttft"] = time.perf_counter() - self.started
+
+    def add_usage(self, usage):
+        # usage_metadata ของ Gemini (chunk สุดท้ายของ stream)
+        if usage is None: return
+        self.tokens["input"] = getattr(usage, "prompt_token_count", 0) or 0
+        self.tokens["output"] = getattr(usage, "candidates_token_count", 0) or 0
+        self.tokens["cached"] = getattr(usage, "cached_content_token_count", 0) or 0
+
+    def fail(self, exc):
+        self.error = type(exc).__name__
+
+    def abort(self):
+        self.aborted = True
+
+    @property
+    def status(self):
+        if self.error: return "error"
+        if self.aborted: return "aborted"
+        return "cached" if self.cached else "ok"
+
+    def to_dict(self):
+        return {"session_id": self.session_id, "model": self.model, "persona": self.persona, "cached": self.cached,
+                "status": self.status, "error": self.error, "tokens": dict(self.tokens),
+                "stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()}}
+
+    def finish(self):
+        if self.finished: return self.to_dict()
+        self.finished = True
+        self.stages.setdefault("total", time.perf_counter() - self.started)
+        r, labels = self.registry, {"model": self.model or "-", "persona": self.persona or "-"}
+        r.inc("chat_turns_total", 1, dict(labels, status=self.status),
+              help="Chat turns by outcome")
+        if self.error: r.inc("chat_errors_total", 1, {"type": self.error}, help="Chat turn errors by exception type")
+        for direction, n in self.tokens.items():
+            if n: r.inc("chat_tokens_total", n, dict(labels, direction=direction), help="Tokens from usage_metadata")
+        for stage, seconds in self.stages.items():
+            r.observe("chat_stage_seconds", seconds, {"stage": stage}, help="Latency of each stage of a chat turn")
+        record = self.to_dict()
+        log_event("chat_turn", **record)
+        return record
+
+class _StageTimer:
+    def __init__(self, turn, name):
+        self.turn, self.name = turn, name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.turn.record(self.name, time.perf_counter() - self.start)
+        return False
+
+# ==========================================
+# 4. Endpoint /metrics (Prometheus scrape)
+# ==========================================
+def _metrics_handler():
+    # import http.server เฉพาะตอนเปิด endpoint (ไม่ให้หน่วง cold start ของหน้าเว็บ)
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404); self.end_headers(); return
+            body = _registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    return MetricsHandler
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    # เปิดครั้งเดียวต่อ process (Streamlit rerun สคริปต์ทุกครั้งที่มี interaction)
+    global _server
+    if not port: return None
+    with _server_lock:
+        if _server is None:
+            from http.server import ThreadingHTTPServer
+            try: _server = ThreadingHTTPServer((host, port), _metrics_handler())
+            except OSError: return None
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-http").start()
+        return _server
@@ -0,0 +1,175 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import google.generativeai as genai
+from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+from prompt import PROMPT_NETWORK, PROMPT_WORKAW
+
+# ==========================================
+# Config กลางของโมเดล (ใช้ร่วมกันทุก request)
+# ==========================================
+GENERATION_CONFIG = {"temperature": 0.1, "top_p": 0.9, "top_k": 40, "max_output_tokens": 4096}
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
+KB_RULES = """
+RULES:
+1. If asked "Who are you", introduce yourself politely.
+2. Answer based ONLY on the provided document excerpts.
+3. If answer is not in file, say 'ขออภัย ข้อมูลส่วนนี้ไม่มีในเอกสาร'.
+"""
+SUMMARY_INSTRUCTION = "You maintain a concise running summary of a support conversation. Summarize only what was said."
+
+def with_rules(prompt):
+    # PROMPT_NETWORK จบกลาง code block ของตัวอย่างคำตอบ -> ปิด fence + คั่นก่อนต่อ RULES ไม่งั้น RULES กลายเป็นส่วนหนึ่งของตัวอย่าง
+    text = prompt.rstrip()
+    if text.count("```") % 2: text += "\n```"
+    return text + "\n---\n" + KB_RULES
+
+# system instruction ต่อ persona (persona_router เลือกให้ทีละคำถาม)
+PERSONAS = {
+    "network": with_rules(PROMPT_NETWORK),
+    "workaw": with_rules(PROMPT_WORKAW),
+}
+# + งานภายในที่ไม่ใช่การตอบจากเอกสาร (ไม่มี KB_RULES -> ไม่ตอบว่า "ไม่มีในเอกสาร")
+SYSTEM_INSTRUCTIONS = dict(PERSONAS, summary=SUMMARY_INSTRUCTION)
+MAX_CHAT_SESSIONS = 1000
+
+def _config_key(config):
+    return json.dumps(config or GENERATION_CONFIG, sort_keys=True)
+
+def _part_text(part):
+    if isinstance(part, str): return part
+    if isinstance(part, dict):
+        data = part.get("file_data") or part.get("text") or part
+        return json.dumps(data, sort_keys=True, default=str)
+    return getattr(part, "uri", None) or getattr(part, "name", None) or str(part)
+
+def history_signature(history):
+    h = hashlib.sha1()
+    for msg in history:
+        h.update(msg["role"].encode())
+        for part in msg["parts"]: h.update(b"\x00" + _part_text(part).encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+# ==========================================
+# 1. Model Registry: 1 GenerativeModel ต่อ (model, persona, config)
+# ==========================================
+class ModelRegistry:
+    def __init__(self):
+        self.models = {}
+        self.lock = threading.Lock()
+        self.builds = self.hits = 0
+        self.build_time = 0.0
+
+    def get(self, model_name, persona="network", config=None):
+        key = (model_name, persona, _config_key(config))
+        with self.lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.hits += 1
+                return model
+        start = time.perf_counter()
+        model = genai.GenerativeModel(model_name=model_name, generation_config=config or GENERATION_CONFIG,
+                                      safety_settings=SAFETY_SETTINGS, system_instruction=SYSTEM_INSTRUCTIONS[persona])
+        with self.lock:
+            self.build_time += time.perf_counter() - start
+            self.builds += 1
+            return self.models.setdefault(key, model)
+
+    def from_cache(self, cache, config=None):
+        # โมเดลที่อ้าง CachedContent (system instruction + preamble อยู่ใน cache แล้ว)
+        key = ("cache", cache.name, _config_key(config))
+        with self.lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.hits += 1
+                return model
+        start = time.perf_counter()
+        model = genai.GenerativeModel.from_cached_content(cached_content=cache, generation_config=config or GENERATION_CONFIG,
+                                                          safety_settings=SAFETY_SETTINGS)
+        with self.lock:
+            self.build_time += time.perf_counter() - start
+            self.builds += 1
+            return self.models.setdefault(key, model)
+
+    def forget_cache(self, cache_name):
+        with self.lock:
+            for key in [k for k in self.models if k[0] == "cache" and k[1] == cache_name]: del self.models[key]
+
+    def warm_up(self, model_names, persona="network"):
+        # สร้างโมเดล + เปิด gRPC channel ของ generative service ล่วงหน้า (ไม่ต้องรอ handshake ตอนถามจริง)
+        def run():
+            for name in model_names:
+                try: self.get(name, persona).count_tokens("ping")
+                except Exception: pass
+        threading.Thread(target=run, daemon=True, name="model-warmup").start()
+
+# ==========================================
+# 2. Chat Registry: ใช้ ChatSession เดิมต่อใน turn ถัดไปของผู้ใช้คนเดิม
+# ==========================================
+class ChatRegistry:
+    def __init__(self, models, max_sessions=MAX_CHAT_SESSIONS):
+        self.models = models
+        self.sessions = OrderedDict()    # (session, model, persona, cache) -> (chat, signature)
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.reuses = self.starts = 0
+        self.start_time = 0.0
+
+    def acquire(self, session_id, model_name, persona, history, cache=None):
+        # คืน chat ที่ history ตรงกับที่ต้องการ ถ้าไม่ตรง (เช่นมีการย่อประวัติ) ค่อยสร้างใหม่
+        # cache = CachedContent ของ prefix (history ที่ส่งมาต้องไม่มี prefix นั้นแล้ว)
+        key = (session_id, model_name, persona, cache.name if cache is not None else None)
+        with self.lock:
+            entry = self.sessions.pop(key, None)
+        if entry and entry[1] == history_signature(history):
+            with self.lock: self.reuses += 1
+            return entry[0], True
+        start = time.perf_counter()
+        model = self.models.from_cache(cache) if cache is not None else self.models.get(model_name, persona)
+        chat = model.start_chat(history=list(history))
+        with self.lock:
+            self.start_time += time.perf_counter() - start
+            self.starts += 1
+        return chat, False
+
+    def release(self, session_id, model_name, persona, chat, prompt, answer, history, cache=None):
+        # เก็บเฉพาะคำถามจริงไว้ใน history (ตัด excerpts ที่แนบมากับ turn นี้ออก)
+        try:
+            turns = list(chat.history)
+            turns[-2] = {"role": "user", "parts": [prompt]}
+            chat.history = turns
+        except Exception: return
+        expected = list(history) + [{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [answer]}]
+        key = (session_id, model_name, persona, cache.name if cache is not None else None)
+        with self.lock:
+            self.sessions[key] = (chat, history_signature(expected))
+            self.sessions.move_to_end(key)
+            while len(self.sessions) > self.max_sessions: self.sessions.popitem(last=False)
+
+    def drop(self, session_id):
+        with self.lock:
+            for key in [k for k in self.sessions if k[0] == session_id]: del self.sessions[key]
+
+    def stats(self):
+        m = self.models
+        avg_build = m.build_time / m.builds if m.builds else 0.0
+        avg_start = self.start_time / self.starts if self.starts else 0.0
+        return {"model_builds": m.builds, "model_hits": m.hits, "chat_starts": self.starts, "chat_reuses": self.reuses,
+                "saved_setup_ms": round(1000 * (m.hits * avg_build + self.reuses * avg_start), 2)}
+
+_models = ModelRegistry()
+_chats = ChatRegistry(_models)
+
+def get_model_registry(): return _models
+
+def get_chat_registry(): return _chats
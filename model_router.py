@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import threading
+
+from generation_service import is_quota_error, is_transient_error
+
+# ==========================================
+# ตั้งค่า Model Router
+# ==========================================
+SPREAD_TRAFFIC = os.getenv("ROUTER_SPREAD", "0") == "1"   # กระจายโหลดไปหลายโมเดลตระกูล flash
+MAX_ATTEMPTS = int(os.getenv("ROUTER_MAX_ATTEMPTS", "0"))    # 0 = ลองทุกโมเดลที่มี
+BACKOFF_BASE = 0.25       # วินาที (คูณ 2 ทุกครั้งที่ retry + jitter)
+BACKOFF_MAX = 4.0
+COOLDOWN_BASE = 20.0      # พักโมเดลที่โดน 429 (วินาที) เพิ่มเป็นเท่าตัวถ้าโดนซ้ำ
+COOLDOWN_MAX = 300.0
+EWMA_ALPHA = 0.3
+
+class ModelHealth:
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.quota_errors = 0
+        self.failures = 0
+        self.latency = None          # EWMA ของเวลาถึง chunk แรก (วินาที)
+        self.cooldown_until = 0.0
+        self.strikes = 0
+
+    @property
+    def cooling(self): return time.monotonic() < self.cooldown_until
+
+    @property
+    def quota_rate(self): return self.quota_errors / self.requests if self.requests else 0.0
+
+    def score(self):
+        # ยิ่งน้อยยิ่งดี: latency + โทษจากอัตรา 429/ล้มเหลว
+        latency = self.latency if self.latency is not None else 1.0
+        return latency * (1 + 4 * self.quota_rate + 2 * (self.failures / self.requests if self.requests else 0))
+
+NON_CHAT_MODELS = ("embedding", "aqa", "imagen", "veo", "tts", "native-audio", "image-generation")
+
+def is_flash_class(name): return "flash" in name
+
+def is_chat_model(name): return not any(k in name for k in NON_CHAT_MODELS)
+
+class ModelRouter:
+    def __init__(self, models, spread=SPREAD_TRAFFIC):
+        self.health = {m: ModelHealth(m) for m in models}
+        self.spread = spread
+        self.lock = threading.Lock()
+
+    def _get(self, name):
+        with self.lock:
+            if name not in self.health: self.health[name] = ModelHealth(name)
+            return self.health[name]
+
+    def add(self, models):
+        for name in models: self._get(name)
+
+    def candidates(self, preferred):
+        self._get(preferred)
+        with self.lock:
+            # failover ไปได้เฉพาะโมเดลที่คุยได้ (ไม่ใช่ embedding / aqa / สร้างภาพ)
+            pool = [h for h in self.health.values() if h.name == preferred or is_chat_model(h.name)]
+            healthy = [h for h in pool if not h.cooling]
+            cooling = sorted((h for h in pool if h.cooling), key=lambda h: h.cooldown_until)
+        ranked = sorted(healthy, key=lambda h: h.score())
+        first = next((h for h in ranked if h.name == preferred), None)
+        if self.spread and first and is_flash_class(preferred):
+            # สุ่มแบบถ่วงน้ำหนัก (latency ต่ำ = โอกาสสูง) ระหว่างโมเดล flash ที่ยังว่าง
+            pool = [h for h in ranked if is_flash_class(h.name)]
+            first = random.choices(pool, weights=[1 / max(h.score(), 0.05) for h in pool])[0]
+        order = ([first] if first else []) + [h for h in ranked if h is not first] + cooling
+        return [h.name for h in order]
+
+    def record_success(self, name, latency):
+        h = self._get(name)
+        with self.lock:
+            h.requests += 1
+            h.strikes = 0
+            h.latency = latency if h.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * h.latency
+
+    def record_quota(self, name):
+        h = self._get(name)
+        with self.lock:
+            h.requests += 1
+            h.quota_errors += 1
+            h.strikes += 1
+            h.cooldown_until = time.monotonic() + min(COOLDOWN_MAX, COOLDOWN_BASE * 2 ** (h.strikes - 1))
+
+    def record_failure(self, name):
+        h = self._get(name)
+        with self.lock:
+            h.requests += 1
+            h.failures += 1
+
+    def stream(self, preferred, make_stream, info=None, max_attempts=MAX_ATTEMPTS):
+        # make_stream(model_name) -> iterable ของข้อความ, info (dict) จะได้ชื่อโมเดลที่ตอบจริง
+        # retry ไปโมเดลถัดไปได้เฉพาะก่อนส่ง chunk แรกออกไป (ไม่งั้นคำตอบจะซ้ำ/ขาด)
+        info = {} if info is None else info
+        last_error = None
+        for attempt, name in enumerate(self.candidates(preferred)[:max_attempts or None]):
+            info["model"], info["attempts"] = name, attempt + 1
+            if attempt: time.sleep(min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * (0.5 + random.random()))
+            start, emitted = time.perf_counter(), False
+            try:
+                for text in make_stream(name):
+                    if not emitted: self.record_success(name, time.perf_counter() - start); emitted = True
+                    yield text
+                if not emitted: self.record_success(name, time.perf_counter() - start)
+                return
+            except Exception as e:
+                if emitted: raise
+                if is_quota_error(e): self.record_quota(name); last_error = e; continue
+                self.record_failure(name)
+                if is_transient_error(e): last_error = e; continue      # 5xx / timeout -> ลองโมเดลถัดไป
+                raise
+        if last_error is not None: raise last_error
+
+    def stats(self):
+        with self.lock:
+            return {h.name: {"requests": h.requests, "quota_rate": round(h.quota_rate, 3),
+                             "latency_ms": round(h.latency * 1000) if h.latency is not None else None,
+                             "cooling": h.cooling} for h in self.health.values()}
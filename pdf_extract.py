@@ -0,0 +1,129 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# ==========================================
+# PDF Extract: แยกข้อความทีละหน้าแบบขนาน (process pool) + cache ต่อหน้าตาม hash ของเนื้อหาหน้า
+#   แก้ PDF ไม่กี่หน้า -> extract ใหม่เฉพาะหน้าที่เปลี่ยน
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_CACHE_DIR = os.path.join(BASE_DIR, ".kb", "pdf_pages")
+EXTRACT_VERSION = 1                                          # เปลี่ยนเมื่อ normalize เปลี่ยน -> cache เก่าใช้ไม่ได้
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+PARALLEL_MIN_PAGES = 8                                       # หน้าที่ต้อง extract น้อยกว่านี้ทำใน process เดียว (ไม่คุ้มค่าสร้าง pool)
+
+# ==========================================
+# 1. Normalize ข้อความไทยจาก PDF
+# ==========================================
+ZERO_WIDTH = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+# glyph ของฟอนต์ไทยที่วางตำแหน่งวรรณยุกต์/สระไว้ใน Private Use Area (Windows/Mac) -> code point มาตรฐาน
+THAI_PUA = str.maketrans({
+    "\uf700": "\u0e10", "\uf701": "\u0e34", "\uf702": "\u0e35", "\uf703": "\u0e36", "\uf704": "\u0e37",
+    "\uf705": "\u0e48", "\uf706": "\u0e49", "\uf707": "\u0e4a", "\uf708": "\u0e4b", "\uf709": "\u0e4c",
+    "\uf70a": "\u0e48", "\uf70b": "\u0e49", "\uf70c": "\u0e4a", "\uf70d": "\u0e4b", "\uf70e": "\u0e4c",
+    "\uf70f": "\u0e0d", "\uf710": "\u0e31", "\uf711": "\u0e4d", "\uf712": "\u0e47", "\uf713": "\u0e48",
+    "\uf714": "\u0e49", "\uf715": "\u0e4a", "\uf716": "\u0e4b", "\uf717": "\u0e4c", "\uf718": "\u0e38",
+    "\uf719": "\u0e39", "\uf71a": "\u0e3a",
+})
+THAI_MARKS = "\u0e31\u0e34-\u0e3a\u0e47-\u0e4e"
+TONES = "\u0e48-\u0e4b"
+UPPER_LOWER_VOWELS = "\u0e31\u0e34-\u0e3a"
+SPACE_BEFORE_MARK = re.compile(f"[ \t]+([{THAI_MARKS}])")
+TONE_BEFORE_VOWEL = re.compile(f"([{TONES}])([{UPPER_LOWER_VOWELS}])")
+SARA_AM = re.compile(f"\u0e4d([{TONES}]?)\u0e32")           # นิคหิต + (วรรณยุกต์) + สระอา -> (วรรณยุกต์) + สระอำ
+DUPLICATE_MARK = re.compile(f"([{THAI_MARKS}])\\1+")
+
+def normalize_thai(text):
+    text = ZERO_WIDTH.sub("", text.translate(THAI_PUA))
+    text = SPACE_BEFORE_MARK.sub(r"\1", text)
+    text = TONE_BEFORE_VOWEL.sub(r"\2\1", text)              # ลำดับที่ถูก: พยัญชนะ + สระบน/ล่าง + วรรณยุกต์
+    text = SARA_AM.sub("\\1\u0e33", text)
+    text = DUPLICATE_MARK.sub(r"\1", text)
+    text = unicodedata.normalize("NFC", text)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+# ==========================================
+# 2. Hash ต่อหน้า + cache บนดิสก์
+# ==========================================
+def page_hash(page):
+    h = hashlib.sha256(f"v{EXTRACT_VERSION}|".encode())
+    contents = page.get_contents()
+    if contents is not None: h.update(contents.get_data())
+    h.update(repr(page.mediabox).encode())
+    fonts = (page.get("/Resources") or {}).get("/Font") or {}
+    h.update(repr(sorted(fonts.keys())).encode())
+    return h.hexdigest()
+
+def _cache_path(digest, cache_dir):
+    return os.path.join(cache_dir, digest[:2], digest + ".txt")
+
+def _cache_get(digest, cache_dir):
+    try:
+        with open(_cache_path(digest, cache_dir), "r", encoding="utf-8") as f: return f.read()
+    except OSError: return None
+
+def _cache_put(digest, text, cache_dir):
+    path = _cache_path(digest, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(text)
+    os.replace(tmp, path)
+
+# ==========================================
+# 3. Worker: เปิด PDF ครั้งเดียวต่อ process แล้ว extract ทีละหน้า
+# ==========================================
+_worker_reader = None
+
+def _init_worker(path):
+    global _worker_reader
+    from PyPDF2 import PdfReader
+    _worker_reader = PdfReader(path)
+
+def _extract_page(index):
+    return normalize_thai(_worker_reader.pages[index].extract_text() or "")
+
+# ==========================================
+# 4. Pipeline: generator ของ {"page", "text", "hash", "cached"} เรียงตามหน้า
+# ==========================================
+def iter_pdf_pages(path, workers=PDF_WORKERS, cache_dir=PAGE_CACHE_DIR, stats=None):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    digests = [page_hash(p) for p in reader.pages]
+    cached = {i: text for i, d in enumerate(digests) if (text := _cache_get(d, cache_dir)) is not None}
+    missing = [i for i in range(len(digests)) if i not in cached]
+    if stats is not None: stats.update(pages=len(digests), cached=len(cached), extracted=len(missing))
+
+    if len(missing) < PARALLEL_MIN_PAGES or workers <= 1:
+        fresh = (normalize_thai(reader.pages[i].extract_text() or "") for i in missing)
+        pool = None
+    else:
+        # spawn เสมอ: ถูกเรียกจาก thread warm-up ของ Streamlit, fork ใน process ที่มีหลาย thread อาจ deadlock (lock ค้างใน child)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,),
+                                   mp_context=multiprocessing.get_context("spawn"))
+        # map คืนผลตามลำดับหน้า และ yield ได้ทันทีที่หน้านั้นเสร็จ (ไม่ต้องรอทั้งไฟล์)
+        fresh = pool.map(_extract_page, missing, chunksize=max(1, len(missing) // (workers * 4)))
+    try:
+        fresh = iter(zip(missing, fresh))
+        for i in range(len(digests)):
+            if i in cached:
+                yield {"page": i + 1, "text": cached[i], "hash": digests[i], "cached": True}
+                continue
+            _, text = next(fresh)
+            _cache_put(digests[i], text, cache_dir)
+            yield {"page": i + 1, "text": text, "hash": digests[i], "cached": False}
+    finally:
+        if pool is not None: pool.shutdown(cancel_futures=True)
+
+if __name__ == "__main__":
+    for src in sys.argv[1:] or [os.path.join(BASE_DIR, "Data_Content_Network.pdf")]:
+        if not os.path.exists(src): print(f"❌ ไม่พบไฟล์: {src}"); continue
+        start, stats, chars = time.perf_counter(), {}, 0
+        for rec in iter_pdf_pages(src, stats=stats): chars += len(rec["text"])
+        print(f"✅ {os.path.basename(src)}: {stats['pages']} หน้า (cache {stats['cached']}, extract {stats['extracted']}), "
+              f"{chars} ตัวอักษร ใน {time.perf_counter() - start:.2f} s")
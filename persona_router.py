@@ -0,0 +1,122 @@
+import os
+import time
+import hashlib
+import threading
+
+from retrieval import BASE_DIR, INDEX_DIR, USE_EMBEDDINGS, load_or_build_index, sources_fingerprint, tokenize
+
+# ==========================================
+# Persona -> Knowledge Base ของตัวเอง (index แยกกัน ส่งเฉพาะของ persona ที่ถูกเลือก)
+# ==========================================
+PERSONA_SOURCES = {
+    "network": [os.path.join(BASE_DIR, "Data_Content_Network.pdf")],
+    "workaw": [os.path.join(BASE_DIR, "workaw_data.xlsx"), os.path.join(BASE_DIR, "Content.xlsx")],
+}
+DEFAULT_PERSONA = os.getenv("DEFAULT_PERSONA", "network")
+ROUTER_MARGIN = float(os.getenv("PERSONA_ROUTER_MARGIN", "0.2"))   # ต่างกันน้อยกว่านี้ = ไม่ชัด ใช้ persona เดิม
+KEYWORD_WEIGHT = 0.5
+KB_RECHECK_INTERVAL = float(os.getenv("KB_RECHECK_INTERVAL", "30"))   # วินาที ระหว่างการเช็กว่าไฟล์ต้นฉบับเปลี่ยนไหม (0 = ต้อง restart)
+
+# คำบ่งชี้ของแต่ละโดเมน (อังกฤษเทียบทั้งคำ, ไทยเทียบแบบ substring)
+PERSONA_KEYWORDS = {
+    "network": ["router", "switch", "vlan", "ospf", "rip", "eigrp", "bgp", "ip", "subnet", "interface", "trunk",
+                "cisco", "config", "lan", "wan", "ethernet", "cable", "port", "network", "routing", "ping",
+                "dhcp", "dns", "nat", "acl", "gateway", "troubleshoot", "pdf",
+                "เครือข่าย", "เราเตอร์", "สวิตช์", "สายแลน", "ไอพี"],
+    "workaw": ["leave", "overtime", "wage", "salary", "employer", "employee", "holiday", "labor", "labour",
+               "วันลา", "ลาป่วย", "ลากิจ", "วันหยุด", "ค่าจ้าง", "ล่วงเวลา", "แรงงาน", "ลูกจ้าง", "นายจ้าง",
+               "เวลาทำงาน", "เวลาพัก", "สวัสดิการ", "ค่าชดเชย", "เลิกจ้าง", "โอที", "คลอด", "ทำงานกี่", "สิทธิ"],
+}
+
+def persona_index_dir(persona, index_dir=INDEX_DIR):
+    return os.path.join(index_dir, persona)
+
+def load_persona_indexes(index_dir=INDEX_DIR, use_embeddings=USE_EMBEDDINGS, personas=None):
+    indexes = {}
+    for persona in personas or PERSONA_SOURCES:
+        try: indexes[persona] = load_or_build_index(PERSONA_SOURCES[persona], persona_index_dir(persona, index_dir), use_embeddings)
+        except Exception: indexes[persona] = None
+    return indexes
+
+def keyword_hits(text, keywords):
+    lowered, words = text.lower(), set(tokenize(text))
+    return sum(1 for kw in keywords if (kw in words if kw.isascii() else kw in lowered))
+
+def coverage(index, tokens):
+    # สัดส่วน (ถ่วงด้วย idf) ของ token ในคำถามที่มีอยู่ใน index ของ persona นี้
+    if index is None or not len(index) or not tokens: return 0.0
+    top_idf = max(index.idf.values(), default=1.0)
+    return sum(index.idf.get(t, 0.0) for t in tokens) / (top_idf * len(tokens))
+
+class PersonaRouter:
+    # classifier แบบ local (ไม่เรียก API): keyword + coverage ของ index แต่ละ persona
+    def __init__(self, indexes=None, margin=ROUTER_MARGIN, default=DEFAULT_PERSONA):
+        self._indexes = indexes
+        self.margin = margin
+        self.default = default
+        self.lock = threading.Lock()
+        self.counts = {p: 0 for p in PERSONA_SOURCES}
+        # เฝ้าไฟล์ต้นฉบับเฉพาะเมื่อโหลด index เอง (index ที่ส่งเข้ามาจากข้างนอกไม่รู้ว่ามาจากไหน)
+        self.watch = indexes is None and KB_RECHECK_INTERVAL > 0
+        self._checked = time.monotonic()
+        self._attempted = {}         # persona -> fingerprint ที่ลอง build ไปแล้ว (build ไม่ผ่านจะไม่ลองซ้ำจนไฟล์เปลี่ยนอีก)
+        self._reloading = None
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            with self.lock:
+                if self._indexes is None: self._indexes = load_persona_indexes()
+        return self._indexes
+
+    def index_for(self, persona):
+        index = self.indexes.get(persona)
+        return index if index is not None and len(index) else None
+
+    def check_sources(self):
+        # PDF/XLSX ถูกแก้ระหว่างที่ process ยังรันอยู่ -> build index ใหม่เบื้องหลังแล้วสลับเข้ามา
+        #   version เปลี่ยนตาม -> answer cache ล้างคำตอบของเวอร์ชันเก่าเอง (ไม่ต้อง restart)
+        if not self.watch or time.monotonic() - self._checked < KB_RECHECK_INTERVAL: return
+        self._checked = time.monotonic()
+        if self._reloading and self._reloading.is_alive(): return
+        stale = {}
+        for persona, index in self.indexes.items():
+            fp = sources_fingerprint(PERSONA_SOURCES[persona])
+            if fp != (index.version if index is not None else None) and fp != self._attempted.get(persona): stale[persona] = fp
+        if not stale: return
+        self._attempted.update(stale)
+        self._reloading = threading.Thread(target=self._reload, args=(list(stale),), daemon=True, name="kb-reload")
+        self._reloading.start()
+
+    def _reload(self, personas):
+        fresh = {p: index for p, index in load_persona_indexes(personas=personas).items() if index is not None}
+        with self.lock: self._indexes = dict(self._indexes, **fresh)
+
+    @property
+    def version(self):
+        # รวม version ของทุก index -> ใช้เป็น kb_version ของ answer cache
+        self.check_sources()
+        h = hashlib.sha1()
+        for persona, index in sorted(self.indexes.items()):
+            h.update(f"{persona}:{index.version if index is not None else '-'}|".encode())
+        return h.hexdigest()
+
+    def scores(self, prompt):
+        tokens = set(tokenize(prompt))
+        return {p: KEYWORD_WEIGHT * keyword_hits(prompt, PERSONA_KEYWORDS.get(p, [])) + coverage(self.indexes.get(p), tokens)
+                for p in PERSONA_SOURCES}
+
+    def route(self, prompt, previous=None, count=True):
+        scores = self.scores(prompt)
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        best, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if top <= 0 or top - runner_up < self.margin:
+            # ไม่ชัดเจน (เช่น "แล้วอันนี้ล่ะ") -> อยู่กับ persona เดิมของบทสนทนา
+            best = previous if previous in PERSONA_SOURCES else self.default
+        if count:
+            with self.lock: self.counts[best] = self.counts.get(best, 0) + 1
+        return best
+
+    def stats(self):
+        with self.lock: return dict(self.counts)
@@ -0,0 +1,205 @@
+import os
+import re
+import time
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+
+from answer_cache import normalize_prompt, trigrams, jaccard, SIMILARITY_THRESHOLD
+from context_budget import estimate_tokens
+from prompt import STARTER_PROMPTS
+
+# ==========================================
+# ตั้งค่า Speculative Prefetch
+# ==========================================
+PREFETCH_ENABLED = os.getenv("PREFETCH", "1") == "1"
+PREFETCH_FOLLOW_UPS = int(os.getenv("PREFETCH_FOLLOW_UPS", "1"))              # 0 = ไม่เดาคำถามต่อ, สูงสุด 2
+PREFETCH_TOKEN_BUDGET = int(os.getenv("PREFETCH_TOKEN_BUDGET", "50000"))      # token ต่อ window ที่ยอมจ่ายล่วงหน้า
+PREFETCH_BUDGET_WINDOW = int(os.getenv("PREFETCH_BUDGET_WINDOW", "3600"))     # วินาที
+PREFETCH_EST_OUTPUT = 800                                                     # token คำตอบโดยประมาณ (ใช้กันงบก่อนยิง)
+SPECULATIVE_TTL = 600                                                         # คำตอบเดาล่วงหน้าของ session หมดอายุ (วินาที)
+MAX_SPECULATIVE_SESSIONS = 500
+PREFETCH_SESSION = "__prefetch__"
+
+# ==========================================
+# 1. เดาคำถามต่อ (local, ไม่เรียก API)
+# ==========================================
+NETWORK_TOPICS = ["Port Security", "IP Address", "Static Route", "OSPF", "EIGRP", "RIP", "BGP", "VLAN", "Trunk",
+                  "STP", "DHCP", "NAT", "ACL", "Subnet", "Router", "Switch"]
+CONCEPT_WORDS = re.compile(r"อธิบาย|คืออะไร|ต่างกัน|หลักการ|ทำงานยังไง|\bwhat\b|\bexplain\b|\bdifference\b", re.I)
+CONFIG_WORDS = re.compile(r"config|ตั้งค่า|สอน|\bhow\b|\bsetup\b", re.I)
+
+def find_topic(*texts):
+    for text in texts:
+        lowered = text.lower()
+        for topic in NETWORK_TOPICS:
+            if topic.lower() in lowered: return topic
+    return None
+
+def predict_follow_ups(prompt, answer, persona, n=PREFETCH_FOLLOW_UPS):
+    # เรียงจากน่าจะถามต่อมากที่สุด: ถามหลักการ -> มักถามวิธี config, ถาม config -> มักถามวิธีตรวจสอบ
+    if n <= 0 or persona != "network": return []
+    topic = find_topic(prompt, answer[:500])
+    if topic is None: return []
+    verify = f"ตรวจสอบการทำงานของ {topic} ด้วยคำสั่งอะไร"
+    if CONFIG_WORDS.search(prompt): guesses = [verify, f"แก้ปัญหา {topic} ไม่ทำงานยังไง"]
+    elif CONCEPT_WORDS.search(prompt): guesses = [f"config {topic} ยังไง", verify]
+    else: guesses = [f"config {topic} ยังไง"]
+    asked = normalize_prompt(prompt)
+    return [g for g in guesses if normalize_prompt(g) != asked][:min(n, 2)]
+
+# ==========================================
+# 2. Token budget ของงานเดาล่วงหน้า (sliding window)
+# ==========================================
+class TokenBudget:
+    def __init__(self, limit=PREFETCH_TOKEN_BUDGET, window=PREFETCH_BUDGET_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.spent = []           # [(เวลา, token)]
+        self.lock = threading.Lock()
+
+    def used(self):
+        cutoff = time.time() - self.window
+        with self.lock:
+            self.spent = [(t, n) for t, n in self.spent if t >= cutoff]
+            return sum(n for _, n in self.spent)
+
+    def allows(self, tokens): return self.used() + tokens <= self.limit
+
+    def charge(self, tokens):
+        with self.lock: self.spent.append((time.time(), tokens))
+
+# ==========================================
+# 3. คำตอบเดาล่วงหน้าต่อ session (ใช้ได้ครั้งเดียว, ประวัติต้องตรงกับตอนที่เดา)
+# ==========================================
+def conversation_key(messages):
+    h = hashlib.sha1()
+    for m in messages: h.update(f"{m['role']}\x00{m['content']}\x01".encode("utf-8"))
+    return h.hexdigest()
+
+class SpeculativeStore:
+    def __init__(self, ttl=SPECULATIVE_TTL, max_sessions=MAX_SPECULATIVE_SESSIONS, threshold=SIMILARITY_THRESHOLD):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.threshold = threshold
+        self.sessions = OrderedDict()     # session_id -> [entry]
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def put(self, session_id, prompt, messages, model_name, kb_version, answer):
+        norm, convo = normalize_prompt(prompt), conversation_key(messages)
+        entry = {"prompt": norm, "grams": trigrams(norm), "convo": convo, "model": model_name,
+                 "kb_version": kb_version, "answer": answer, "created": time.time()}
+        with self.lock:
+            entries = [e for e in self.sessions.pop(session_id, []) if e["convo"] == convo and e["prompt"] != norm]
+            self.sessions[session_id] = entries + [entry]
+            while len(self.sessions) > self.max_sessions: self.sessions.popitem(last=False)
+
+    def take(self, session_id, prompt, messages, model_name, kb_version):
+        norm, convo = normalize_prompt(prompt), conversation_key(messages)
+        with self.lock:
+            best, best_score = None, 0.0
+            for e in self.sessions.get(session_id, []):
+                if e["convo"] != convo or e["model"] != model_name or e["kb_version"] != kb_version: continue
+                if time.time() - e["created"] > self.ttl: continue
+                score = 1.0 if e["prompt"] == norm else jaccard(trigrams(norm), e["grams"])
+                if score > best_score: best, best_score = e, score
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.sessions[session_id].remove(best)
+            self.hits += 1
+            return best["answer"]
+
+    def pending(self, session_id):
+        with self.lock: return [e["prompt"] for e in self.sessions.get(session_id, [])]
+
+    def drop(self, session_id):
+        with self.lock: self.sessions.pop(session_id, None)
+
+# ==========================================
+# 4. Prefetcher: worker 1 ตัว ส่งงานเป็น background ของ GenerationService (รันเฉพาะตอนไม่มีคำถามจริงรอ + rate เหลือ)
+# ==========================================
+class Prefetcher:
+    def __init__(self, engine, budget=None, store=None, enabled=PREFETCH_ENABLED):
+        self.engine = engine
+        self.budget = budget or TokenBudget()
+        self.store = store or SpeculativeStore()
+        self.enabled = enabled
+        self.tasks = queue.Queue(maxsize=64)
+        self.done_starters = set()          # (model, kb_version) ที่ทำ starter ไปแล้ว
+        self.lock = threading.Lock()
+        self.worker = None
+        self.generated = self.skipped = 0
+
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, daemon=True, name="prefetch")
+                self.worker.start()
+
+    def _enqueue(self, task):
+        if not self.enabled: return
+        self._ensure_worker()
+        try: self.tasks.put_nowait(task)
+        except queue.Full: self.skipped += 1
+
+    def prefetch_starters(self, model_name):
+        # เรียกได้ทุก rerun: ทำจริงเฉพาะเมื่อ Knowledge Base หรือโมเดลเปลี่ยน
+        key = (model_name, self.engine.personas.version)
+        with self.lock:
+            if key in self.done_starters: return
+            self.done_starters.add(key)
+        for _, prompt in STARTER_PROMPTS: self._enqueue(("starter", model_name, prompt))
+
+    def after_turn(self, session_id, prompt, answer, messages, model_name, persona, context_state):
+        # messages = ประวัติรวม turn ที่เพิ่งตอบแล้ว
+        for guess in predict_follow_ups(prompt, answer, persona):
+            self._enqueue(("follow_up", model_name, guess, session_id, list(messages), dict(context_state)))
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task[0] == "starter": self._starter(*task[1:])
+                else: self._follow_up(*task[1:])
+            except Exception: self.skipped += 1
+
+    def _generate(self, model_name, history, message, prompt, persona):
+        cost = estimate_tokens(message) + sum(estimate_tokens(p) for m in history for p in m["parts"] if isinstance(p, str))
+        engine = self.engine
+        # งานเดาล่วงหน้าต้องไม่แย่ง slot / rate ของคำถามจริง (โมเดลที่ bucket เล็กเกินกว่าจะเว้นสำรองได้ -> ข้าม)
+        if not engine.service.accepts_background(model_name) or not self.budget.allows(cost + PREFETCH_EST_OUTPUT):
+            self.skipped += 1
+            return None
+        # เส้นทางเดียวกับคำถามจริง (router/failover + context cache) แต่เป็นงาน background ของ service
+        make_stream = lambda name: engine.stream_model(PREFETCH_SESSION, name, persona, history, message, prompt, background=True)
+        response = "".join(engine.router.stream(model_name, make_stream))
+        self.budget.charge(cost + estimate_tokens(response))
+        self.generated += 1
+        return response
+
+    def _starter(self, model_name, prompt):
+        kb_version = self.engine.personas.version
+        cache = self.engine.answer_cache(kb_version)
+        if cache.contains(prompt, model_name, kb_version): return
+        persona = self.engine.personas.route(prompt, count=False)
+        history, message = self.engine.build_request(PREFETCH_SESSION, prompt, [], {}, persona)
+        answer = self._generate(model_name, history, message, prompt, persona)
+        if answer: cache.put(prompt, model_name, kb_version, answer)
+
+    def _follow_up(self, model_name, prompt, session_id, messages, context_state):
+        kb_version = self.engine.personas.version
+        persona = self.engine.personas.route(prompt, context_state.get("persona"), count=False)
+        history, message = self.engine.build_request(session_id, prompt, messages, context_state, persona)
+        answer = self._generate(model_name, history, message, prompt, persona)
+        if answer: self.store.put(session_id, prompt, messages, model_name, kb_version, answer)
+
+    def take(self, session_id, prompt, messages, model_name, kb_version):
+        return self.store.take(session_id, prompt, messages, model_name, kb_version)
+
+    def stats(self):
+        return {"generated": self.generated, "skipped": self.skipped, "queued": self.tasks.qsize(),
+                "budget_used": self.budget.used(), "budget_limit": self.budget.limit,
+                "follow_up_hits": self.store.hits, "follow_up_misses": self.store.misses}
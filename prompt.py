@@ -51,4 +51,11 @@ Bot: "การตั้งค่า IP Address ให้กับขา (Interf
 ```text
 Router> enable
 Router# configure terminal 
-"""
\ No newline at end of file
+"""
+# ปุ่มเริ่มต้นในหน้า Hero ของ app.py (label, คำถามที่ส่งจริง)
+STARTER_PROMPTS = [
+    ("📝 สรุปเนื้อหาสำคัญ", "ช่วยสรุป Concept หลักจากไฟล์ PDF นี้ให้หน่อย"),
+    ("🔧 เทคนิคการ Config", "สอนวิธี Config VLAN และ Trunking บน Switch"),
+    ("🌐 อธิบาย OSPF", "อธิบายหลักการทำงานของ OSPF แบบเข้าใจง่าย"),
+    ("🛡️ การแก้ปัญหา", "แนะนำขั้นตอนการ Troubleshoot เบื้องต้น"),
+]
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import math
+import hashlib
+from collections import Counter, defaultdict
+
+from kb_build import load_artifact
+from metrics import log_event
+from pdf_extract import EXTRACT_VERSION
+
+# ==========================================
+# 0. 🛠️ Path & ค่าตั้งต้นของ Knowledge Base
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.path.join(BASE_DIR, ".kb_index")
+KB_SOURCES = [
+    os.path.join(BASE_DIR, "Data_Content_Network.pdf"),
+    os.path.join(BASE_DIR, "Content.xlsx"),
+    os.path.join(BASE_DIR, "workaw_data.xlsx"),
+]
+
+CHUNK_SIZE = int(os.getenv("KB_CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "120"))
+TOP_K = int(os.getenv("KB_TOP_K", "5"))
+USE_EMBEDDINGS = os.getenv("KB_EMBEDDINGS", "0") == "1"
+EMBED_MODEL = os.getenv("KB_EMBED_MODEL", "models/text-embedding-004")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# ==========================================
+# 1. อ่านไฟล์ต้นฉบับ (PDF / XLSX)
+# ==========================================
+def pdf_extractor():
+    # ตัวอ่าน PDF ที่ใช้ได้ในเครื่องนี้ (None = ไม่มี -> PDF ถูกข้ามทั้งไฟล์)
+    try: import PyPDF2
+    except ImportError: return None
+    return f"PyPDF2-{getattr(PyPDF2, '__version__', '?')}"
+
+def read_pdf_pages(path):
+    # ทีละหน้าแบบ streaming (pdf_extract: process pool + cache ต่อหน้า + normalize ภาษาไทย)
+    if pdf_extractor() is None:
+        log_event("kb_source_skipped", path=os.path.basename(path), reason="PyPDF2 not installed")
+        return
+    from pdf_extract import iter_pdf_pages
+    for rec in iter_pdf_pages(path): yield rec["page"], rec["text"]
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    text = re.sub(r"[ \t]+", " ", text).strip()
+    if len(text) <= size: return [text] if text else []
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        # ตัดที่ขึ้นบรรทัดใหม่ใกล้ที่สุด จะได้ไม่ตัดกลางคำสั่ง CLI
+        cut = text.rfind("\n", start + size // 2, end)
+        if cut > start and end < len(text): end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text): break
+        start = max(end - overlap, start + 1)
+    return [c for c in chunks if c]
+
+def extract_chunks(sources=None):
+    chunks = []
+    for path in sources or KB_SOURCES:
+        if not os.path.exists(path): continue
+        name = os.path.basename(path)
+        if path.lower().endswith(".pdf"):
+            for page, text in read_pdf_pages(path):
+                for c in chunk_text(text): chunks.append({"source": name, "page": page, "text": c})
+        elif path.lower().endswith(".xlsx"):
+            for rec in load_artifact(path):
+                for c in chunk_text(rec["text"]): chunks.append({"source": name, "row": rec["row"], "text": c})
+    return chunks
+
+# ==========================================
+# 2. Tokenizer (ไทย = bigram ตัวอักษร, อังกฤษ = คำ)
+# ==========================================
+THAI_RUN = re.compile(r"[฀-๿]+")
+WORD_RUN = re.compile(r"[a-z0-9][a-z0-9._/-]*")
+
+def tokenize(text):
+    text = text.lower()
+    tokens = WORD_RUN.findall(text)
+    for run in THAI_RUN.findall(text):
+        if len(run) == 1: tokens.append(run)
+        else: tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+# ==========================================
+# 3. Index (BM25 + Embedding แบบ memory-mapped)
+# ==========================================
+def sources_fingerprint(sources=None):
+    h = hashlib.sha1()
+    for path in sources or KB_SOURCES:
+        if os.path.exists(path):
+            st_ = os.stat(path)
+            h.update(f"{os.path.basename(path)}:{st_.st_size}:{st_.st_mtime_ns}|".encode())
+    # ตัวอ่าน PDF / วิธี normalize เปลี่ยน (เช่นเพิ่งติดตั้ง PyPDF2) -> ข้อความเปลี่ยน ต้อง build index ใหม่
+    h.update(f"{CHUNK_SIZE}:{CHUNK_OVERLAP}:{EXTRACT_VERSION}:{pdf_extractor()}".encode())
+    return h.hexdigest()
+
+class KnowledgeIndex:
+    def __init__(self, chunks, postings, doc_lens, version, vectors=None):
+        self.chunks = chunks
+        self.postings = postings
+        self.doc_lens = doc_lens
+        self.version = version
+        self.vectors = vectors
+        self.avg_len = (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0
+        n = len(doc_lens)
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in postings.items()}
+
+    def __len__(self): return len(self.chunks)
+
+    @classmethod
+    def build(cls, chunks, version):
+        postings, doc_lens = defaultdict(list), []
+        for doc_id, chunk in enumerate(chunks):
+            tf = Counter(tokenize(chunk["text"]))
+            doc_lens.append(sum(tf.values()))
+            for term, freq in tf.items(): postings[term].append([doc_id, freq])
+        return cls(chunks, dict(postings), doc_lens, version)
+
+    def bm25(self, query):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None: continue
+            for doc_id, tf in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens[doc_id] / (self.avg_len or 1))
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, k=TOP_K, query_vector=None):
+        scores = self.bm25(query)
+        if query_vector is not None and self.vectors is not None:
+            # รวมคะแนนแบบ hybrid: BM25 (normalize แล้ว) + cosine similarity
+            top = max(scores.values()) if scores else 0.0
+            sims = self.vectors @ query_vector
+            hybrid = {i: 0.5 * float(sims[i]) for i in range(len(sims))}
+            for doc_id, s in scores.items(): hybrid[doc_id] += 0.5 * (s / top if top else 0.0)
+            scores = hybrid
+        best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [dict(self.chunks[i], score=round(s, 4)) for i, s in best if s > 0]
+
+    def save(self, index_dir=INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        tmp = os.path.join(index_dir, "index.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "chunks": self.chunks, "postings": self.postings,
+                       "doc_lens": self.doc_lens}, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(index_dir, "index.json"))
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR):
+        path = os.path.join(index_dir, "index.json")
+        if not os.path.exists(path): return None
+        try:
+            with open(path, "r", encoding="utf-8") as f: data = json.load(f)
+        except (OSError, ValueError): return None
+        index = cls(data["chunks"], data["postings"], data["doc_lens"], data["version"])
+        index.vectors = load_vectors(index_dir, len(index.chunks))
+        return index
+
+# --- Embedding (ไม่บังคับ: ต้องมี numpy และเปิด KB_EMBEDDINGS=1) ---
+def embed_texts(texts, task_type):
+    import google.generativeai as genai
+    vectors = []
+    for i in range(0, len(texts), 100):
+        res = genai.embed_content(model=EMBED_MODEL, content=texts[i:i + 100], task_type=task_type)
+        vectors.extend(res["embedding"])
+    return vectors
+
+def build_vectors(index, index_dir=INDEX_DIR):
+    try: import numpy as np
+    except ImportError: return None
+    matrix = np.asarray(embed_texts([c["text"] for c in index.chunks], "retrieval_document"), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+    tmp = os.path.join(index_dir, "vectors.tmp.npy")
+    np.save(tmp, matrix)
+    os.replace(tmp, os.path.join(index_dir, "vectors.npy"))
+    return load_vectors(index_dir, len(index.chunks))
+
+def load_vectors(index_dir, n_chunks):
+    path = os.path.join(index_dir, "vectors.npy")
+    if not os.path.exists(path): return None
+    try: import numpy as np
+    except ImportError: return None
+    vectors = np.load(path, mmap_mode="r")
+    return vectors if vectors.shape[0] == n_chunks else None
+
+def embed_query(query):
+    try: import numpy as np
+    except ImportError: return None
+    vec = np.asarray(embed_texts([query], "retrieval_query")[0], dtype=np.float32)
+    return vec / (np.linalg.norm(vec) + 1e-9)
+
+# ==========================================
+# 4. API หลักที่แอปเรียกใช้
+# ==========================================
+def load_or_build_index(sources=None, index_dir=INDEX_DIR, use_embeddings=USE_EMBEDDINGS):
+    version = sources_fingerprint(sources)
+    index = KnowledgeIndex.load(index_dir)
+    if index is None or index.version != version:
+        index = KnowledgeIndex.build(extract_chunks(sources), version)
+        index.save(index_dir)
+        old_vectors = os.path.join(index_dir, "vectors.npy")
+        if os.path.exists(old_vectors): os.remove(old_vectors)
+    if use_embeddings and index.vectors is None and len(index):
+        try: index.vectors = build_vectors(index, index_dir)
+        except Exception: index.vectors = None
+    return index
+
+def retrieve(index, query, k=TOP_K):
+    query_vector = None
+    if index.vectors is not None:
+        try: query_vector = embed_query(query)
+        except Exception: query_vector = None
+    return index.search(query, k=k, query_vector=query_vector)
+
+def format_context(hits):
+    parts = []
+    for h in hits:
+        where = f"หน้า {h['page']}" if "page" in h else f"แถว {h.get('row', '-')}"
+        parts.append(f"[{h['source']} | {where}]\n{h['text']}")
+    return "\n\n---\n\n".join(parts)
+
+if __name__ == "__main__":
+    idx = load_or_build_index()
+    print(f"✅ Indexed {len(idx)} chunks (version {idx.version[:12]}) -> {INDEX_DIR}")
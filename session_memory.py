@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+import types
+import threading
+import tracemalloc
+from collections import OrderedDict, deque
+
+from transcript import Message
+from metrics import get_metrics, log_event
+
+# ==========================================
+# Session Memory: ข้อมูลหนักของแต่ละ session (ข้อความ, turn log) อยู่ที่นี่แทน st.session_state
+#   วัดขนาดต่อ session + ปล่อย session ที่ไม่ใช้งาน/เกิน cap ออกจาก memory
+#   ข้อความทุกข้ออยู่ใน sessions.db อยู่แล้ว (session_store.py) -> ปล่อยได้เลย กลับมาเมื่อไหร่โหลดใหม่จาก SQLite
+# ==========================================
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "1800"))              # วินาทีที่ไม่มีการใช้งานก่อนปล่อยออกจาก memory
+SESSION_MEMORY_CAP_MB = float(os.getenv("SESSION_MEMORY_CAP_MB", "256"))   # รวมทุก session
+SESSION_MEMORY_MAX_MB = float(os.getenv("SESSION_MEMORY_MAX_MB", "16"))    # ต่อ session (เกิน -> ทิ้ง cache ที่สร้างใหม่ได้)
+MEMORY_TRACE = os.getenv("MEMORY_TRACE", "0") == "1"                        # เปิด tracemalloc (มี overhead ~ไม่กี่ %)
+TRACE_FRAMES = 5
+SWEEP_INTERVAL = 30                                                          # วินาทีขั้นต่ำระหว่างการไล่ session ที่ idle
+MB = 1024 * 1024
+
+if MEMORY_TRACE and not tracemalloc.is_tracing(): tracemalloc.start(TRACE_FRAMES)
+
+# ==========================================
+# 1. วัดขนาด (sys.getsizeof แบบไล่ทั้งก้อน นับ object ที่ใช้ร่วมกันครั้งเดียว)
+# ==========================================
+SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+def footprint(obj):
+    seen, stack, total = set(), [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, SKIP_TYPES): continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float, bool)) or o is None: continue
+        if isinstance(o, dict): stack.extend(o.keys()); stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)): stack.extend(o)
+        else:
+            stack.extend(getattr(o, s) for s in getattr(type(o), "__slots__", ()) if hasattr(o, s))
+            if hasattr(o, "__dict__"): stack.append(o.__dict__)
+    return total
+
+def rss_bytes():
+    # RSS ปัจจุบันของ process (Linux: /proc, ที่อื่นใช้ค่าสูงสุดจาก resource)
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+        except Exception: return None
+
+def trace_top(limit=10):
+    # จุดที่จอง memory มากที่สุด (ต้องเปิด MEMORY_TRACE=1)
+    if not tracemalloc.is_tracing(): return []
+    stats = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics("lineno")
+    return [{"where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}", "kb": round(s.size / 1024, 1),
+             "blocks": s.count} for s in stats[:limit]]
+
+# ==========================================
+# 2. ข้อมูลของ 1 session
+# ==========================================
+class SessionSlot:
+    def __init__(self, session_id, messages=()):
+        self.session_id = session_id
+        self.messages = [Message.from_dict(m) for m in messages]
+        self.turn_log = []
+        self.last_seen = time.time()
+        self.size = 0
+
+    def reset(self):
+        self.messages, self.turn_log = [], []
+
+# ==========================================
+# 3. Registry ทุก session ใน process + caps
+# ==========================================
+class SessionMemory:
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, cap_mb=SESSION_MEMORY_CAP_MB, session_mb=SESSION_MEMORY_MAX_MB):
+        self.slots = OrderedDict()        # session_id -> SessionSlot (เรียงจากใช้ล่าสุดน้อยสุด)
+        self.idle_ttl = idle_ttl
+        self.cap = int(cap_mb * MB)
+        self.session_cap = int(session_mb * MB)
+        self.lock = threading.Lock()
+        self.evicted = {"idle": 0, "cap": 0}
+        self.reloads = self.trims = 0
+        self._last_sweep = 0.0
+
+    def attach(self, session_id, load=None):
+        # slot ของ session นี้ (ถูกปล่อยไปแล้ว -> load(session_id) จาก store แล้วสร้างใหม่)
+        with self.lock: slot = self.slots.pop(session_id, None)
+        if slot is None:
+            saved = load(session_id) if load else None
+            slot = SessionSlot(session_id, saved["messages"] if saved else ())
+            if saved and saved["messages"]:
+                with self.lock: self.reloads += 1
+        slot.last_seen = time.time()
+        with self.lock: self.slots[session_id] = slot
+        self.sweep(keep=session_id)
+        return slot
+
+    def measure(self, session_id):
+        # เรียกหลังจบแต่ละ run ของ session -> ขนาดล่าสุด, เกิน cap ต่อ session ทิ้งส่วนที่สร้างใหม่ได้ (turn log)
+        with self.lock: slot = self.slots.get(session_id)
+        if slot is None: return 0
+        slot.size = footprint(slot)
+        if slot.size > self.session_cap:
+            slot.turn_log = slot.turn_log[-1:]
+            slot.size = footprint(slot)
+            with self.lock: self.trims += 1
+            log_event("session_memory_trim", session_id=session_id, bytes=slot.size, messages=len(slot.messages))
+        if self.total() > self.cap: self.sweep(keep=session_id, force=True)
+        return slot.size
+
+    def total(self):
+        with self.lock: return sum(s.size for s in self.slots.values())
+
+    def sweep(self, keep=None, force=False):
+        now = time.time()
+        if not force and now - self._last_sweep < SWEEP_INTERVAL: return 0
+        self._last_sweep = now
+        victims = []
+        with self.lock:
+            for sid, slot in list(self.slots.items()):
+                if sid != keep and now - slot.last_seen > self.idle_ttl: victims.append((sid, "idle"))
+            total = sum(s.size for sid, s in self.slots.items() if (sid, "idle") not in victims)
+            # ยังเกิน cap -> ปล่อย session ที่ใช้ล่าสุดนานที่สุดก่อน (ไม่รวม session ที่กำลังทำงาน)
+            for sid, slot in self.slots.items():
+                if total <= self.cap: break
+                if sid == keep or (sid, "idle") in victims: continue
+                victims.append((sid, "cap"))
+                total -= slot.size
+            for sid, reason in victims:
+                self.slots.pop(sid, None)
+                self.evicted[reason] += 1
+        for sid, reason in victims:
+            get_metrics().inc("session_memory_evictions_total", 1, {"reason": reason},
+                              help="Sessions released from memory (messages stay in sessions.db)")
+        if victims: log_event("session_memory_evict", sessions=len(victims), reasons=[r for _, r in victims])
+        return len(victims)
+
+    def drop(self, session_id):
+        with self.lock: self.slots.pop(session_id, None)
+
+    def stats(self, top=10):
+        now = time.time()
+        with self.lock:
+            slots = list(self.slots.values())
+            evicted = dict(self.evicted)
+        largest = sorted(slots, key=lambda s: s.size, reverse=True)[:top]
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+        rss = rss_bytes()
+        return {"sessions": len(slots), "total_mb": round(sum(s.size for s in slots) / MB, 2), "cap_mb": round(self.cap / MB, 1),
+                "session_cap_mb": round(self.session_cap / MB, 1), "idle_ttl": self.idle_ttl, "evicted": evicted,
+                "reloads": self.reloads, "trims": self.trims, "rss_mb": round(rss / MB, 1) if rss else None,
+                "traced_mb": round(traced[0] / MB, 1) if traced else None, "traced_peak_mb": round(traced[1] / MB, 1) if traced else None,
+                "largest": [{"session": s.session_id[:8], "kb": round(s.size / 1024, 1), "messages": len(s.messages),
+                             "idle_s": round(now - s.last_seen)} for s in largest]}
+
+_memory = SessionMemory()
+
+def get_session_memory():
+    return _memory
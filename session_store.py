@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from transcript import Message
+
+# ==========================================
+# Session Store: บทสนทนาต่อ session (SQLite WAL) -> refresh / หลุด connection แล้วกลับมาคุยต่อได้
+#   อ่านทีละ session ตาม id ที่ขอ ไม่โหลดทุก session เข้า memory
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_DB = os.getenv("SESSION_DB", os.path.join(BASE_DIR, "sessions.db"))
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(30 * 86400)))    # วินาที ก่อนลบ session ที่ไม่มีการใช้งาน
+KB_HANDLE_TTL = 47 * 3600                                                # เท่า FILE_TTL ของ file_registry
+PRUNE_EVERY = 500                                                        # ลบ session เก่าทุกๆ N ครั้งที่เขียน
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY, created REAL, updated REAL, message_count INTEGER DEFAULT 0,
+    context_state TEXT, kb_handle TEXT, kb_saved REAL);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT, seq INTEGER, msg_id TEXT, role TEXT, content TEXT,
+    PRIMARY KEY (session_id, seq)) WITHOUT ROWID;
+"""
+
+class SqliteSessionStore:
+    def __init__(self, path=SESSION_DB, max_age=SESSION_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn: conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id):
+        # คืน {"messages", "context_state", "kb_handle"} หรือ None ถ้าไม่มี session นี้
+        conn = self._conn()
+        row = conn.execute("SELECT context_state, kb_handle, kb_saved FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None: return None
+        state, handle, saved = row
+        messages = [Message(r, c, i) for i, r, c in conn.execute(
+            "SELECT msg_id, role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,))]
+        # handle ของไฟล์บน Gemini หมดอายุใน 48 ชม. -> ถ้าเก่าเกินให้ engine หาใหม่
+        fresh = handle and saved and time.time() - saved < KB_HANDLE_TTL
+        return {"messages": messages, "context_state": json.loads(state) if state else {},
+                "kb_handle": json.loads(handle) if fresh else None}
+
+    def append(self, session_id, *messages):
+        now = time.time()
+        with self._conn() as conn:
+            # จอง write lock ก่อนอ่าน message_count (2 แท็บของ session เดียวกันเขียนพร้อมกัน -> seq ไม่ชนกัน)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR IGNORE INTO sessions (id, created, updated) VALUES (?, ?, ?)", (session_id, now, now))
+            count = conn.execute("SELECT message_count FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+            conn.executemany("INSERT INTO messages (session_id, seq, msg_id, role, content) VALUES (?, ?, ?, ?, ?)",
+                             [(session_id, count + i, m.get("id"), m["role"], m["content"]) for i, m in enumerate(messages)])
+            conn.execute("UPDATE sessions SET message_count = ?, updated = ? WHERE id = ?",
+                         (count + len(messages), now, session_id))
+        self._wrote()
+
+    def save_state(self, session_id, context_state, kb_handle=None):
+        # context_state = สรุปสะสม (summary/folded) + persona ล่าสุด, kb_handle = file part ที่ upload แล้ว
+        now = time.time()
+        handle = json.dumps(kb_handle) if kb_handle is not None else None
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO sessions (id, created, updated) VALUES (?, ?, ?)", (session_id, now, now))
+            conn.execute("UPDATE sessions SET context_state = ?, updated = ? WHERE id = ?",
+                         (json.dumps(context_state, ensure_ascii=False), now, session_id))
+            if handle is not None:
+                conn.execute("UPDATE sessions SET kb_handle = ?, kb_saved = ? WHERE id = ? AND kb_handle IS NOT ?",
+                             (handle, now, session_id, handle))
+        self._wrote()
+
+    def reset(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("UPDATE sessions SET message_count = 0, context_state = NULL, updated = ? WHERE id = ?",
+                         (time.time(), session_id))
+
+    def delete(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def prune(self):
+        if not self.max_age: return 0
+        cutoff = time.time() - self.max_age
+        with self._conn() as conn:
+            ids = [r[0] for r in conn.execute("SELECT id FROM sessions WHERE updated < ?", (cutoff,))]
+            conn.executemany("DELETE FROM messages WHERE session_id = ?", [(i,) for i in ids])
+            conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+        return len(ids)
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0: self.prune()
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_session_store(path=SESSION_DB):
+    with _stores_lock:
+        if path not in _stores: _stores[path] = SqliteSessionStore(path)
+        return _stores[path]
@@ -0,0 +1,94 @@
+import os
+import threading
+
+from answer_cache import normalize_prompt
+
+# ==========================================
+# Single-flight: คำถามเดียวกันที่เข้ามาพร้อมกัน (prompt ที่ normalize แล้ว + model + KB version + persona)
+#   ใช้ upstream generation ร่วมกัน 1 ครั้ง แล้วกระจาย chunk ให้ทุกคนที่รอ
+#   คนที่เข้ามาทีหลังได้ chunk ที่ผ่านไปแล้วย้อนหลังก่อน แล้วค่อยตาม stream สด
+# ==========================================
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "1") == "1"
+
+def flight_key(prompt, model_name, kb_version, persona):
+    return (normalize_prompt(prompt), model_name, kb_version, persona)
+
+class Flight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.info = {}               # model/persona ที่ upstream ใช้จริง (หลัง failover)
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+    def publish(self, text):
+        with self.cond:
+            self.chunks.append(text)
+            self.cond.notify_all()
+
+    def close(self, error=None):
+        with self.cond:
+            self.done, self.error = True, error
+            self.cond.notify_all()
+
+    def subscribe(self):
+        # replay chunk ที่มีแล้วทั้งหมด แล้วรอ chunk ใหม่จนกว่า upstream จะจบ
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.chunks) and not self.done: self.cond.wait()
+                pending, finished, error = self.chunks[i:], self.done, self.error
+            i += len(pending)
+            yield from pending
+            if finished and i >= len(self.chunks):
+                if error is not None: raise error
+                return
+
+class SingleFlight:
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.upstream = self.joined = 0
+
+    def stream(self, key, produce, info=None):
+        # produce(info) = generator ของ upstream (เรียกครั้งเดียวต่อ key ที่กำลังวิ่งอยู่) ; info จะได้ค่าจาก upstream เมื่อจบ
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.upstream += 1
+            else: self.joined += 1
+            flight.subscribers += 1
+        if leader:
+            # upstream วิ่งใน thread ของตัวเอง: ผู้ถามคนแรกปิดหน้าเว็บไปก่อน คนอื่นยังได้คำตอบครบ
+            threading.Thread(target=self._pump, args=(key, flight, produce), daemon=True, name="single-flight").start()
+        from metrics import get_metrics
+        get_metrics().inc("coalesced_requests_total", 1, {"role": "leader" if leader else "follower"},
+                          help="Chat generations by single-flight role (followers reuse an in-flight upstream)")
+        try: yield from flight.subscribe()
+        finally:
+            # จบ / error / ผู้ใช้ปิดหน้าเว็บไปก่อน -> ไม่นับเป็นคนที่รออยู่อีก
+            with self.lock: flight.subscribers -= 1
+        if info is not None: info.update(flight.info, coalesced=not leader)
+
+    def _pump(self, key, flight, produce):
+        error = None
+        try:
+            for text in produce(flight.info): flight.publish(text)
+        except Exception as e: error = e
+        finally:
+            # เอาออกก่อนปิด: คำถามเดียวกันที่มาหลังจบแล้วจะไปเจอ answer cache / เริ่ม flight ใหม่
+            with self.lock: self.flights.pop(key, None)
+            flight.close(error)
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.flights), "upstream_calls": self.upstream, "coalesced": self.joined,
+                    "waiting": sum(f.subscribers for f in self.flights.values())}
+
+_single_flight = SingleFlight()
+
+def get_single_flight():
+    return _single_flight
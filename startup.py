@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import threading
+
+from history_store import FileLock
+
+# ==========================================
+# Cold start: ทุกอย่างในไฟล์นี้ต้องเบา (ห้าม import google.generativeai ที่ระดับโมดูล)
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_PATH = os.path.join(BASE_DIR, ".env")
+MODEL_CACHE_PATH = os.path.join(BASE_DIR, ".model_cache.json")
+MODEL_CACHE_TTL = int(os.getenv("MODEL_CACHE_TTL", str(6 * 3600)))   # วินาที ก่อน refresh รายชื่อโมเดลเบื้องหลัง
+DEFAULT_MODEL = "models/gemini-1.5-flash"
+FALLBACK_MODELS = [DEFAULT_MODEL]
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "120"))          # วินาทีสูงสุดที่คำถามแรกจะรอ warm-up
+
+def load_api_key():
+    try:
+        import dotenv
+        dotenv.load_dotenv(ENV_PATH)
+    except ImportError: pass
+    return os.getenv("GOOGLE_API_KEY")
+
+def default_model(models):
+    return next((m for m in models if "flash" in m and "1.5" in m), models[0] if models else DEFAULT_MODEL)
+
+# ==========================================
+# 1. Model Catalog: รายชื่อโมเดลจากไฟล์ cache ทันที แล้ว refresh จาก API เบื้องหลัง
+# ==========================================
+class ModelCatalog:
+    def __init__(self, path=MODEL_CACHE_PATH, ttl=MODEL_CACHE_TTL):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.ttl = ttl
+        self._refreshing = None
+        self._guard = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return {}
+
+    def _write(self, models):
+        tmp = self.path + ".tmp"
+        with FileLock(self.lock_path):
+            with open(tmp, "w", encoding="utf-8") as f: json.dump({"models": models, "fetched_at": time.time()}, f)
+            os.replace(tmp, self.path)
+
+    def models(self):
+        # ไม่ block: คืนของใน cache (หรือ fallback) แล้ว refresh ใน thread ถ้าเก่าเกิน TTL
+        data = self._read()
+        if not data.get("models") or time.time() - data.get("fetched_at", 0) > self.ttl: self.refresh_background()
+        return data.get("models") or list(FALLBACK_MODELS)
+
+    def refresh(self):
+        from chat_core import list_chat_models
+        models = list_chat_models(fallback=None)
+        if models: self._write(models)
+        return models
+
+    def refresh_background(self):
+        with self._guard:
+            if self._refreshing and self._refreshing.is_alive(): return
+            self._refreshing = threading.Thread(target=self._safe_refresh, daemon=True, name="model-catalog")
+            self._refreshing.start()
+
+    def _safe_refresh(self):
+        try: self.refresh()
+        except Exception: pass
+
+# ==========================================
+# 2. Warm-up: import SDK + สร้าง ChatEngine (index ทุก persona) + เปิด /metrics ใน thread แยก
+# ==========================================
+class Warmup:
+    def __init__(self, models, history_store=None):
+        self.models = list(models)
+        self.history_store = history_store
+        self.engine = None
+        self.error = None
+        self.elapsed = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name="engine-warmup").start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            from chat_core import ChatEngine, configure_genai
+            from metrics import start_metrics_server
+            configure_genai()
+            start_metrics_server()
+            engine = ChatEngine(self.models, self.history_store)
+            engine.kb_counts()                  # โหลด/สร้าง index ของทุก persona ให้เสร็จก่อนคำถามแรก
+            engine.warm_up()
+            # elapsed ต้องมีค่าก่อน engine (หน้าเว็บแสดง elapsed ทันทีที่เห็น engine)
+            self.elapsed = time.perf_counter() - start
+            self.engine = engine
+            if engine.models != self.models: engine.set_models(self.models)   # catalog refresh ระหว่าง warm-up
+        except Exception as e: self.error = e
+        finally:
+            if self.elapsed is None: self.elapsed = time.perf_counter() - start
+            self._done.set()
+
+    def set_models(self, models):
+        # รายชื่อโมเดลเปลี่ยน (catalog refresh เสร็จ) -> อัปเดต engine เดิม ไม่ต้อง warm-up ใหม่
+        models = list(models)
+        if not models or models == self.models: return
+        self.models = models
+        if self.engine is not None: self.engine.set_models(models)
+
+    @property
+    def ready(self): return self._done.is_set() and self.engine is not None
+
+    def result(self, timeout=None):
+        # เรียกตอนมีคำถามจริง: รอ warm-up ที่เหลือ (ส่วนใหญ่เสร็จไปแล้วระหว่างผู้ใช้พิมพ์)
+        # ยังไม่เสร็จภายใน timeout -> raise แทนการคืน None (ผู้เรียกจะได้ไม่เอา None ไปใช้เป็น engine)
+        if not self._done.wait(timeout): raise TimeoutError(f"engine warm-up still running after {timeout}s")
+        if self.error is not None: raise self.error
+        return self.engine
@@ -0,0 +1,56 @@
+import io
+import time
+
+# ==========================================
+# Streaming Renderer: รวม chunk แล้วค่อยวาดหน้าจอเป็นรอบๆ
+# ==========================================
+# แทนการ markdown(full_res + "▌") ทุก chunk -> วาดใหม่เมื่อครบเวลา/จำนวนไบต์ที่กำหนด
+RENDER_INTERVAL = 0.08   # วินาทีขั้นต่ำระหว่างการวาดแต่ละครั้ง
+RENDER_BYTES = 400       # หรือวาดเมื่อมีข้อความใหม่สะสมเกินเท่านี้
+CURSOR = "▌"
+
+class StreamRenderer:
+    def __init__(self, placeholder, interval=RENDER_INTERVAL, min_bytes=RENDER_BYTES, clock=time.perf_counter):
+        self.placeholder = placeholder
+        self.interval = interval
+        self.min_bytes = min_bytes
+        self.clock = clock
+        self.buffer = io.StringIO()
+        self.pending = 0
+        self.chunks = 0
+        self.renders = 0
+        self.render_time = 0.0
+        self.last_render = clock()
+
+    def feed(self, text):
+        if not text: return
+        self.buffer.write(text)
+        self.chunks += 1
+        self.pending += len(text)
+        if self.pending >= self.min_bytes or self.clock() - self.last_render >= self.interval:
+            self._render(self.buffer.getvalue() + CURSOR)
+
+    def finish(self):
+        text = self.buffer.getvalue()
+        self._render(text)
+        return text
+
+    @property
+    def text(self): return self.buffer.getvalue()
+
+    def _render(self, content):
+        start = self.clock()
+        self.placeholder.markdown(content)
+        now = self.clock()
+        self.render_time += now - start
+        self.renders += 1
+        self.pending = 0
+        self.last_render = now
+
+    def stats(self):
+        return {"chunks": self.chunks, "renders": self.renders,
+                "render_ms": round(self.render_time * 1000, 2), "chars": self.buffer.tell()}
+
+def iter_text_chunks(text, size=120):
+    # ใช้ส่งคำตอบที่มีอยู่แล้ว (เช่นจาก cache) ผ่าน renderer ตัวเดียวกัน
+    for i in range(0, len(text), size): yield text[i:i + size]
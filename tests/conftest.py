@@ -0,0 +1,13 @@
+import os
+import sys
+
+# ==========================================
+# เทสต์รันแบบ offline: ใช้ benchmarks/fake_genai แทน google.generativeai (ต้อง install ก่อน import โมดูลของ repo)
+# ==========================================
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+os.environ.setdefault("METRICS_LOG", "0")
+os.environ.setdefault("PREFETCH", "0")
+
+import fake_genai
+fake_genai.install()
@@ -0,0 +1,18 @@
+import json
+
+from batch_runner import load_done
+
+def _write(path, lines):
+    path.write_text("".join(lines), encoding="utf-8")
+
+def test_load_done_missing_file(tmp_path):
+    assert load_done(str(tmp_path / "out.jsonl")) == set()
+
+def test_load_done_resume(tmp_path):
+    out = tmp_path / "out.jsonl"
+    _write(out, [json.dumps({"id": "q1", "status": "ok"}) + "\n",
+                 json.dumps({"id": "q2", "status": "error"}) + "\n",
+                 json.dumps({"id": 3, "status": "ok"}) + "\n",
+                 '{"id": "q4", "stat'])                     # บรรทัดที่เขียนไม่จบตอนโดน kill
+    assert load_done(str(out)) == {"q1", 3}
+    assert load_done(str(out), retry_errors=False) == {"q1", "q2", 3}
@@ -0,0 +1,65 @@
+import pytest
+
+from cascade import FULL, HOLD_CHARS, LIGHT, ModelCascade, classify, rejection
+from model_router import ModelRouter
+
+FLASH, LITE, PRO = "models/gemini-1.5-flash", "models/gemini-1.5-flash-8b", "models/gemini-1.5-pro"
+REFUSAL = "ขออภัย ข้อมูลส่วนนี้ไม่มีในเอกสาร"
+ANSWER = "VLAN แบ่ง broadcast domain ของ switch ออกเป็นหลายวง " * 10
+
+class Turn:
+    finish_reason = None
+
+def _cascade(models=(FLASH, LITE, PRO)):
+    return ModelCascade(ModelRouter(models), models, enabled=True, threshold=0.35)
+
+def _run(cascade, plan, answers):
+    # answers: model -> ข้อความ หรือ exception ที่ stream ของโมเดลนั้นจะ raise
+    calls, info = [], {}
+    def make_stream(name, config):
+        calls.append((name, config))
+        answer = answers[name]
+        if isinstance(answer, Exception): raise answer
+        return [answer[i:i + 20] for i in range(0, len(answer), 20)]
+    return "".join(cascade.stream(plan, make_stream, info, Turn())), info, calls
+
+def test_classify_orders_questions():
+    simple, _ = classify("คุณคือใคร")
+    heavy, expected = classify("ช่วยออกแบบและเปรียบเทียบ network ให้ออฟฟิศ 3 ชั้น พร้อมวิเคราะห์ปัญหา")
+    assert simple < heavy and expected > 0
+
+def test_rejection():
+    assert rejection("  ") == "empty"
+    assert rejection(ANSWER, "SAFETY") == "blocked"
+    assert rejection(ANSWER, "MAX_TOKENS") == "truncated"
+    assert rejection(REFUSAL + " ค่ะ") == "refusal"
+    assert rejection(ANSWER) is None
+
+def test_plan_light_picks_lightest_chat_model():
+    cascade = _cascade((FLASH, LITE, PRO, "models/gemini-2.5-flash-preview-tts"))
+    plan = cascade.plan("คุณคือใคร", [], "network", FLASH)
+    assert plan["tier"] == LIGHT and plan["model"] == LITE and plan["fallback"] == FLASH
+    assert plan["config"]["max_output_tokens"] <= 1024
+    assert cascade.plan("คุณคือใคร", [], "network", FLASH, tier=FULL)["model"] == FLASH
+
+def test_light_answer_is_kept():
+    cascade = _cascade()
+    text, info, calls = _run(cascade, cascade.plan("คุณคือใคร", [], "network", FLASH), {LITE: ANSWER})
+    assert text == ANSWER and info["model"] == LITE and "escalated" not in info
+    assert [name for name, _ in calls] == [LITE]
+    assert cascade.stats()["light"] == 1 and cascade.stats()["escalations"] == {}
+
+@pytest.mark.parametrize("light, reason", [(REFUSAL, "refusal"), ("", "empty"), (ValueError("bad request"), "error")])
+def test_light_rejection_escalates_without_leaking(light, reason):
+    cascade = _cascade()
+    text, info, calls = _run(cascade, cascade.plan("คุณคือใคร", [], "network", FLASH), {LITE: light, FLASH: ANSWER})
+    assert text == ANSWER                            # ไม่มีข้อความของโมเดลเบาหลุดออกมาก่อน
+    assert info["escalated"].split(":")[0] == reason and info["model"] == FLASH
+    assert calls == [(LITE, calls[0][1]), (FLASH, None)]
+    assert cascade.stats()["escalations"] == {reason: 1}
+
+def test_refusal_after_hold_window_is_not_escalated():
+    cascade = _cascade()
+    late = "x" * HOLD_CHARS * 2 + REFUSAL            # ส่งออกไปแล้ว -> เปลี่ยนโมเดลไม่ได้
+    text, info, _ = _run(cascade, cascade.plan("คุณคือใคร", [], "network", FLASH), {LITE: late})
+    assert text == late and "escalated" not in info
@@ -0,0 +1,90 @@
+import time
+import asyncio
+
+import pytest
+
+import generation_service
+from generation_service import GenerationService, TokenBucket
+
+@pytest.fixture
+def service():
+    # หยุด dispatch loop ก่อน -> เรียก _next_job เองได้แบบ deterministic (submit แค่ปลุก loop ที่ไม่ได้วิ่ง)
+    s = GenerationService(max_queue=8, max_workers=4)
+    s.shutdown()
+    s.loop = asyncio.new_event_loop()
+    yield s
+    s.loop.close()
+
+def test_token_bucket_capacity_and_reserve():
+    bucket = TokenBucket(8)                 # capacity = 8 // 4
+    assert bucket.capacity == 2
+    assert not bucket.try_take(reserve=2)   # ต้องเหลือ 2 หลังหยิบ -> ไม่พอ
+    assert bucket.try_take(reserve=1)
+    assert not bucket.try_take(reserve=1)
+    assert bucket.try_take()
+    assert not bucket.try_take()
+    assert bucket.retry_after() > 0
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(60, capacity=1)
+    assert bucket.try_take()
+    bucket.updated -= 1.0                   # ผ่านไป 1 วินาที = 1 token ที่ 60 rpm
+    assert bucket.retry_after() == 0.0
+    assert bucket.try_take()
+
+def test_next_job_round_robins_sessions(service, monkeypatch):
+    monkeypatch.setattr(generation_service, "MODEL_LIMITS", [["", 8, 6000]])
+    for n in range(3): service.submit("a", "m", lambda: [f"a{n}"])
+    service.submit("b", "m", lambda: ["b0"])
+    order = [service._next_job().session_id for _ in range(4)]
+    assert order == ["a", "b", "a", "a"]
+    assert service._next_job() is None and service.depth == 0
+
+def test_busy_model_does_not_block_other_models(service, monkeypatch):
+    monkeypatch.setattr(generation_service, "MODEL_LIMITS", [["pro", 1, 6000], ["", 8, 6000]])
+    service.submit("a", "models/gemini-1.5-pro", lambda: [])
+    service.submit("b", "models/gemini-1.5-pro", lambda: [])
+    service.submit("c", "models/gemini-1.5-flash", lambda: [])
+    assert service._next_job().session_id == "a"
+    assert service._next_job().session_id == "c"     # pro เต็ม (concurrency 1) -> flash แซงได้
+    assert service._next_job() is None
+    service.model_running["models/gemini-1.5-pro"] -= 1
+    assert service._next_job().session_id == "b"
+
+def test_background_waits_for_foreground_and_keeps_reserve(service, monkeypatch):
+    monkeypatch.setattr(generation_service, "MODEL_LIMITS", [["", 8, 8]])    # bucket 2 token
+    service.submit("prefetch", "m", lambda: [], background=True)
+    service.submit("a", "m", lambda: [])
+    assert service._next_job().session_id == "a"
+    assert service._next_job() is None               # เหลือ 1 token = สำรองไว้ให้คำถามจริง
+    assert service.stats()["background"] == 1
+    service.submit("b", "m", lambda: [])
+    assert service._next_job().session_id == "b"
+    assert service._next_job() is None
+    service.buckets["m"].tokens = 2.0                # ไม่มีคำถามจริงรอ + token เกินสำรอง -> งานเบื้องหลังได้รัน
+    assert service._next_job().session_id == "prefetch"
+
+def test_accepts_background_needs_room_for_reserve(service, monkeypatch):
+    monkeypatch.setattr(generation_service, "MODEL_LIMITS", [["pro", 2, 2], ["", 8, 60]])
+    assert not service.accepts_background("models/gemini-1.5-pro")
+    assert service.accepts_background("models/gemini-1.5-flash")
+
+def test_cancelled_job_stops_upstream(monkeypatch):
+    monkeypatch.setattr(generation_service, "MODEL_LIMITS", [["", 8, 6000]])
+    pulled = []
+    def upstream():
+        for i in range(1000):
+            pulled.append(i)
+            time.sleep(0.005)
+            yield str(i)
+    service = GenerationService(max_queue=8, max_workers=2)
+    try:
+        job = service.submit("a", "m", upstream)
+        for i, _ in enumerate(job):
+            if i == 2: break
+        deadline = time.monotonic() + 2
+        while job.finished is None and time.monotonic() < deadline: time.sleep(0.01)
+        assert job.cancelled and job.finished is not None
+        assert len(pulled) < 1000
+        assert "".join(service.submit("b", "m", lambda: ["x", "y"])) == "xy"
+    finally: service.shutdown()
@@ -0,0 +1,46 @@
+from model_registry import KB_RULES, PERSONAS, ChatRegistry, ModelRegistry, history_signature, with_rules
+
+def _turn(question, answer):
+    return [{"role": "user", "parts": [question]}, {"role": "model", "parts": [answer]}]
+
+def test_with_rules_closes_open_fence():
+    text = with_rules("ตัวอย่างคำตอบ:\n```\nshow ip route")
+    body, rules = text.split("\n---\n", 1)
+    assert body.endswith("\n```") and body.count("```") % 2 == 0
+    assert rules == KB_RULES
+
+def test_with_rules_leaves_balanced_prompt():
+    assert with_rules("```a```\n\n") == "```a```\n---\n" + KB_RULES
+    for persona in PERSONAS.values(): assert persona.split("\n---\n")[0].count("```") % 2 == 0
+
+def test_history_signature():
+    history = _turn("vlan คืออะไร", "VLAN คือ ...")
+    assert history_signature(history) == history_signature([dict(m, parts=list(m["parts"])) for m in history])
+    assert history_signature(history) != history_signature(_turn("vlan คืออะไร", "VLAN คือ ..!"))
+    # ขอบเขตของ part ต้องมีผล: ["ab"] กับ ["a", "b"] ไม่ใช่ history เดียวกัน
+    assert history_signature([{"role": "user", "parts": ["ab"]}]) != history_signature([{"role": "user", "parts": ["a", "b"]}])
+
+def test_chat_registry_reuses_matching_history():
+    chats = ChatRegistry(ModelRegistry())
+    model, history = "models/gemini-1.5-flash", _turn("สวัสดี", "สวัสดีครับ")
+    chat, reused = chats.acquire("s1", model, "network", history)
+    assert not reused
+    # จำลอง send_message: ข้อความที่ส่งจริงมี excerpts แนบมา แต่ history ที่เก็บต้องเป็นคำถามเดิม
+    chat.history += _turn("[excerpts]\nOSPF คืออะไร", "OSPF คือ ...")
+    chats.release("s1", model, "network", chat, "OSPF คืออะไร", "OSPF คือ ...", history)
+    history = history + _turn("OSPF คืออะไร", "OSPF คือ ...")
+    again, reused = chats.acquire("s1", model, "network", history)
+    assert reused and again is chat and again.history[-2]["parts"] == ["OSPF คืออะไร"]
+    assert chats.stats()["chat_reuses"] == 1
+
+def test_chat_registry_restarts_on_changed_history():
+    chats = ChatRegistry(ModelRegistry())
+    model, history = "models/gemini-1.5-flash", _turn("สวัสดี", "สวัสดีครับ")
+    chat, _ = chats.acquire("s1", model, "network", history)
+    chat.history += _turn("q", "a")
+    chats.release("s1", model, "network", chat, "q", "a", history)
+    # ประวัติถูกย่อ (summary) -> signature ไม่ตรง -> เริ่ม chat ใหม่จาก history ที่ส่งมา
+    summary = [{"role": "user", "parts": ["สรุป: ..."]}]
+    fresh, reused = chats.acquire("s1", model, "network", summary)
+    assert not reused and fresh is not chat and fresh.history == summary
+    assert chats.acquire("s2", model, "network", history)[1] is False
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight, flight_key
+
+def test_flight_key_normalizes_prompt():
+    assert flight_key("  VLAN คืออะไร ", "m", 1, "network") == flight_key("vlan คืออะไร", "m", 1, "network")
+    assert flight_key("vlan คืออะไร", "m", 1, "network") != flight_key("vlan คืออะไร", "m", 2, "network")
+
+def test_followers_share_upstream_and_replay():
+    sf, gate, calls = SingleFlight(), threading.Event(), []
+    def produce(info):
+        calls.append(1)
+        info["model"] = "m"
+        yield "a"
+        gate.wait(2)
+        yield "b"
+    key = flight_key("q", "m", 1, "network")
+    leader_info, follower_info = {}, {}
+    leader = sf.stream(key, produce, leader_info)
+    assert next(leader) == "a"
+    follower = sf.stream(key, produce, follower_info)
+    assert next(follower) == "a"                     # คนมาทีหลังได้ chunk ที่ผ่านไปแล้วย้อนหลัง
+    assert sf.stats()["waiting"] == 2
+    gate.set()
+    assert "a" + "".join(leader) == "a" + "".join(follower) == "ab"
+    assert len(calls) == 1 and sf.stats() == {"in_flight": 0, "upstream_calls": 1, "coalesced": 1, "waiting": 0}
+    assert leader_info == {"model": "m", "coalesced": False} and follower_info["coalesced"]
+
+def test_closed_subscriber_is_not_counted():
+    sf, gate = SingleFlight(), threading.Event()
+    def produce(info):
+        yield "a"
+        gate.wait(2)
+        yield "b"
+    key = flight_key("q", "m", 1, "network")
+    leader, follower = sf.stream(key, produce), sf.stream(key, produce)
+    next(leader); next(follower)
+    assert sf.stats()["waiting"] == 2
+    follower.close()                                 # ผู้ใช้ปิดหน้าเว็บไปก่อน
+    assert sf.stats()["waiting"] == 1
+    gate.set()
+    assert "".join(leader) == "b"                    # upstream วิ่งต่อจนจบให้คนที่ยังรอ
+    assert sf.stats()["waiting"] == 0 and sf.stats()["in_flight"] == 0
+
+def test_upstream_error_reaches_every_subscriber():
+    sf = SingleFlight()
+    def produce(info):
+        yield "a"
+        raise RuntimeError("boom")
+    stream = sf.stream(flight_key("q", "m", 1, "network"), produce)
+    with pytest.raises(RuntimeError, match="boom"): list(stream)
+    assert sf.stats()["waiting"] == 0
@@ -0,0 +1,55 @@
+import re
+import sys
+import uuid
+
+# ==========================================
+# Transcript: วาดเฉพาะข้อความล่าสุด N ข้อ (ที่เหลือกด "โหลดข้อความเก่า")
+#   Streamlit ส่ง element ทุกตัวที่วาดใหม่ทุก rerun -> ที่ประหยัดได้จริงคือจำนวนข้อความที่วาด ไม่ใช่การ cache string
+# ==========================================
+TRANSCRIPT_PAGE_SIZE = 20          # จำนวนข้อความที่วาดต่อหน้า
+FENCE = re.compile(r"^\s*```", re.M)
+
+class Message:
+    # ข้อความ 1 ข้อแบบประหยัด memory: __slots__ (ไม่มี __dict__ ต่อข้อความ) + role เป็น string ที่ intern แล้ว
+    # อ่าน/เขียนแบบ dict ได้ (msg["role"], msg.get("id"), "tokens" in msg) โค้ดเดิมที่ใช้ dict จึงใช้ต่อได้
+    __slots__ = ("id", "role", "content", "tokens")
+
+    def __init__(self, role, content, id=None, tokens=None):
+        self.id, self.role, self.content, self.tokens = id, sys.intern(role), content, tokens
+
+    @classmethod
+    def from_dict(cls, d):
+        return d if isinstance(d, cls) else cls(d["role"], d["content"], d.get("id"), d.get("tokens"))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__ or getattr(self, key) is None: raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__: raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key): return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__ if getattr(self, k) is not None}
+
+def new_message(role, content):
+    # id คงที่ต่อข้อความ (msg_id ใน session_store)
+    return Message(role, content, uuid.uuid4().hex[:12])
+
+def prepare_markdown(content):
+    # คำตอบที่ถูกตัดกลาง code block ทำให้ markdown ที่เหลือทั้งหน้ากลายเป็น code -> ปิด fence ให้
+    text = content.rstrip()
+    if len(FENCE.findall(text)) % 2: text += "\n```"
+    return text
+
+def visible_window(messages, shown=TRANSCRIPT_PAGE_SIZE):
+    # คืน (จำนวนข้อความที่ซ่อนไว้, ข้อความที่ต้องวาด) เริ่มหน้าต่างที่ข้อความของ user เพื่อไม่ให้คำตอบลอยไม่มีคำถาม
+    start = max(0, len(messages) - shown)
+    if start and messages[start]["role"] != "user": start -= 1
+    return start, messages[start:]